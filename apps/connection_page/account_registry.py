@@ -0,0 +1,106 @@
+# /apps/connection_page/account_registry.py
+"""
+Per-user registry of Schwab account numbers and their hashes.
+
+Every per-account endpoint (/trader/v1/accounts/{hash}/...) needs the
+account's hash, which only /trader/v1/accounts/accountNumbers returns. The
+registry keeps them in SchwabAccount so that lookup happens when the user
+connects, not before every call. If Schwab answers 401 or 404 for a stored
+hash (e.g. an account was closed or re-linked), the registry is refreshed
+once and the call retried (see with_accounts). A user whose connection has no
+accounts is remembered for SCHWAB_EMPTY_ACCOUNTS_TTL seconds, so pages don't
+look the accounts up again on every view.
+
+fetch_for_accounts runs one call per account concurrently, so a user with
+several accounts waits about as long as a user with one.
+"""
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import SchwabAccount
+from .schwab_client import get_schwab_client
+
+logger = logging.getLogger(__name__)
+
+STALE_ACCOUNT_STATUSES = {401, 404}
+EMPTY_REGISTRY_KEY = 'schwab_accounts_empty:{}'
+
+_account_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'SCHWAB_ACCOUNT_WORKERS', 8), thread_name_prefix='schwab-accounts',
+)
+
+
+def refresh_accounts(user, access_token):
+    """Replaces the user's registry with what /accounts/accountNumbers returns now; returns the accounts."""
+    account_numbers = get_schwab_client().get_json('/trader/v1/accounts/accountNumbers', access_token) or []
+    hashes = {
+        str(entry['accountNumber']): entry['hashValue']
+        for entry in account_numbers
+        if isinstance(entry, dict) and entry.get('accountNumber') and entry.get('hashValue')
+    }
+    with transaction.atomic():
+        SchwabAccount.objects.filter(user=user).exclude(account_number__in=list(hashes)).delete()
+        for account_number, hash_value in hashes.items():
+            SchwabAccount.objects.update_or_create(
+                user=user, account_number=account_number, defaults={'hash_value': hash_value},
+            )
+    if hashes:
+        cache.delete(EMPTY_REGISTRY_KEY.format(user.pk))
+    else:
+        cache.set(EMPTY_REGISTRY_KEY.format(user.pk), True, getattr(settings, 'SCHWAB_EMPTY_ACCOUNTS_TTL', 900))
+    logger.info(f"Schwab account registry refreshed for user {user.pk}: {len(hashes)} accounts")
+    return list(SchwabAccount.objects.filter(user=user))
+
+
+def get_accounts(user, access_token):
+    """
+    The user's accounts from the registry, looked up from Schwab only when there are none yet
+    (and at most once per SCHWAB_EMPTY_ACCOUNTS_TTL while Schwab keeps returning none).
+    """
+    accounts = list(SchwabAccount.objects.filter(user=user))
+    if accounts or cache.get(EMPTY_REGISTRY_KEY.format(user.pk)):
+        return accounts
+    return refresh_accounts(user, access_token)
+
+
+def is_stale_account_error(error):
+    """Whether `error` is the 401 / 404 Schwab answers for an account hash it no longer knows."""
+    return (
+        isinstance(error, requests.HTTPError) and error.response is not None
+        and error.response.status_code in STALE_ACCOUNT_STATUSES
+    )
+
+
+def with_accounts(user, access_token, call):
+    """
+    Returns call(accounts) with the user's registered accounts. When the call fails with
+    a 401 / 404 the registry may be stale: it is refreshed and the call made once more.
+    """
+    accounts = get_accounts(user, access_token)
+    try:
+        return call(accounts)
+    except requests.HTTPError as e:
+        if not is_stale_account_error(e):
+            raise
+        logger.warning(f"Schwab returned {e.response.status_code} for a registered account; refreshing the registry")
+        return call(refresh_accounts(user, access_token))
+
+
+def select_accounts(accounts, account_id=None):
+    """`accounts`, or only the one with primary key `account_id` when one is given."""
+    if not account_id:
+        return list(accounts)
+    return [account for account in accounts if str(account.pk) == str(account_id)]
+
+
+def fetch_for_accounts(accounts, fetch_one):
+    """
+    [(account, fetch_one(account)), ...] in registry order, with the calls made concurrently.
+    If any call fails its exception is raised, so with_accounts can react to a stale hash.
+    """
+    futures = [(account, _account_executor.submit(fetch_one, account)) for account in accounts]
+    return [(account, future.result()) for account, future in futures]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connection_page', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchwabAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_number', models.CharField(max_length=32)),
+                ('hash_value', models.CharField(max_length=128)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schwab_accounts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', 'id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='schwabaccount',
+            constraint=models.UniqueConstraint(fields=('user', 'account_number'), name='unique_schwab_account_per_user'),
+        ),
+    ]
@@ -14,3 +14,28 @@ class SchwabToken(models.Model):
 
     def __str__(self):
         return f"Schwab Token for {self.user.username}"
+
+
+class SchwabAccount(models.Model):
+    """
+    One of a user's Schwab accounts and its hash, the id every per-account API
+    path takes (see account_registry). Refreshed from /accounts/accountNumbers.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='schwab_accounts')
+    account_number = models.CharField(max_length=32)
+    hash_value = models.CharField(max_length=128)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['user', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'account_number'], name='unique_schwab_account_per_user'),
+        ]
+
+    def __str__(self):
+        return f"Schwab account ...{self.account_number[-4:]} for {self.user.username}"
+
+    @property
+    def display_name(self):
+        """The masked account number shown in the UI."""
+        return f"...{self.account_number[-4:]}"
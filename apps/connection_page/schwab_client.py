@@ -0,0 +1,132 @@
+# /apps/connection_page/schwab_client.py
+"""
+Shared HTTP client for every Schwab API call (OAuth token exchange, accounts,
+transactions, market data).
+
+One client per process keeps a pooled requests.Session, so calls reuse
+keep-alive connections instead of opening a new TCP + TLS connection each
+time. Every call has connect/read timeouts (settings.SCHWAB_TIMEOUT). GETs
+are retried with exponential backoff on 429 and 5xx responses and on
+connection errors; other methods are only retried on 429, where the request
+was rejected before being processed. A Retry-After header is honoured, up to
+settings.SCHWAB_MAX_RETRY_WAIT.
+
+The transport is pluggable (settings.SCHWAB_TRANSPORT) and the API root is
+settings.SCHWAB_API_BASE_URL, so tests can point the app at a local fake
+Schwab server. Transports implement:
+    send(method, url, headers, params, data, timeout) -> requests.Response
+"""
+import time
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+# --- Transports ---
+class RequestsTransport:
+    """Sends requests through one pooled, keep-alive requests.Session."""
+
+    def __init__(self, pool_size=None):
+        pool_size = pool_size or getattr(settings, 'SCHWAB_POOL_SIZE', 10)
+        self.session = requests.Session()
+        # Retries are done by SchwabClient so they work the same with any transport
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def send(self, method, url, headers=None, params=None, data=None, timeout=None):
+        return self.session.request(method, url, headers=headers, params=params, data=data, timeout=timeout)
+
+
+# --- Client ---
+class SchwabClient:
+
+    def __init__(self, transport, base_url='https://api.schwabapi.com', timeout=(3.05, 15),
+                 max_retries=3, backoff=0.5, max_retry_wait=30):
+        self.transport = transport
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_retry_wait = max_retry_wait
+
+    def url(self, path):
+        """Absolute URL of an API path such as '/trader/v1/accounts'."""
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_retry_wait)
+            except ValueError:
+                pass
+        delay = self.backoff * (2 ** attempt)
+        return min(delay + random.uniform(0, self.backoff), self.max_retry_wait)
+
+    def request(self, method, path, access_token=None, params=None, data=None, headers=None):
+        """
+        Sends one API request (retrying as described above) and returns the final
+        requests.Response; HTTP errors are left to the caller (see get_json).
+        """
+        method = method.upper()
+        headers = dict(headers or {})
+        if access_token:
+            headers['Authorization'] = f'Bearer {access_token}'
+        url = self.url(path)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.transport.send(method, url, headers=headers, params=params, data=data, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if method != 'GET' or attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(f"Schwab {method} {path} failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            retryable = response.status_code == 429 or (method == 'GET' and response.status_code in RETRY_STATUSES)
+            if not retryable or attempt >= self.max_retries:
+                return response
+            delay = self._retry_delay(attempt, response)
+            logger.warning(f"Schwab {method} {path} returned {response.status_code}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def get(self, path, access_token=None, params=None):
+        return self.request('GET', path, access_token=access_token, params=params)
+
+    def get_json(self, path, access_token=None, params=None):
+        """GET and decode the JSON body; raises requests.HTTPError for an error status."""
+        response = self.get(path, access_token=access_token, params=params)
+        response.raise_for_status()
+        return response.json()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_schwab_client():
+    """The process's SchwabClient, using the transport named in settings.SCHWAB_TRANSPORT."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                transport_path = getattr(settings, 'SCHWAB_TRANSPORT', 'apps.connection_page.schwab_client.RequestsTransport')
+                _client = SchwabClient(
+                    import_string(transport_path)(),
+                    base_url=getattr(settings, 'SCHWAB_API_BASE_URL', 'https://api.schwabapi.com'),
+                    timeout=getattr(settings, 'SCHWAB_TIMEOUT', (3.05, 15)),
+                    max_retries=getattr(settings, 'SCHWAB_MAX_RETRIES', 3),
+                    backoff=getattr(settings, 'SCHWAB_RETRY_BACKOFF', 0.5),
+                    max_retry_wait=getattr(settings, 'SCHWAB_MAX_RETRY_WAIT', 30),
+                )
+    return _client
@@ -1,3 +1,97 @@
-from django.test import TestCase
+from unittest import mock
+import requests
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .schwab_client import SchwabClient
+
+
+def response(status_code, headers=None, body=b'{}'):
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    result._content = body
+    return result
+
+
+class FakeTransport:
+    """Replays `outcomes` (responses or exceptions to raise) in order and records every request."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = []
+
+    def send(self, method, url, headers=None, params=None, data=None, timeout=None):
+        self.requests.append((method, url, headers, params, data, timeout))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class SchwabClientRetryTests(SimpleTestCase):
+
+    def setUp(self):
+        sleep = mock.patch('apps.connection_page.schwab_client.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+        jitter = mock.patch('apps.connection_page.schwab_client.random.uniform', return_value=0)
+        jitter.start()
+        self.addCleanup(jitter.stop)
+
+    def schwab_client(self, *outcomes, **options):
+        transport = FakeTransport(*outcomes)
+        return SchwabClient(transport, base_url='https://schwab.test/', timeout=(1, 2), backoff=0.5, **options), transport
+
+    def delays(self):
+        return [call.args[0] for call in self.sleep.call_args_list]
+
+    def test_get_is_retried_on_429_and_5xx_with_doubling_backoff(self):
+        client, transport = self.schwab_client(response(429), response(503), response(500), response(200, body=b'[1]'))
+
+        self.assertEqual(client.get_json('/trader/v1/accounts', access_token='token'), [1])
+        self.assertEqual(len(transport.requests), 4)
+        self.assertEqual(self.delays(), [0.5, 1.0, 2.0])
+        method, url, headers, _, _, timeout = transport.requests[0]
+        self.assertEqual((method, url, timeout), ('GET', 'https://schwab.test/trader/v1/accounts', (1, 2)))
+        self.assertEqual(headers['Authorization'], 'Bearer token')
+
+    def test_last_response_is_returned_when_retries_run_out(self):
+        client, transport = self.schwab_client(*[response(502)] * 3, max_retries=2)
+
+        self.assertEqual(client.get('/quotes').status_code, 502)
+        self.assertEqual(len(transport.requests), 3)
+        with self.assertRaises(requests.HTTPError):
+            self.schwab_client(*[response(502)] * 3, max_retries=2)[0].get_json('/quotes')
+
+    def test_client_errors_are_not_retried(self):
+        client, transport = self.schwab_client(response(404))
+
+        self.assertEqual(client.get('/quotes').status_code, 404)
+        self.assertEqual(len(transport.requests), 1)
+        self.sleep.assert_not_called()
+
+    def test_post_is_only_retried_on_429(self):
+        client, transport = self.schwab_client(response(429), response(500))
+
+        self.assertEqual(client.request('post', '/v1/oauth/token', data={'grant_type': 'refresh_token'}).status_code, 500)
+        self.assertEqual(len(transport.requests), 2)
+        self.assertEqual(transport.requests[0][0], 'POST')
+
+    def test_retry_after_is_honoured_up_to_the_cap(self):
+        client, _ = self.schwab_client(
+            response(429, {'Retry-After': '4'}), response(429, {'Retry-After': '120'}),
+            response(429, {'Retry-After': 'soon'}), response(200), max_retry_wait=10,
+        )
+
+        client.get('/quotes')
+        self.assertEqual(self.delays(), [4.0, 10.0, 2.0])  # an unparseable header falls back to the backoff
+
+    def test_connection_errors_are_retried_for_get_only(self):
+        client, transport = self.schwab_client(requests.ConnectionError('reset'), requests.Timeout('slow'), response(200))
+        self.assertEqual(client.get('/quotes').status_code, 200)
+        self.assertEqual(len(transport.requests), 3)
+
+        client, transport = self.schwab_client(requests.ConnectionError('reset'))
+        with self.assertRaises(requests.ConnectionError):
+            client.request('POST', '/v1/oauth/token')
+        self.assertEqual(len(transport.requests), 1)
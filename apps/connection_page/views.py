@@ -3,16 +3,20 @@
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from .models import SchwabToken
+from .schwab_client import get_schwab_client
+from .account_registry import refresh_accounts
 import urllib.parse
-import requests
 import base64
+import logging
 from oauthlib.oauth1.rfc5849 import SIGNATURE_HMAC, SIGNATURE_TYPE_AUTH_HEADER
 from requests_oauthlib import OAuth1Session
 
+logger = logging.getLogger(__name__)
+
 
 @login_required
 def schwab_authenticate(request):
-    auth_url = 'https://api.schwabapi.com/v1/oauth/authorize'
+    auth_url = get_schwab_client().url('/v1/oauth/authorize')
     # This dynamically builds the URL that MUST match the portal
     redirect_uri = request.build_absolute_uri(reverse('connection_page:schwab_callback'))
     params = {
@@ -33,7 +37,6 @@ def schwab_callback(request):
     print(f"Handling Schwab callback with redirect_uri: {redirect_uri}") # For debugging
 
     try:
-        token_url = 'https://api.schwabapi.com/v1/oauth/token'
         client_creds = f"{settings.SCHWAB_APP_KEY}:{settings.SCHWAB_APP_SECRET}"
         encoded_creds = base64.b64encode(client_creds.encode()).decode()
         headers = {
@@ -45,7 +48,7 @@ def schwab_callback(request):
             'code': auth_code,
             'redirect_uri': redirect_uri
         }
-        response = requests.post(token_url, headers=headers, data=data)
+        response = get_schwab_client().request('POST', '/v1/oauth/token', headers=headers, data=data)
         response.raise_for_status()
         token_data = response.json()
 
@@ -58,6 +61,12 @@ def schwab_callback(request):
             }
         )
         request.session['has_brokerage_connection'] = True
+
+        # Register the user's accounts and their hashes now, so later calls don't have to look them up
+        try:
+            refresh_accounts(request.user, token_data.get('access_token'))
+        except Exception as e:
+            logger.warning(f"Could not load the Schwab account list yet: {e}")
         return redirect('holdings:holdings_list')
     except Exception as e:
         print(f"Error during Schwab token exchange: {e}")
@@ -1,42 +1,80 @@
 # /apps/dashboards/data_services.py
-import requests
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
 from apps.connection_page.models import SchwabToken
+from apps.connection_page.schwab_client import get_schwab_client
+from apps.grahams_table.caching import get_or_compute
+
+logger = logging.getLogger(__name__)
+
+# Context key -> Schwab movers sort
+MOVER_SORTS = {
+    'top_gainers': 'PERCENT_CHANGE_UP',
+    'top_losers': 'PERCENT_CHANGE_DOWN',
+    'most_active': 'VOLUME',
+}
+
+DEFAULT_MOVERS_INDICES = {'$SPX.X': 'S&P 500'}
+
+_movers_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'MARKET_MOVERS_WORKERS', 9), thread_name_prefix='market-movers',
+)
+
+
+def _fetch_movers(access_token, index_symbol, sort):
+    response = get_schwab_client().get(
+        f'/marketdata/v1/movers/{index_symbol}', access_token, params={'sort': sort, 'frequency': 1},
+    )
+    response.raise_for_status()
+    return response.json().get('movers', [])
+
+
+def _fetch_all_movers(access_token, indices):
+    """{index: {context key: movers}} with every (index, sort) request in flight at once."""
+    futures = {
+        (index_symbol, key): _movers_executor.submit(_fetch_movers, access_token, index_symbol, sort)
+        for index_symbol in indices
+        for key, sort in MOVER_SORTS.items()
+    }
+    movers, failures = {index_symbol: {} for index_symbol in indices}, 0
+    for (index_symbol, key), future in futures.items():
+        try:
+            movers[index_symbol][key] = future.result()
+        except Exception as e:
+            logger.error(f"Market movers {index_symbol} {MOVER_SORTS[key]} failed: {e}")
+            movers[index_symbol][key] = []
+            failures += 1
+    # Nothing came back: don't cache it, so the next dashboard load tries again
+    return movers if failures < len(futures) else None
+
 
 def get_market_movers(user):
     """
-    Fetches market movers (top gainers, losers, etc.) from the Schwab API.
+    Fetches market movers (top gainers, losers, most active) from the Schwab API for every
+    index in settings.MARKET_MOVERS_INDICES. The data isn't user-specific, so one fetch is
+    shared by all users for MARKET_MOVERS_TTL seconds, and concurrent dashboard loads wait
+    for the same fetch instead of each making their own.
+    Returns the first index's lists as top_gainers / top_losers / most_active, plus
+    movers_by_index: [{'index', 'label', 'top_gainers', 'top_losers', 'most_active'}, ...].
     """
-    movers_data = {
-        'top_gainers': [],
-        'top_losers': [],
-        'most_active': []
-    }
+    indices = getattr(settings, 'MARKET_MOVERS_INDICES', DEFAULT_MOVERS_INDICES)
+    empty = {key: [] for key in MOVER_SORTS}
+    movers_data = dict(empty, movers_by_index=[])
     try:
         token_obj = SchwabToken.objects.get(user=user)
-        headers = {'Authorization': f'Bearer {token_obj.access_token}'}
-
-        # We will fetch movers for the S&P 500 index
-        index_symbol = '$SPX.X'
-        movers_url = f'https://api.schwabapi.com/marketdata/v1/movers/{index_symbol}'
-
-        # --- Get Top Gainers ---
-        params_gainers = {'sort': 'PERCENT_CHANGE_UP', 'frequency': 1}
-        response_gainers = requests.get(movers_url, headers=headers, params=params_gainers)
-        if response_gainers.ok:
-            movers_data['top_gainers'] = response_gainers.json().get('movers', [])
-
-        # --- Get Top Losers ---
-        params_losers = {'sort': 'PERCENT_CHANGE_DOWN', 'frequency': 1}
-        response_losers = requests.get(movers_url, headers=headers, params=params_losers)
-        if response_losers.ok:
-            movers_data['top_losers'] = response_losers.json().get('movers', [])
-
-        # --- Get Most Active ---
-        params_active = {'sort': 'VOLUME', 'frequency': 1}
-        response_active = requests.get(movers_url, headers=headers, params=params_active)
-        if response_active.ok:
-            movers_data['most_active'] = response_active.json().get('movers', [])
+        movers = get_or_compute(
+            f"market_movers:{','.join(indices)}",
+            lambda: _fetch_all_movers(token_obj.access_token, list(indices)),
+            getattr(settings, 'MARKET_MOVERS_TTL', 45),
+        ) or {}
+
+        movers_data['movers_by_index'] = [
+            dict(empty, **movers.get(index_symbol, {}), index=index_symbol, label=label)
+            for index_symbol, label in indices.items()
+        ]
+        if movers_data['movers_by_index']:
+            movers_data.update({key: movers_data['movers_by_index'][0][key] for key in MOVER_SORTS})
 
     except SchwabToken.DoesNotExist:
         print("User does not have a Schwab token.")
@@ -0,0 +1,60 @@
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from apps.connection_page.models import SchwabToken
+from .data_services import get_market_movers
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    MARKET_MOVERS_INDICES={'$SPX.X': 'S&P 500', '$DJI': 'Dow'}, MARKET_MOVERS_TTL=45,
+)
+class MarketMoversTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = [get_user_model().objects.create_user(name, password='secret') for name in ('first', 'second')]
+        for user in self.users:
+            SchwabToken.objects.create(user=user, access_token=f'token-{user.username}')
+        patcher = mock.patch('apps.dashboards.data_services._fetch_movers', side_effect=self.fetch_movers)
+        self.fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.failing = set()
+
+    def fetch_movers(self, access_token, index_symbol, sort):
+        if (index_symbol, sort) in self.failing or '*' in self.failing:
+            raise RuntimeError(f"{sort} unavailable")
+        return [{'symbol': f'{index_symbol}:{sort}'}]
+
+    def test_one_fetch_per_index_and_sort_is_shared_by_all_users(self):
+        first = get_market_movers(self.users[0])
+        second = get_market_movers(self.users[1])
+
+        self.assertEqual(self.fetch.call_count, 6)
+        self.assertEqual(first, second)
+        self.assertEqual(first['top_gainers'], [{'symbol': '$SPX.X:PERCENT_CHANGE_UP'}])
+        self.assertEqual([entry['label'] for entry in first['movers_by_index']], ['S&P 500', 'Dow'])
+        self.assertEqual(first['movers_by_index'][1]['most_active'], [{'symbol': '$DJI:VOLUME'}])
+
+    def test_a_failed_list_is_shown_empty(self):
+        self.failing.add(('$DJI', 'PERCENT_CHANGE_DOWN'))
+
+        movers = get_market_movers(self.users[0])
+
+        self.assertEqual(movers['movers_by_index'][1]['top_losers'], [])
+        self.assertEqual(movers['movers_by_index'][1]['top_gainers'], [{'symbol': '$DJI:PERCENT_CHANGE_UP'}])
+
+    def test_nothing_is_cached_when_every_fetch_fails(self):
+        self.failing.add('*')
+        self.assertEqual(get_market_movers(self.users[0])['top_gainers'], [])
+
+        self.failing.clear()
+        self.assertEqual(get_market_movers(self.users[0])['top_gainers'], [{'symbol': '$SPX.X:PERCENT_CHANGE_UP'}])
+        self.assertEqual(self.fetch.call_count, 12)
+
+    def test_a_user_without_a_schwab_connection_gets_empty_lists(self):
+        user = get_user_model().objects.create_user('unlinked', password='secret')
+        self.assertEqual(get_market_movers(user), {'top_gainers': [], 'top_losers': [], 'most_active': [], 'movers_by_index': []})
+        self.fetch.assert_not_called()
@@ -21,33 +21,13 @@ def get_context_data(self, **kwargs):
         if has_connection:
             # Fetch the market movers data
             movers_data = get_market_movers(self.request.user)
-            context.update(movers_data) # This adds top_gainers, top_losers, etc. to the context
+            context.update(movers_data) # top_gainers, top_losers, most_active and movers_by_index
         else:
             context['show_connection_prompt'] = True
 
         return context
 
 
-# ... (keep the existing connection_page view) ...
-
-
-# Add LoginRequiredMixin to the view
-@login_required
-def connection_page(request):
-    """
-    Renders the page that allows users to connect to their
-    Schwab or E*TRADE accounts.
-    """
-    # We will use this exact path and filename
-    return render(request, 'dashboards/connection_page.html')
-class DashboardsView(LoginRequiredMixin, TemplateView):
-    login_url = '/accounts/auth/login/'
-
-    def get_context_data(self, **kwargs):
-        context = TemplateLayout.init(self, super().get_context_data(**kwargs))
-        context.update({"is_menu": True})
-        return context
-
 @login_required
 def connection_page(request):
     # If the user has already connected, send them to the dashboard.
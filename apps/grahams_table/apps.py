@@ -4,3 +4,7 @@
 class GrahamsTableConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.grahams_table'
+
+    def ready(self):
+        from .caching import check_cache_backend
+        check_cache_backend()
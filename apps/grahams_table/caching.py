@@ -0,0 +1,207 @@
+# /apps/grahams_table/caching.py
+"""
+Memoization for the calculation functions and the detail page data sources.
+
+    @memoize('fundamentals')   # slow-moving: settings.CACHE_TTL_FUNDAMENTALS
+    @memoize('quotes')         # live prices: settings.CACHE_TTL_QUOTES
+
+Cache keys are built from the function name, its arguments (symbol, years,
+period, ...) and the fundamentals data-version stamp, so refreshed data files
+never serve stale results. A FundamentalsIndex argument is keyed by its version;
+calls with arguments that can't be keyed (e.g. a raw DataFrame) bypass the cache.
+
+Expensive entries go through get_or_compute(), which protects against cache
+stampedes: only the worker holding a short cache lock recomputes an expired
+entry while the others keep serving the previous value (or wait briefly for
+the first computation). The lock is a cache.add, so it is only a real lock on
+backends where add is atomic (locmem within one process, Redis, Memcached);
+check_cache_backend() reports configurations where it isn't at startup.
+"""
+import time
+import hashlib
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+
+from .fundamentals_store import get_data_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTLS = {
+    'quotes': 300,
+    'fundamentals': 86400,
+}
+
+_ENVELOPE = '__stampede_protected__'
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_stats_lock = threading.Lock()
+
+
+class UncacheableArgument(Exception):
+    pass
+
+
+# Backends whose cache.add is atomic, and those of them shared between worker processes
+ATOMIC_ADD_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+}
+PER_PROCESS_BACKENDS = {'django.core.cache.backends.locmem.LocMemCache'}
+
+
+def check_cache_backend():
+    """
+    Logs a warning when the default cache can't give the recompute locks and shared results
+    this module relies on: a backend without an atomic add, or a per-process one behind
+    several workers (settings.SERVER_WORKERS). Returns the warnings.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    workers = getattr(settings, 'SERVER_WORKERS', 1)
+    warnings = []
+    if backend not in ATOMIC_ADD_BACKENDS:
+        warnings.append(f"{backend} has no atomic add, so cache locks can be taken twice; use Redis or Memcached (CACHE_URL)")
+    if backend in PER_PROCESS_BACKENDS and workers > 1:
+        warnings.append(
+            f"{backend} is per process, so the {workers} workers neither share results nor locks; "
+            f"use Redis or Memcached (CACHE_URL)"
+        )
+    for warning in warnings:
+        logger.warning(warning)
+    return warnings
+
+
+def get_ttl(kind):
+    return getattr(settings, f"CACHE_TTL_{kind.upper()}", DEFAULT_TTLS[kind])
+
+
+def _key_part(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(_key_part(v) for v in value) + ']'
+    # Imported here because data_services imports this module
+    from .data_services import FundamentalsIndex
+    if isinstance(value, FundamentalsIndex) and value.version:
+        # A FundamentalsIndex is identified by the data version it was loaded from
+        return f"{type(value).__name__}@{value.version}"
+    raise UncacheableArgument(type(value).__name__)
+
+
+def make_cache_key(prefix, args, kwargs):
+    parts = [_key_part(arg) for arg in args]
+    parts += [f"{name}={_key_part(value)}" for name, value in sorted(kwargs.items())]
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f"memo:{prefix}:{get_data_version()}:{digest}"
+
+
+def _record(prefix, outcome):
+    with _stats_lock:
+        _stats[prefix][outcome] += 1
+
+
+@contextmanager
+def cache_lock(name, timeout=None):
+    """
+    A best-effort lock shared by every worker using the same cache backend.
+    Yields True if this caller holds the lock, False if someone else does.
+    """
+    lock_key = f"lock:{name}"
+    acquired = cache.add(lock_key, 1, timeout or getattr(settings, 'CACHE_LOCK_TIMEOUT', 30))
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(lock_key)
+
+
+def wait_for_lock(name, timeout=None):
+    """Waits (at most `timeout`) until nobody holds cache_lock(name). Returns True if it was released."""
+    deadline = time.monotonic() + (timeout or getattr(settings, 'CACHE_LOCK_TIMEOUT', 30))
+    while cache.get(f"lock:{name}") is not None:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def get_or_compute(cache_key, compute, ttl):
+    """
+    Returns the cached value for `cache_key`, computing it with `compute()` when needed.
+    Entries are kept for CACHE_STALE_GRACE seconds past `ttl`: once `ttl` has passed, one worker
+    recomputes under a lock while the rest keep serving the stale value. On a cold miss,
+    workers that don't get the lock wait up to CACHE_LOCK_TIMEOUT for the first result.
+    None results are never cached.
+    """
+    lock_timeout = getattr(settings, 'CACHE_LOCK_TIMEOUT', 30)
+    stale_grace = getattr(settings, 'CACHE_STALE_GRACE', 300)
+
+    entry = cache.get(cache_key)
+    if isinstance(entry, tuple) and len(entry) == 3 and entry[0] == _ENVELOPE:
+        _, value, refresh_at = entry
+        if time.time() < refresh_at:
+            return value
+        with cache_lock(cache_key, lock_timeout) as acquired:
+            if not acquired:
+                return value
+            return _compute_and_store(cache_key, compute, ttl, stale_grace)
+
+    with cache_lock(cache_key, lock_timeout) as acquired:
+        if acquired:
+            return _compute_and_store(cache_key, compute, ttl, stale_grace)
+
+    # Someone else is computing it: wait for their result rather than piling on
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(cache_key)
+        if isinstance(entry, tuple) and len(entry) == 3 and entry[0] == _ENVELOPE:
+            return entry[1]
+        if cache.get(f"lock:{cache_key}") is None:
+            break
+    return _compute_and_store(cache_key, compute, ttl, stale_grace)
+
+
+def _compute_and_store(cache_key, compute, ttl, stale_grace):
+    value = compute()
+    if value is not None:
+        cache.set(cache_key, (_ENVELOPE, value, time.time() + ttl), ttl + stale_grace)
+    return value
+
+
+def memoize(kind='fundamentals', ttl=None):
+    """Caches the decorated function's return value in the Django cache for the `kind`'s TTL."""
+    def decorator(func):
+        prefix = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                cache_key = make_cache_key(prefix, args, kwargs)
+            except UncacheableArgument:
+                return func(*args, **kwargs)
+
+            computed = []
+
+            def compute():
+                computed.append(True)
+                return func(*args, **kwargs)
+
+            value = get_or_compute(cache_key, compute, ttl if ttl is not None else get_ttl(kind))
+            _record(prefix, 'misses' if computed else 'hits')
+            return value
+
+        wrapper.cache_prefix = prefix
+        return wrapper
+    return decorator
+
+
+def get_cache_stats():
+    """Hit/miss counters of this worker, per memoized function."""
+    with _stats_lock:
+        return {prefix: dict(counts) for prefix, counts in _stats.items()}
@@ -5,10 +5,22 @@
 import numpy as np
 from django.conf import settings
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 from datetime import datetime, timedelta
 from django.core.cache import cache
 import finnhub
 from django.conf import settings
+from .fundamentals_store import read_fundamentals, get_data_version
+from .screener_engine import compute_universe_metrics
+from .eps_matrix import AnnualEpsMatrix
+from .valuation import graham_number, intrinsic_value
+from .market_data import get_market_data_gateway
+from .pe_history import get_pe_engine
+from .returns_engine import compute_returns, CAGR_YEARS
+from .models import ScreenerSnapshotRow
+from .caching import memoize
 
 
 logger = logging.getLogger(__name__)
@@ -26,12 +38,42 @@ def get_csv_file_path(config_key):
         return None
     return path
 
+# --- Screener Universe (written by 'python manage.py prefilter_tickers') ---
+def load_valid_screener_symbols():
+    """Reads valid_tickers_for_screener.txt. Returns None if the list hasn't been generated yet."""
+    valid_tickers_file = os.path.join(settings.DOLT_EARNINGS_DATA_PATH, "valid_tickers_for_screener.txt")
+    if not os.path.exists(valid_tickers_file):
+        return None
+    with open(valid_tickers_file, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+_screener_universe = (None, frozenset())
+_screener_universe_lock = threading.Lock()
+
+def get_screener_universe():
+    """The valid screener symbols (upper-case) as a set, re-read only when the list file changes."""
+    global _screener_universe
+    valid_tickers_file = os.path.join(settings.DOLT_EARNINGS_DATA_PATH, "valid_tickers_for_screener.txt")
+    try:
+        stat = os.stat(valid_tickers_file)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return frozenset()
+    if _screener_universe[0] != signature:
+        with _screener_universe_lock:
+            if _screener_universe[0] != signature:
+                _screener_universe = (signature, frozenset(symbol.upper() for symbol in load_valid_screener_symbols() or []))
+    return _screener_universe[1]
+
 # --- Main CSV Loading and Filtering Function (Corrected Definition) ---
+STANDARD_COLUMN_NAMES = {'act_symbol': 'symbol', 'period_end_date': 'date'}
+
 def load_csv_data(config_key, usecols=None, filter_annual=False):
     file_path = get_csv_file_path(config_key)
     if not file_path: return pd.DataFrame()
     try:
-        df = pd.read_csv(file_path, usecols=usecols)
+        # Served from the columnar store, which rebuilds itself when the CSV changes
+        df = read_fundamentals(config_key, file_path, usecols=usecols)
 
         # Filter for Annual Data if requested and possible
         if filter_annual and 'period' in df.columns:
@@ -41,8 +83,7 @@ def load_csv_data(config_key, usecols=None, filter_annual=False):
                 logger.warning(f"Filtering for period='{annual_indicator}' resulted in an empty DataFrame for {config_key}.")
 
         # Standardize common column names for consistent use
-        rename_map = {'act_symbol': 'symbol', 'period_end_date': 'date'}
-        df.rename(columns=rename_map, inplace=True, errors='ignore')
+        df.rename(columns=STANDARD_COLUMN_NAMES, inplace=True, errors='ignore')
 
         if 'date' in df.columns:
              df['date'] = pd.to_datetime(df['date'], errors='coerce')
@@ -53,52 +94,228 @@ def load_csv_data(config_key, usecols=None, filter_annual=False):
         return pd.DataFrame()
 
 
-# --- yfinance Data Fetching Functions ---
+# --- Process-wide, Symbol-Indexed Fundamentals Cache ---
+class FundamentalsIndex:
+    """
+    The annual cash flow, annual equity and EPS history frames, sorted by symbol and date,
+    plus the row offsets of every symbol. Looking up a symbol is a dict hit and a slice
+    instead of a boolean mask and a sort over the whole table.
+    """
+    SOURCES = {
+        'cash_flow': {'usecols': ['act_symbol', 'date', 'period', 'diluted_net_eps'], 'filter_annual': True},
+        'equity': {'usecols': ['act_symbol', 'date', 'period', 'total_equity', 'shares_outstanding'], 'filter_annual': True},
+        'eps_history': {'usecols': ['act_symbol', 'period_end_date', 'reported']},
+    }
+
+    def __init__(self, frames, version=None):
+        self.version = version
+        self.frames = {}
+        self.offsets = {}
+        for config_key, df in frames.items():
+            if df.empty:
+                # A missing or empty CSV loads without any columns; give consumers the ones they index by
+                df = df.reindex(columns=list(dict.fromkeys([*df.columns, *self.expected_columns(config_key)])))
+            else:
+                df = df.dropna(subset=['symbol']).sort_values(['symbol', 'date'], kind='stable', ignore_index=True)
+            self.frames[config_key] = df
+            self.offsets[config_key] = self._build_offsets(df)
+        # Annual EPS of every symbol, aggregated once here instead of per symbol and request
+        self.annual_eps = AnnualEpsMatrix.from_eps_history(self.frames.get('eps_history', pd.DataFrame()))
+
+    @classmethod
+    def expected_columns(cls, config_key):
+        """The columns a source's frame has once loaded (symbol and date for any other table)."""
+        usecols = cls.SOURCES.get(config_key, {}).get('usecols', ['act_symbol', 'date'])
+        return [STANDARD_COLUMN_NAMES.get(column, column) for column in usecols]
+
+    @classmethod
+    def load(cls, version=None):
+        frames = {config_key: load_csv_data(config_key, **options) for config_key, options in cls.SOURCES.items()}
+        return cls(frames, version=version)
+
+    @staticmethod
+    def _build_offsets(df):
+        """Maps each symbol to the (start, stop) positions of its contiguous block of rows."""
+        if df.empty:
+            return {}
+        symbols = df['symbol'].to_numpy()
+        boundaries = np.flatnonzero(symbols[1:] != symbols[:-1]) + 1
+        starts = np.concatenate(([0], boundaries))
+        stops = np.concatenate((boundaries, [len(symbols)]))
+        return {symbols[start]: (start, stop) for start, stop in zip(starts, stops)}
+
+    @property
+    def symbols(self):
+        return sorted(set().union(*(offsets.keys() for offsets in self.offsets.values())))
+
+    def rows(self, config_key, symbol_ticker):
+        """The symbol's rows from one source, oldest first (empty if the symbol is unknown)."""
+        df = self.frames.get(config_key)
+        if df is None:
+            return pd.DataFrame()
+        bounds = self.offsets[config_key].get(symbol_ticker)
+        if bounds is None:
+            return df.iloc[0:0]
+        return df.iloc[bounds[0]:bounds[1]]
+
+
+_fundamentals_index = None
+_fundamentals_index_lock = threading.Lock()
+
+def get_fundamentals_index():
+    """Returns this worker's FundamentalsIndex, reloading it whenever the underlying data files change."""
+    global _fundamentals_index
+    version = get_data_version(FundamentalsIndex.SOURCES)
+    if _fundamentals_index is None or _fundamentals_index.version != version:
+        with _fundamentals_index_lock:
+            if _fundamentals_index is None or _fundamentals_index.version != version:
+                logger.info(f"Loading fundamentals index (data version {version})")
+                _fundamentals_index = FundamentalsIndex.load(version=version)
+    return _fundamentals_index
+
+# --- Full Financial Statements (every period, every line item) ---
+# URL statement type -> [(section title, DOLTHUB_FILENAMES_CONFIG key)]
+FINANCIAL_STATEMENTS = {
+    'income-statement': [('Income Statement', 'income_statement')],
+    'balance-sheet': [('Assets', 'assets'), ('Liabilities', 'liabilities'), ('Equity', 'equity')],
+    'cash-flow': [('Cash Flow', 'cash_flow')],
+}
+STATEMENT_KEY_COLUMNS = ('symbol', 'date', 'period')
+
+_statement_indexes = {}
+_statement_indexes_lock = threading.Lock()
+
+def get_statement_index(config_key):
+    """Worker-wide index over every period of one statement table, reloaded when its file changes."""
+    version = get_data_version([config_key])
+    index = _statement_indexes.get(config_key)
+    if index is None or index.version != version:
+        with _statement_indexes_lock:
+            index = _statement_indexes.get(config_key)
+            if index is None or index.version != version:
+                index = FundamentalsIndex({config_key: load_csv_data(config_key)}, version=version)
+                _statement_indexes[config_key] = index
+    return index
+
+def _statement_rows(config_key, symbol_ticker, period_type):
+    """A symbol's rows of one statement section for one period type; None if the section has no data."""
+    rows = get_statement_index(config_key).rows(config_key, symbol_ticker)
+    # A missing or empty CSV loads as a frame without columns
+    if rows.empty or 'date' not in rows.columns:
+        return None
+    if 'period' in rows.columns:
+        rows = rows[rows['period'] == period_type]
+    return rows
+
+def _is_per_share(column):
+    """Per-share lines (EPS, dividends per share) are shown with cents; everything else in whole units."""
+    return column.endswith('_eps') or 'per_share' in column
+
+def get_statement_periods(statement_type, symbol_ticker, period_type):
+    """Period end dates (newest first) reported by a symbol across all sections of a statement."""
+    dates = set()
+    for _, config_key in FINANCIAL_STATEMENTS[statement_type]:
+        rows = _statement_rows(config_key, symbol_ticker, period_type)
+        if rows is not None:
+            dates.update(rows['date'].dropna())
+    return sorted(dates, reverse=True)
+
+def get_statement_tables(statement_type, symbol_ticker, period_type, period_dates):
+    """
+    One table per statement section with data for the given period end dates:
+    {'title', 'periods': [date strings], 'rows': [(line item, [values per period], floatformat argument)]}.
+    """
+    tables = []
+    for title, config_key in FINANCIAL_STATEMENTS[statement_type]:
+        rows = _statement_rows(config_key, symbol_ticker, period_type)
+        if rows is None:
+            continue
+        by_date = rows.drop_duplicates('date', keep='last').set_index('date').reindex(period_dates)
+        line_items = [column for column in by_date.columns if column not in STATEMENT_KEY_COLUMNS]
+        tables.append({
+            'title': title,
+            'periods': [d.strftime('%Y-%m-%d') for d in period_dates],
+            'rows': [
+                (
+                    column.replace('_', ' ').title(),
+                    [None if pd.isna(v) else v for v in by_date[column]],
+                    "2g" if _is_per_share(column) else "0g",
+                )
+                for column in line_items
+            ],
+        })
+    return tables
+
+def get_company_name(symbol_ticker):
+    """Lightweight cached company name lookup (no statements, prices or calculations)."""
+    cache_key = f"company_name:{symbol_ticker}"
+    name = cache.get(cache_key)
+    if name is None:
+        try:
+            name = get_market_data_gateway().get_company_names([symbol_ticker])[symbol_ticker]
+        except Exception as e:
+            logger.error(f"Company name lookup failed for {symbol_ticker}: {e}")
+            return symbol_ticker
+        cache.set(cache_key, name, 86400)
+    return name
+
+def _symbol_rows(fundamentals, config_key, symbol_ticker):
+    """One symbol's rows, oldest first, from either a FundamentalsIndex or a plain DataFrame."""
+    if isinstance(fundamentals, FundamentalsIndex):
+        return fundamentals.rows(config_key, symbol_ticker)
+    if fundamentals.empty:
+        return fundamentals
+    return fundamentals[fundamentals['symbol'] == symbol_ticker].sort_values(by='date')
+
+
+# --- Price Data Functions (served by the shared market-data gateway) ---
 def get_yfinance_supplemental_data(symbol_ticker):
     try:
-        info = yf.Ticker(symbol_ticker).info
-        return {'company_name': info.get('longName', symbol_ticker), 'prev_close': info.get('previousClose')}
+        return get_market_data_gateway().get_quotes([symbol_ticker])[symbol_ticker]
     except:
         return {'company_name': symbol_ticker, 'prev_close': None}
 
 def get_yfinance_historical_prices(symbol_ticker, period="5y"):
-    try: return yf.Ticker(symbol_ticker).history(period=period)
+    try: return get_market_data_gateway().get_close_history(symbol_ticker, period).to_frame('Close')
     except: return pd.DataFrame()
 
 # --- Calculation Functions (Defined Before They Are Called) ---
 
+# Helpers take either a FundamentalsIndex or the matching DataFrame from load_csv_data
+# (the index lookups are cheaper than a cache round trip, so they aren't memoized)
+
 def get_latest_annual_eps(df_cash_flow_annual, symbol_ticker):
-    if df_cash_flow_annual.empty: return None
-    symbol_data = df_cash_flow_annual[df_cash_flow_annual['symbol'] == symbol_ticker].sort_values(by='date', ascending=False)
+    symbol_data = _symbol_rows(df_cash_flow_annual, 'cash_flow', symbol_ticker)
     if not symbol_data.empty:
-        return pd.to_numeric(symbol_data['diluted_net_eps'].iloc[0], errors='coerce')
+        return pd.to_numeric(symbol_data['diluted_net_eps'].iloc[-1], errors='coerce')
     return None
 
-def calculate_avg_pe_5yr(symbol_ticker, latest_annual_eps):
-    if latest_annual_eps is None or latest_annual_eps == 0: return None
-    hist_prices = get_yfinance_historical_prices(symbol_ticker)
-    if hist_prices.empty: return None
+def get_pe_stats(symbols):
+    """5-year P/E mean / median / min / max for many symbols (see pe_history), indexed by symbol."""
+    return get_pe_engine().get_stats(get_fundamentals_index(), symbols)
+
+def calculate_avg_pe_5yr(symbol_ticker):
+    """Mean of the month-end P/E over 5 years, each close divided by the EPS in effect at the time."""
     try:
-        pe_series = hist_prices['Close'] / latest_annual_eps
-        return round(pe_series.mean(), 2)
-    except: return None
+        value = get_pe_stats([symbol_ticker]).at[symbol_ticker, 'pe_mean']
+        return None if pd.isna(value) else float(value)
+    except Exception as e:
+        logger.error(f"Error in calculate_avg_pe_5yr for {symbol_ticker}: {e}")
+        return None
 
 def get_latest_bvps(df_equity_annual, symbol_ticker):
-    if df_equity_annual.empty: return None
-    equity_info = df_equity_annual[df_equity_annual['symbol'] == symbol_ticker].sort_values('date', ascending=False)
+    equity_info = _symbol_rows(df_equity_annual, 'equity', symbol_ticker)
     if equity_info.empty: return None
     try:
-        total_equity = pd.to_numeric(equity_info['total_equity'].iloc[0], errors='coerce')
-        shares_out = pd.to_numeric(equity_info['shares_outstanding'].iloc[0], errors='coerce')
+        total_equity = pd.to_numeric(equity_info['total_equity'].iloc[-1], errors='coerce')
+        shares_out = pd.to_numeric(equity_info['shares_outstanding'].iloc[-1], errors='coerce')
         if pd.notna(total_equity) and pd.notna(shares_out) and shares_out != 0:
             return round(total_equity / shares_out, 2)
     except: return None
     return None
 
 def calculate_graham_number(annual_eps, bvps):
-    if annual_eps is None or bvps is None or annual_eps <= 0 or bvps <= 0: return None
-    try: return round(np.sqrt(22.5 * annual_eps * bvps), 2)
-    except: return None
+    return graham_number(annual_eps, bvps)
 
 def calculate_cagr(series_data):
     if not isinstance(series_data, pd.Series) or len(series_data) < 2: return None
@@ -110,36 +327,25 @@ def calculate_cagr(series_data):
     try: return round(((end_val / start_val) ** (1 / num_years) - 1) * 100, 2)
     except: return None
 
+def _annual_eps(fundamentals, symbol_ticker):
+    """The AnnualEpsMatrix to read `symbol_ticker` from: the index's prebuilt one, or one built from a DataFrame."""
+    if isinstance(fundamentals, FundamentalsIndex):
+        return fundamentals.annual_eps
+    return AnnualEpsMatrix.from_eps_history(_symbol_rows(fundamentals, 'eps_history', symbol_ticker))
+
 def calculate_eps_growth_rate(df_eps_hist, symbol_ticker, years=10):
-    if df_eps_hist.empty: return None
-    symbol_data = df_eps_hist[df_eps_hist['symbol'] == symbol_ticker].copy()
-    if symbol_data.empty: return None
     try:
-        symbol_data.loc[:, 'reported'] = pd.to_numeric(symbol_data['reported'], errors='coerce')
-        annual_eps = symbol_data.set_index('date')['reported'].resample('YE').sum().dropna()
-        if len(annual_eps) < 2: return None
-        years_for_growth = min(years, len(annual_eps) - 1)
-        if years_for_growth <= 0: return None
-        return calculate_cagr(annual_eps.tail(years_for_growth + 1))
+        return _annual_eps(df_eps_hist, symbol_ticker).symbol_growth(symbol_ticker, years)
     except Exception as e:
         logger.error(f"Error in calculate_eps_growth_rate for {symbol_ticker}: {e}")
     return None
 
 def calculate_eps_avg(df_eps_hist, symbol_ticker, years=5):
-    if df_eps_hist.empty: return None
-    symbol_data = df_eps_hist[df_eps_hist['symbol'] == symbol_ticker].copy()
-    if symbol_data.empty: return None
-    try:
-        symbol_data.loc[:, 'reported'] = pd.to_numeric(symbol_data['reported'], errors='coerce')
-        annual_eps = symbol_data.set_index('date')['reported'].resample('YE').sum().dropna()
-        return round(annual_eps.tail(years).mean(), 2) if not annual_eps.empty else None
+    try: return _annual_eps(df_eps_hist, symbol_ticker).symbol_average(symbol_ticker, years)
     except: return None
 
 def calculate_intrinsic_value(annual_eps, growth_rate_pct):
-    aaa_yield = getattr(settings, 'CURRENT_AAA_BOND_YIELD', 4.5)
-    if annual_eps is None or annual_eps <= 0 or growth_rate_pct is None or not isinstance(growth_rate_pct, (int, float)): return None
-    try: return round((annual_eps * (7 + growth_rate_pct) * 4.4) / aaa_yield, 2)
-    except: return None
+    return intrinsic_value(annual_eps, growth_rate_pct)
 
 # In django_stock_screener_materio/apps/screener_app/data_services.py
 
@@ -147,195 +353,348 @@ def calculate_intrinsic_value(annual_eps, growth_rate_pct):
 
 
 # ---  FUNCTION FOR THE DETAIL PAGE ---
+def get_returns(symbols):
+    """YTD / 1-3-5-10y CAGR / max drawdown / volatility for many symbols (see returns_engine), indexed by symbol."""
+    period = getattr(settings, 'RETURNS_HISTORY_PERIOD', '10y')
+    return compute_returns(get_market_data_gateway().get_close_matrix(list(dict.fromkeys(symbols)), period))
+
+@memoize('quotes')
 def calculate_historical_returns(symbol_ticker):
-    """Fetches 10 years of price data and calculates YTD, 3, 5, and 10-year returns."""
+    """
+    YTD, 1/3/5/10-year CAGR, max drawdown and volatility in percent. Read from the
+    screener snapshot when the symbol has a row; otherwise computed from its price history.
+    """
     try:
-        hist = yf.Ticker(symbol_ticker).history(period="10y", auto_adjust=True)
-        if hist.empty:
-            return {}
-
-        returns = {}
-        today = hist.index[-1]
-
-        # --- YTD Return ---
-        start_of_year_date = hist.loc[f'{today.year}-01-01':].index.min()
-        if pd.notna(start_of_year_date):
-            price_start_ytd = hist.loc[start_of_year_date, 'Close']
-            price_end_ytd = hist.loc[today, 'Close']
-            if price_start_ytd != 0:
-                returns['ytd'] = round(((price_end_ytd / price_start_ytd) - 1) * 100, 2)
-
-        # --- 3, 5, 10-Year Annualized Returns (CAGR) ---
-        for year in [3, 5, 10]:
-            start_date = today - pd.DateOffset(years=year)
-            actual_start_date = hist.index.asof(start_date)
-
-            if pd.notna(actual_start_date):
-                price_start = hist.loc[actual_start_date, 'Close']
-                price_end = hist.loc[today, 'Close']
-                num_years = (today - actual_start_date).days / 365.25
-                if price_start > 0 and num_years > 0:
-                    cagr = ((price_end / price_start) ** (1 / num_years)) - 1
-                    returns[f'{year}y'] = round(cagr * 100, 2)
-
-        return returns
+        snapshot_row = ScreenerSnapshotRow.objects.filter(symbol=symbol_ticker).first()
+        if snapshot_row is not None and snapshot_row.return_ytd is not None:
+            returns = snapshot_row.returns_data()
+        else:
+            computed = get_returns([symbol_ticker]).loc[symbol_ticker]
+            returns = {
+                'ytd': computed['return_ytd'], **{f'{years}y': computed[f'cagr_{years}y'] for years in CAGR_YEARS},
+                'max_drawdown': computed['max_drawdown'], 'volatility': computed['volatility'],
+            }
+        return {key: float(value) for key, value in returns.items() if value is not None and pd.notna(value)}
     except Exception as e:
         logger.error(f"Failed to calculate historical returns for {symbol_ticker}: {e}")
         return {}
 
 
+# --- Detail Page Data Sources (each one runs independently) ---
+@memoize('quotes')
+def _fetch_profile_and_key_stats(symbol_ticker):
+    """Company profile and key statistics from yfinance `.info`."""
+    info = yf.Ticker(symbol_ticker).info
+
+    # Section 1a: Get Company Profile data
+    profile_data = {
+        'longName': info.get('longName', symbol_ticker),
+        'symbol': info.get('symbol'),
+        'sector': info.get('sector', 'N/A'),
+        'industry': info.get('industry', 'N/A'),
+        'website': info.get('website', '#'),
+        'longBusinessSummary': info.get('longBusinessSummary', 'No summary available.'),
+    }
+
+    # Section 1b: Get Key Statistics
+    key_stats = {
+        "Previous Close": info.get('previousClose'),
+        "Open": info.get('open'),
+        "Bid": f"{info.get('bid', 0)} x {info.get('bidSize', 0)}",
+        "Ask": f"{info.get('ask', 0)} x {info.get('askSize', 0)}",
+        "Day's Range": f"{info.get('dayLow', 'N/A')} - {info.get('dayHigh', 'N/A')}",
+        "52 Week Range": f"{info.get('fiftyTwoWeekLow', 'N/A')} - {info.get('fiftyTwoWeekHigh', 'N/A')}",
+        "Volume": f"{info.get('volume', 0):,}", # Format with commas
+        "Avg. Volume": f"{info.get('averageVolume', 0):,}", # Format with commas
+        "Market Cap (intraday)": f"{info.get('marketCap', 0):,}", # Format with commas
+        "Beta (5Y Monthly)": info.get('beta'),
+        "PE Ratio (TTM)": info.get('trailingPE'),
+        "EPS (TTM)": info.get('trailingEps'),
+        "Earnings Date": datetime.fromtimestamp(info['earningsTimestamp']).strftime('%Y-%m-%d') if 'earningsTimestamp' in info else 'N/A',
+        "Forward Dividend & Yield": f"{info.get('dividendRate', 'N/A')} ({info.get('dividendYield', 0) * 100:.2f}%)" if 'dividendYield' in info and info.get('dividendYield') else 'N/A',
+        "Ex-Dividend Date": datetime.fromtimestamp(info['exDividendDate']).strftime('%Y-%m-%d') if 'exDividendDate' in info else 'N/A',
+        "1y Target Est": info.get('targetMeanPrice'),
+    }
+    return {'profile': profile_data, 'key_stats': key_stats}
+
+@memoize('quotes')
+def _fetch_price_data(symbol_ticker):
+    """1-year chart series and historical returns, both from the shared price history."""
+    chart_data = {}
+    hist_chart = get_yfinance_historical_prices(symbol_ticker, period="1y")
+    if not hist_chart.empty:
+        chart_data = {
+            'dates': [d.strftime('%Y-%m-%d') for d in hist_chart.index],
+            'prices': [round(p, 2) for p in hist_chart['Close']],
+        }
+    return {'chart_data': chart_data, 'returns_data': calculate_historical_returns(symbol_ticker)}
+
+@memoize('fundamentals')
+def _load_financials(symbol_ticker):
+    """Income statement rows from the indexed statement store, newest first."""
+    # Full statements are served by StockFinancialsView
+    financials = {}
+    symbol_income = get_statement_index('income_statement').rows('income_statement', symbol_ticker)
+    if not symbol_income.empty:
+        financials['income_statement'] = symbol_income.iloc[::-1].to_dict('records')
+    return {'financials': financials}
+
+@memoize('fundamentals')
+def _calculate_valuation(symbol_ticker):
+    """Graham number and intrinsic value, valued the same way as the screener (settings.GRAHAM_VALUATION)."""
+    universe_metrics = get_universe_metrics()
+    metrics_row = universe_metrics.loc[symbol_ticker] if symbol_ticker in universe_metrics.index else None
+    return {'calculations': {
+        'graham_number': _metric_value(metrics_row, 'graham_number'),
+        'intrinsic_value': _metric_value(metrics_row, 'intrinsic_value'),
+    }}
+
+# Source name -> (loader, what to show when it fails or times out)
+DETAIL_DATA_SOURCES = {
+    'profile': (_fetch_profile_and_key_stats, lambda symbol: {
+        'profile': {'longName': f"{symbol} (Live data unavailable)"}, 'key_stats': {},
+    }),
+    'prices': (_fetch_price_data, lambda symbol: {'chart_data': {}, 'returns_data': {}}),
+    'financials': (_load_financials, lambda symbol: {'financials': {}}),
+    'calculations': (_calculate_valuation, lambda symbol: {'calculations': {}}),
+}
+
+_detail_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'DETAIL_FETCH_WORKERS', 8), thread_name_prefix='stock-detail',
+)
+
 # --- Main Function for Stock Detail Page ---
+def _detail_payload_cache_key(symbol_ticker):
+    return f"stock_detail:{get_data_version()}:{symbol_ticker}"
+
+
 def get_stock_detail_data(symbol_ticker):
     """
     Fetches all necessary in-depth data for a single stock for its detail page.
+    Serves the payload the precompute worker stored when there is one; otherwise the
+    sources in DETAIL_DATA_SOURCES run concurrently, each with its own timeout
+    (settings.DETAIL_SOURCE_TIMEOUTS); a source that fails or runs late is rendered
+    with its fallback and listed under 'unavailable_sources'.
+    """
+    precomputed = cache.get(_detail_payload_cache_key(symbol_ticker))
+    if precomputed is not None:
+        return precomputed
+    return _fetch_stock_detail_data(symbol_ticker)
+
+
+def precompute_stock_detail_data(symbol_ticker):
+    """
+    Builds the detail payload and stores it for get_stock_detail_data (used by the precompute
+    worker). Payloads with unavailable sources aren't stored. Returns True if it was stored.
     """
+    detail_data = _fetch_stock_detail_data(symbol_ticker)
+    if detail_data['unavailable_sources']:
+        return False
+    ttl = getattr(settings, 'PRECOMPUTE_DETAIL_TTL', 3600)
+    cache.set(_detail_payload_cache_key(symbol_ticker), detail_data, ttl)
+    return True
+
+
+def _fetch_stock_detail_data(symbol_ticker):
     logger.info(f"Fetching ALL detail data for symbol: {symbol_ticker}")
 
-    # Dictionaries to hold all the data we gather
-    profile_data = {}
-    chart_data = {}
-    key_stats = {}
-    returns_data = {}
-    financials = {}
-    calculations = {}
+    timeouts = getattr(settings, 'DETAIL_SOURCE_TIMEOUTS', {})
+    default_timeout = timeouts.get('default', 10)
+    started = time.monotonic()
+    futures = {
+        name: _detail_executor.submit(loader, symbol_ticker)
+        for name, (loader, _) in DETAIL_DATA_SOURCES.items()
+    }
 
-    # --- Part 1: Fetch all real-time and profile data from yfinance ---
-    try:
-        ticker = yf.Ticker(symbol_ticker)
-        info = ticker.info
-
-        # Section 1a: Get Company Profile data
-        profile_data = {
-            'longName': info.get('longName', symbol_ticker),
-            'symbol': info.get('symbol'),
-            'sector': info.get('sector', 'N/A'),
-            'industry': info.get('industry', 'N/A'),
-            'website': info.get('website', '#'),
-            'longBusinessSummary': info.get('longBusinessSummary', 'No summary available.'),
-        }
+    detail_data = {'unavailable_sources': []}
+    for name, future in futures.items():
+        remaining = timeouts.get(name, default_timeout) - (time.monotonic() - started)
+        try:
+            detail_data.update(future.result(timeout=max(remaining, 0)))
+        except FutureTimeoutError:
+            logger.warning(f"Detail source '{name}' timed out for {symbol_ticker}")
+            future.cancel()
+            detail_data.update(DETAIL_DATA_SOURCES[name][1](symbol_ticker))
+            detail_data['unavailable_sources'].append(name)
+        except Exception as e:
+            logger.error(f"Detail source '{name}' failed for {symbol_ticker}: {e}")
+            detail_data.update(DETAIL_DATA_SOURCES[name][1](symbol_ticker))
+            detail_data['unavailable_sources'].append(name)
+
+    return detail_data
+
+# --- Whole-Universe Metrics (computed once per data version) ---
+_universe_metrics = None
+_universe_metrics_lock = threading.Lock()
+
+def get_universe_metrics():
+    """
+    Fundamentals-derived screener metrics for every symbol (one row per ticker), from the
+    vectorized engine. Recomputed only when the fundamentals index is reloaded.
+    """
+    global _universe_metrics
+    fundamentals = get_fundamentals_index()
+    if _universe_metrics is None or _universe_metrics[0] != fundamentals.version:
+        with _universe_metrics_lock:
+            if _universe_metrics is None or _universe_metrics[0] != fundamentals.version:
+                _universe_metrics = (fundamentals.version, compute_universe_metrics(fundamentals))
+    return _universe_metrics[1]
+
+def _metric_value(metrics_row, column):
+    """A metric as a plain float, or None if it is missing."""
+    if metrics_row is None:
+        return None
+    value = metrics_row[column]
+    return None if pd.isna(value) else float(value)
 
-        # Section 1b: Get Data for Stock Chart (1 year)
-        hist_chart = ticker.history(period="1y")
-        if not hist_chart.empty:
-            chart_data = {
-                'dates': [d.strftime('%Y-%m-%d') for d in hist_chart.index],
-                'prices': [round(p, 2) for p in hist_chart['Close']],
-            }
+# --- NEW High-Performance Main Orchestrating Function ---
+def _fundamentals_cells(symbol, universe_metrics):
+    """The cells of a screener row that come from the universe metrics alone (no prices)."""
+    metrics_row = universe_metrics.loc[symbol] if symbol in universe_metrics.index else None
+    eps_growth = _metric_value(metrics_row, 'eps_growth')
+    if metrics_row is not None and metrics_row['eps_growth_complex']:
+        eps_growth = "N/A (Complex)"
+    return {
+        "Symbol": symbol.upper(),
+        "Graham Num": _metric_value(metrics_row, 'graham_number'),
+        "Intrinsic Val": _metric_value(metrics_row, 'intrinsic_value'),
+        "EPS AVG (5yr)": _metric_value(metrics_row, 'eps_avg_5yr'),
+        "Growth Rate (avg past 10 yrs)": f"{eps_growth}%" if isinstance(eps_growth, (int,float)) else eps_growth if eps_growth else "N/A",
+    }
 
-        # Section 1c: Get Key Statistics
-        key_stats = {
-            "Previous Close": info.get('previousClose'),
-            "Open": info.get('open'),
-            "Bid": f"{info.get('bid', 0)} x {info.get('bidSize', 0)}",
-            "Ask": f"{info.get('ask', 0)} x {info.get('askSize', 0)}",
-            "Day's Range": f"{info.get('dayLow', 'N/A')} - {info.get('dayHigh', 'N/A')}",
-            "52 Week Range": f"{info.get('fiftyTwoWeekLow', 'N/A')} - {info.get('fiftyTwoWeekHigh', 'N/A')}",
-            "Volume": f"{info.get('volume', 0):,}", # Format with commas
-            "Avg. Volume": f"{info.get('averageVolume', 0):,}", # Format with commas
-            "Market Cap (intraday)": f"{info.get('marketCap', 0):,}", # Format with commas
-            "Beta (5Y Monthly)": info.get('beta'),
-            "PE Ratio (TTM)": info.get('trailingPE'),
-            "EPS (TTM)": info.get('trailingEps'),
-            "Earnings Date": datetime.fromtimestamp(info['earningsTimestamp']).strftime('%Y-%m-%d') if 'earningsTimestamp' in info else 'N/A',
-            "Forward Dividend & Yield": f"{info.get('dividendRate', 'N/A')} ({info.get('dividendYield', 0) * 100:.2f}%)" if 'dividendYield' in info and info.get('dividendYield') else 'N/A',
-            "Ex-Dividend Date": datetime.fromtimestamp(info['exDividendDate']).strftime('%Y-%m-%d') if 'exDividendDate' in info else 'N/A',
-            "1y Target Est": info.get('targetMeanPrice'),
-        }
+def _quote_cells(symbol, yf_data, universe_metrics):
+    """The cells of a screener row that depend on the symbol's quote."""
+    prev_close = yf_data.get('prev_close')
+    metrics_row = universe_metrics.loc[symbol] if symbol in universe_metrics.index else None
+    graham_num = _metric_value(metrics_row, 'graham_number')
+    intrinsic_val = _metric_value(metrics_row, 'intrinsic_value')
 
-    except Exception as e:
-        logger.error(f"yfinance fetch failed for detail page of {symbol_ticker}: {e}")
-        profile_data['longName'] = f"{symbol_ticker} (Live data unavailable)"
+    graham_diff = round(((prev_close - graham_num) / graham_num) * 100, 2) if prev_close and graham_num and graham_num != 0 else None
+    intrinsic_diff = round(((prev_close - intrinsic_val) / intrinsic_val) * 100, 2) if prev_close and intrinsic_val and intrinsic_val != 0 else None
+    return {
+        "Company Name": yf_data.get('company_name', symbol),
+        "Prev. Close": prev_close,
+        "Graham Diff %": f"{graham_diff}%" if graham_diff is not None else "N/A",
+        "Intrinsic Diff %": f"{intrinsic_diff}%" if intrinsic_diff is not None else "N/A",
+    }
 
+def _returns_cells(returns):
+    return {header: _percent_or_na(returns, column) for header, column in RETURN_HEADERS.items()}
+
+def _screener_row(symbol, yf_data, universe_metrics, avg_pe, returns=None):
+    """One screener table row (keyed by table header) from the symbol's quote, universe metrics, 5yr P/E and returns."""
+    return {
+        **_quote_cells(symbol, yf_data, universe_metrics),
+        **_fundamentals_cells(symbol, universe_metrics),
+        "Avg P/E (5yr)": avg_pe,
+        **_returns_cells(returns),
+    }
 
-    # --- Part 2: Calculate Historical Returns ---
-    returns_data = calculate_historical_returns(symbol_ticker)
 
+# Screener table header -> returns_engine column
+RETURN_HEADERS = {
+    "YTD %": 'return_ytd',
+    "CAGR 5y %": 'cagr_5y',
+    "Max Drawdown %": 'max_drawdown',
+    "Volatility %": 'volatility',
+}
 
-    # --- Part 3: Get Financial Statements from Local CSVs ---
-    # (This logic can be expanded to show more detailed tables later)
-    df_income = load_csv_data('income_statement')
-    if not df_income.empty:
-        symbol_income = df_income[df_income['symbol'] == symbol_ticker].sort_values('date', ascending=False)
-        financials['income_statement'] = symbol_income.to_dict('records')
+def _percent_or_na(values, column):
+    value = values.get(column) if values is not None else None
+    return f"{round(float(value), 2)}%" if value is not None and pd.notna(value) else "N/A"
 
+def _optional_float(value):
+    return None if value is None or pd.isna(value) else float(value)
 
-    # --- Part 4: Perform Graham and Intrinsic Value Calculations ---
-    # Load necessary dataframes for the single symbol
-    df_cash_flow_annual = load_csv_data('cash_flow', usecols=['act_symbol', 'date', 'period', 'diluted_net_eps'], filter_annual=True)
-    df_equity_annual = load_csv_data('equity', usecols=['act_symbol', 'date', 'period', 'total_equity', 'shares_outstanding'], filter_annual=True)
-    df_eps_history = load_csv_data('eps_history', usecols=['act_symbol', 'period_end_date', 'reported'])
 
-    # Perform calculations by calling the helpers we already built
-    latest_annual_eps = get_latest_annual_eps(df_cash_flow_annual, symbol_ticker)
-    bvps = get_latest_bvps(df_equity_annual, symbol_ticker)
-    eps_growth = calculate_eps_growth_rate(df_eps_history, symbol_ticker)
+def _screener_page_data(symbols_to_process):
+    """Everything the rows of one screener page need, each fetched once for the whole page."""
+    # Fundamentals metrics for the whole universe come from the vectorized engine
+    universe_metrics = get_universe_metrics()
 
-    graham_num = calculate_graham_number(latest_annual_eps, bvps)
-    intrinsic_val = calculate_intrinsic_value(latest_annual_eps, eps_growth)
+    # Prices and names for the whole page arrive in one batched fetch
+    quotes = get_market_data_gateway().get_quotes(symbols_to_process)
 
-    calculations = {
-        'graham_number': graham_num,
-        'intrinsic_value': intrinsic_val
-    }
+    # Historical P/E for the whole page in one as-of merge
+    avg_pes = get_pe_stats(symbols_to_process)['pe_mean']
 
-    # --- Part 5: Combine all data into a single dictionary ---
-    return {
-        'profile': profile_data,
-        'chart_data': chart_data,
-        'key_stats': key_stats,
-        'returns_data': returns_data,
-        'financials': financials,
-        'calculations': calculations,
-    }
+    # Returns for the whole page in one pass over the close matrix
+    returns = get_returns(symbols_to_process)
 
+    def row(symbol):
+        return _screener_row(symbol, quotes.get(symbol, {}), universe_metrics, _optional_float(avg_pes.get(symbol)), returns.loc[symbol].to_dict())
 
-    # Save the combined data to the cache for 1 hour (3600 seconds)
-   # cache.set(cache_key, final_data, 3600)
+    return row
 
-    #return final_data
 
-# --- NEW High-Performance Main Orchestrating Function ---
 def get_screener_data_for_symbols(symbols_to_process):
     if not symbols_to_process:
         return []
 
     logger.info(f"--- Starting data processing for {len(symbols_to_process)} symbols for current page ---")
+    row = _screener_page_data(symbols_to_process)
+    return [row(symbol) for symbol in symbols_to_process]
 
-    # Load dataframes only when this function is called
-    df_cash_flow_annual = load_csv_data('cash_flow', usecols=['act_symbol', 'date', 'period', 'diluted_net_eps'], filter_annual=True)
-    df_equity_annual = load_csv_data('equity', usecols=['act_symbol', 'date', 'period', 'total_equity', 'shares_outstanding'], filter_annual=True)
-    df_eps_history = load_csv_data('eps_history', usecols=['act_symbol', 'period_end_date', 'reported'])
-
-    all_processed_data = []
-    for symbol in symbols_to_process:
-        # The full calculation loop from our previous version goes here
-        # This logic is now only performed for the stocks on the current page
-        yf_data = get_yfinance_supplemental_data(symbol)
-        prev_close = yf_data.get('prev_close')
-
-        latest_annual_eps = get_latest_annual_eps(df_cash_flow_annual, symbol)
-        avg_pe = calculate_avg_pe_5yr(symbol, latest_annual_eps)
-        bvps = get_latest_bvps(df_equity_annual, symbol)
-        graham_num = calculate_graham_number(latest_annual_eps, bvps)
-        eps_growth = calculate_eps_growth_rate(df_eps_history, symbol)
-        eps_avg_5yr = calculate_eps_avg(df_eps_history, symbol, years=5)
-        intrinsic_val = calculate_intrinsic_value(latest_annual_eps, eps_growth)
-
-        # ... (graham_diff and intrinsic_diff calculations) ...
-        graham_diff = round(((prev_close - graham_num) / graham_num) * 100, 2) if prev_close and graham_num and graham_num != 0 else None
-        intrinsic_diff = round(((prev_close - intrinsic_val) / intrinsic_val) * 100, 2) if prev_close and intrinsic_val and intrinsic_val != 0 else None
-
-        all_processed_data.append({
-            "Company Name": yf_data.get('company_name', symbol),
-            "Symbol": symbol.upper(),
-            "Prev. Close": prev_close,
-            "Avg P/E (5yr)": avg_pe,
-            "Graham Num": graham_num,
-            "Graham Diff %": f"{graham_diff}%" if graham_diff is not None else "N/A",
-            "Intrinsic Val": intrinsic_val,
-            "Intrinsic Diff %": f"{intrinsic_diff}%" if intrinsic_diff is not None else "N/A",
-            "EPS AVG (5yr)": eps_avg_5yr,
-            "Growth Rate (avg past 10 yrs)": f"{eps_growth}%" if isinstance(eps_growth, (int,float)) else eps_growth if eps_growth else "N/A",
-        })
 
-    return all_processed_data
+# --- Streamed Screener Rows ---
+# Each part takes (symbols, universe_metrics) and returns {symbol: cells}; its fallback gives one symbol's cells as N/A
+def _quote_part(symbols, universe_metrics):
+    quotes = get_market_data_gateway().get_quotes(symbols)
+    return {symbol: _quote_cells(symbol, quotes.get(symbol, {}), universe_metrics) for symbol in symbols}
+
+def _pe_part(symbols, universe_metrics):
+    avg_pes = get_pe_stats(symbols)['pe_mean']
+    return {symbol: {"Avg P/E (5yr)": _optional_float(avg_pes.get(symbol))} for symbol in symbols}
+
+def _returns_part(symbols, universe_metrics):
+    returns = get_returns(symbols)
+    return {symbol: _returns_cells(returns.loc[symbol].to_dict()) for symbol in symbols}
+
+SCREENER_ROW_PARTS = {
+    'quotes': (_quote_part, lambda symbol, universe_metrics: _quote_cells(symbol, {}, universe_metrics)),
+    'pe': (_pe_part, lambda symbol, universe_metrics: {"Avg P/E (5yr)": None}),
+    'returns': (_returns_part, lambda symbol, universe_metrics: _returns_cells(None)),
+}
+
+_screener_stream_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'SCREENER_STREAM_WORKERS', 8), thread_name_prefix='screener-rows',
+)
+
+
+def iter_screener_rows(symbols_to_process):
+    """
+    Yields (position, cells) for a screener page as each part of its rows becomes ready.
+    The fundamentals cells of every row come first, straight from the in-memory universe
+    metrics. The quote, P/E and returns cells (SCREENER_ROW_PARTS) follow. They are fetched
+    concurrently in batches of settings.SCREENER_STREAM_CHUNK symbols and yielded as each
+    batch finishes. A part that fails is yielded with its cells as N/A.
+    """
+    if not symbols_to_process:
+        return
+    universe_metrics = get_universe_metrics()
+    for position, symbol in enumerate(symbols_to_process):
+        try:
+            yield position, _fundamentals_cells(symbol, universe_metrics)
+        except Exception as e:
+            logger.error(f"Screener row for {symbol} failed: {e}")
+            yield position, {"Symbol": symbol.upper()}
+
+    chunk_size = max(getattr(settings, 'SCREENER_STREAM_CHUNK', 5), 1)
+    positions = list(enumerate(symbols_to_process))
+    futures = {}
+    for offset in range(0, len(positions), chunk_size):
+        chunk = positions[offset:offset + chunk_size]
+        symbols = [symbol for _, symbol in chunk]
+        for name, (fetch, _) in SCREENER_ROW_PARTS.items():
+            futures[_screener_stream_executor.submit(fetch, symbols, universe_metrics)] = (name, chunk)
+
+    for future in as_completed(futures):
+        name, chunk = futures[future]
+        try:
+            cells = future.result()
+        except Exception as e:
+            logger.error(f"Screener {name} for {[symbol for _, symbol in chunk]} failed: {e}")
+            fallback = SCREENER_ROW_PARTS[name][1]
+            cells = {symbol: fallback(symbol, universe_metrics) for _, symbol in chunk}
+        for position, symbol in chunk:
+            yield position, cells[symbol]
@@ -0,0 +1,134 @@
+# /apps/grahams_table/eps_matrix.py
+"""
+Annual EPS for every symbol as one NumPy matrix (symbol x year), built with a
+single grouped aggregation when the FundamentalsIndex loads.
+
+Each row holds a symbol's complete years right-aligned (the last column is its
+latest complete year), with the matching calendar years alongside, so CAGR,
+averages and any N-year window are a couple of array lookups per symbol, or a
+handful of vectorized operations for the whole universe.
+
+A year counts only when it is complete: it must have a full year of EPS
+reports, i.e. at least four quarters (or, for a symbol that never reports four
+times a year, as many reports as its busiest year). A 52/53-week fiscal
+calendar occasionally puts five quarters in one calendar year; that year is
+still complete and does not make the usual four-quarter years look partial.
+Missing years and partial ones, such as the current year before its last
+quarter, are left out instead of being counted as 0 or as a fraction of a year.
+"""
+import numpy as np
+import pandas as pd
+
+QUARTERS_PER_YEAR = 4
+
+
+class AnnualEpsMatrix:
+
+    def __init__(self, symbols, years, values):
+        self.symbols = pd.Index(symbols)
+        self.years = years      # (symbols x slots) calendar year of each value, NaN where empty
+        self.values = values    # (symbols x slots) annual EPS, right-aligned, NaN where empty
+        self.counts = (~np.isnan(values)).sum(axis=1) if values.size else np.zeros(len(self.symbols), dtype=int)
+        self.positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def from_eps_history(cls, df_eps_hist):
+        """Builds the matrix from EPS history rows ('symbol', 'date', 'reported')."""
+        eps = df_eps_hist.dropna(subset=['date']) if not df_eps_hist.empty else df_eps_hist
+        if eps.empty:
+            return cls([], np.empty((0, 0)), np.empty((0, 0)))
+
+        reported = pd.to_numeric(eps['reported'], errors='coerce')
+        grouped = reported.groupby([eps['symbol'].to_numpy(), eps['date'].dt.year.to_numpy()])
+        annual = pd.DataFrame({'eps': grouped.sum(min_count=1), 'reports': grouped.count()})
+
+        # Complete years only: four quarters, or the busiest year's count for symbols reporting less often
+        full_year = np.minimum(annual['reports'].groupby(level=0).transform('max'), QUARTERS_PER_YEAR)
+        annual = annual[(annual['reports'] >= full_year) & annual['eps'].notna()]
+        if annual.empty:
+            return cls([], np.empty((0, 0)), np.empty((0, 0)))
+
+        symbol_codes, symbols = pd.factorize(annual.index.get_level_values(0), sort=True)
+        year_values = annual.index.get_level_values(1).to_numpy(dtype=float)
+        counts = np.bincount(symbol_codes, minlength=len(symbols))
+        width = counts.max()
+
+        # Rows are sorted by (symbol, year): slot = width - (years remaining for the symbol)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        rank_in_symbol = np.arange(len(symbol_codes)) - starts[symbol_codes]
+        slots = width - counts[symbol_codes] + rank_in_symbol
+
+        years = np.full((len(symbols), width), np.nan)
+        values = np.full((len(symbols), width), np.nan)
+        years[symbol_codes, slots] = year_values
+        values[symbol_codes, slots] = annual['eps'].to_numpy(dtype=float)
+        return cls(symbols, years, values)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    # --- Whole universe ---
+    def window(self, years):
+        """(values, years) of every symbol's last `years` complete years, NaN-padded on the left."""
+        years = max(1, min(years, self.values.shape[1])) if self.values.size else 0
+        return self.values[:, -years:], self.years[:, -years:]
+
+    def growth(self, years=10):
+        """
+        EPS CAGR in percent over the last min(`years`, available - 1) complete years for every symbol,
+        plus a flag for sign changes / negative bases where a CAGR is meaningless ('complex').
+        """
+        span = np.minimum(years, self.counts - 1)
+        valid = span > 0
+        width = self.values.shape[1]
+        rows = np.arange(len(self.symbols))
+        start_slot = np.clip(width - 1 - span, 0, max(width - 1, 0))
+        start = np.where(valid, self.values[rows, start_slot], np.nan) if width else np.full(len(rows), np.nan)
+        end = np.where(valid, self.values[rows, -1], np.nan) if width else np.full(len(rows), np.nan)
+        elapsed = np.where(valid, self.years[rows, -1] - self.years[rows, start_slot], 1) if width else np.ones(len(rows))
+
+        complex_growth = valid & (((start < 0) & (end != 0)) | ((start > 0) & (end < 0)))
+        plain = valid & (start != 0) & ~complex_growth
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = np.where(plain, ((end / start) ** (1 / np.where(plain, elapsed, 1)) - 1) * 100, np.nan)
+        return growth, complex_growth
+
+    def average(self, years=5):
+        """Mean EPS over every symbol's last `years` complete years (NaN without any)."""
+        values, _ = self.window(years)
+        counts = (~np.isnan(values)).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, np.nansum(values, axis=1) / np.maximum(counts, 1), np.nan)
+
+    # --- One symbol ---
+    def series(self, symbol_ticker):
+        """The symbol's complete years as a Series (year -> EPS), oldest first."""
+        i = self.positions.get(symbol_ticker)
+        if i is None:
+            return pd.Series(dtype=float)
+        filled = ~np.isnan(self.values[i])
+        return pd.Series(self.values[i][filled], index=self.years[i][filled].astype(int))
+
+    def symbol_growth(self, symbol_ticker, years=10):
+        """CAGR in percent (rounded), "N/A (Complex)", or None if it can't be computed."""
+        i = self.positions.get(symbol_ticker)
+        if i is None:
+            return None
+        span = min(years, self.counts[i] - 1)
+        if span <= 0:
+            return None
+        start, end = self.values[i, -1 - span], self.values[i, -1]
+        if start == 0:
+            return None
+        if (start < 0 and end != 0) or (start > 0 and end < 0):
+            return "N/A (Complex)"
+        elapsed = self.years[i, -1] - self.years[i, -1 - span]
+        return round(float(((end / start) ** (1 / elapsed) - 1) * 100), 2)
+
+    def symbol_average(self, symbol_ticker, years=5):
+        """Mean EPS over the symbol's last `years` complete years (rounded), or None."""
+        i = self.positions.get(symbol_ticker)
+        if i is None or self.counts[i] == 0:
+            return None
+        recent = self.values[i, -min(years, self.counts[i]):]
+        return round(float(recent.mean()), 2)
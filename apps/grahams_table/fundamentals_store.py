@@ -0,0 +1,204 @@
+# /apps/grahams_table/fundamentals_store.py
+"""
+Columnar on-disk copy of the DoltHub fundamentals CSVs.
+
+Each file in DOLTHUB_FILENAMES_CONFIG is parsed once, typed (dates parsed),
+sorted by symbol and period end, and written to a Parquet file next to a small
+JSON manifest holding the source CSV's mtime/size. Reads go to the Parquet file
+and only load the requested columns; the file is rebuilt automatically as soon
+as the source CSV changes. A rebuild holds a per-store file lock, so workers
+finding the same store stale build it once, and every file is written through
+a unique temp file (write_atomic).
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+import pandas as pd
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Raw DoltHub column names (before load_csv_data renames them)
+SYMBOL_COLUMN = 'act_symbol'
+DATE_COLUMNS = ('date', 'period_end_date')
+
+STORE_FORMAT_VERSION = 1
+
+
+def get_store_path():
+    """Directory holding the columnar files. Defaults to '<DOLT_EARNINGS_DATA_PATH>/columnar'."""
+    store_path = getattr(settings, 'FUNDAMENTALS_STORE_PATH', None)
+    if not store_path:
+        store_path = os.path.join(settings.DOLT_EARNINGS_DATA_PATH, 'columnar')
+    return store_path
+
+
+def get_source_signature(csv_path):
+    """The mtime/size pair used to decide whether the store is stale."""
+    stat = os.stat(csv_path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+# --- Safe writes ---
+def write_atomic(path, write, suffix='.tmp'):
+    """
+    Calls write(tmp_path) on a uniquely named temp file next to `path`, then moves it into
+    place, so readers never see a half-written file and concurrent writers never share a temp file.
+    `suffix` is for writers that pick the format from the file extension.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f".{os.path.basename(path)}.", suffix=suffix)
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Exclusive lock on `lock_path` held for the block, across processes (gunicorn workers, commands)."""
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    with open(lock_path, 'a+') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10s; keep waiting
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# --- Store ---
+def _store_files(config_key):
+    store_path = get_store_path()
+    return (
+        os.path.join(store_path, f"{config_key}.parquet"),
+        os.path.join(store_path, f"{config_key}.manifest.json"),
+    )
+
+
+def _read_manifest(manifest_file):
+    try:
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_store_current(config_key, csv_path):
+    data_file, manifest_file = _store_files(config_key)
+    if not os.path.exists(data_file):
+        return False
+    manifest = _read_manifest(manifest_file)
+    if not manifest or manifest.get('format_version') != STORE_FORMAT_VERSION:
+        return False
+    return manifest.get('source') == get_source_signature(csv_path)
+
+
+def build_store(config_key, csv_path, only_if_stale=False):
+    """
+    Converts one CSV into its sorted, typed Parquet file. Returns the number of rows written.
+    Builds of the same store are serialised across processes; with `only_if_stale`, a build
+    that finds the store already rebuilt by another process returns None without doing anything.
+    """
+    data_file, manifest_file = _store_files(config_key)
+    os.makedirs(os.path.dirname(data_file), exist_ok=True)
+
+    with file_lock(os.path.join(os.path.dirname(data_file), f"{config_key}.lock")):
+        if only_if_stale and is_store_current(config_key, csv_path):
+            return None
+
+        # Take the signature before reading so a CSV rewritten mid-build is picked up next time
+        source_signature = get_source_signature(csv_path)
+        df = pd.read_csv(csv_path)
+
+        sort_columns = []
+        if SYMBOL_COLUMN in df.columns:
+            sort_columns.append(SYMBOL_COLUMN)
+        for date_column in DATE_COLUMNS:
+            if date_column in df.columns:
+                df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
+                sort_columns.append(date_column)
+        if sort_columns:
+            df.sort_values(sort_columns, inplace=True, kind='stable', ignore_index=True)
+
+        # Drop the old manifest before swapping the data file in, so the new data is never
+        # paired with the old source signature (readers without a manifest wait for this build)
+        try:
+            os.remove(manifest_file)
+        except FileNotFoundError:
+            pass
+        write_atomic(data_file, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+        manifest = json.dumps({
+            'format_version': STORE_FORMAT_VERSION,
+            'source': source_signature,
+            'source_file': os.path.basename(csv_path),
+            'rows': len(df),
+            'sorted_by': sort_columns,
+        })
+        write_atomic(manifest_file, lambda tmp_path: _write_text(tmp_path, manifest))
+
+    logger.info(f"Built columnar store for '{config_key}' ({len(df)} rows) at {data_file}")
+    return len(df)
+
+
+def _write_text(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def read_fundamentals(config_key, csv_path, usecols=None):
+    """
+    Returns the contents of `csv_path` (restricted to `usecols`), served from the
+    columnar store. The store is (re)built first if it is missing or stale. If the
+    store can't be used (e.g. no Parquet engine installed) the CSV is read directly.
+    """
+    try:
+        if not is_store_current(config_key, csv_path):
+            build_store(config_key, csv_path, only_if_stale=True)
+        data_file, _ = _store_files(config_key)
+        return pd.read_parquet(data_file, columns=list(usecols) if usecols else None)
+    except (ImportError, OSError) as e:
+        logger.warning(f"Columnar store unavailable for '{config_key}', reading CSV directly: {e}")
+        return pd.read_csv(csv_path, usecols=usecols)
+
+
+def get_data_version(config_keys=None):
+    """
+    A short stamp that changes whenever any of the given source CSVs (default: all of
+    DOLTHUB_FILENAMES_CONFIG) is modified, added or removed.
+    """
+    filenames = getattr(settings, 'DOLTHUB_FILENAMES_CONFIG', {})
+    base_path = getattr(settings, 'DOLT_EARNINGS_DATA_PATH', '')
+    signatures = []
+    for config_key in sorted(config_keys or filenames):
+        try:
+            signature = get_source_signature(os.path.join(base_path, filenames[config_key]))
+            signatures.append(f"{config_key}:{signature['mtime_ns']}:{signature['size']}")
+        except (KeyError, OSError):
+            signatures.append(f"{config_key}:missing")
+    return hashlib.sha1('|'.join(signatures).encode()).hexdigest()[:12]
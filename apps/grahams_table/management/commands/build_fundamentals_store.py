@@ -0,0 +1,27 @@
+# /apps/grahams_table/management/commands/build_fundamentals_store.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.grahams_table.data_services import get_csv_file_path
+from apps.grahams_table.fundamentals_store import build_store, is_store_current
+
+
+class Command(BaseCommand):
+    help = "Converts the DoltHub CSVs in DOLTHUB_FILENAMES_CONFIG into the columnar fundamentals store."
+
+    def add_arguments(self, parser):
+        parser.add_argument('config_keys', nargs='*', help="Only build these DOLTHUB_FILENAMES_CONFIG keys.")
+        parser.add_argument('--force', action='store_true', help="Rebuild even if the store is up to date.")
+
+    def handle(self, *args, **options):
+        config_keys = options['config_keys'] or list(settings.DOLTHUB_FILENAMES_CONFIG)
+        for config_key in config_keys:
+            csv_path = get_csv_file_path(config_key)
+            if not csv_path:
+                self.stderr.write(f"Skipping '{config_key}': source CSV not found.")
+                continue
+            if not options['force'] and is_store_current(config_key, csv_path):
+                self.stdout.write(f"'{config_key}' is up to date.")
+                continue
+            rows = build_store(config_key, csv_path)
+            self.stdout.write(self.style.SUCCESS(f"Built '{config_key}' ({rows} rows)."))
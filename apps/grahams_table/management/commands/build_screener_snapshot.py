@@ -0,0 +1,17 @@
+# /apps/grahams_table/management/commands/build_screener_snapshot.py
+import time
+from django.core.management.base import BaseCommand
+
+from apps.grahams_table.snapshot import build_screener_snapshot
+
+
+class Command(BaseCommand):
+    help = "Recomputes all screener columns and stores them in the screener snapshot table. Run it periodically (e.g. nightly via cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="Only rebuild these symbols (default: the whole screener universe).")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = build_screener_snapshot(symbols=[s.upper() for s in options['symbols']] or None)
+        self.stdout.write(self.style.SUCCESS(f"Screener snapshot: {rows} rows in {time.monotonic() - started:.1f}s."))
@@ -0,0 +1,31 @@
+# /apps/grahams_table/management/commands/prefilter_tickers.py
+from django.core.management.base import BaseCommand
+
+from apps.grahams_table.prefilter import prefilter_tickers, MANIFEST_FILENAME, VALID_TICKERS_FILENAME
+
+
+class Command(BaseCommand):
+    help = (
+        f"Builds {VALID_TICKERS_FILENAME}, the screener universe, and {MANIFEST_FILENAME}, which records "
+        "why every excluded ticker was left out. Re-runs only re-check tickers whose data changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check-prices', action='store_true',
+                            help="Also require recent stored price history (PRICE_HISTORY_PATH).")
+        parser.add_argument('--full', action='store_true', help="Ignore the previous manifest and re-check every ticker.")
+        parser.add_argument('--workers', type=int, default=None, help="Processes for the per-ticker checks.")
+        parser.add_argument('--min-annual-periods', type=int, default=None,
+                            help="Minimum annual reporting periods (default: SCREENER_MIN_ANNUAL_PERIODS).")
+
+    def handle(self, *args, **options):
+        summary = prefilter_tickers(
+            check_prices=options['check_prices'],
+            full=options['full'],
+            workers=options['workers'],
+            min_annual_periods=options['min_annual_periods'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['eligible']} of {summary['total']} tickers are valid for the screener "
+            f"({summary['reevaluated']} re-evaluated) in {summary['seconds']}s."
+        ))
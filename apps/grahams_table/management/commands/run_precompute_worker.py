@@ -0,0 +1,60 @@
+# /apps/grahams_table/management/commands/run_precompute_worker.py
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.grahams_table.fundamentals_store import get_data_version
+from apps.grahams_table.precompute import (
+    make_worker_id, make_executor, enqueue_universe, requeue_stale_jobs, process_next_batch,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the precompute worker: consumes the PrecomputeJob queue and writes screener rows into "
+        "the snapshot table and detail page payloads into the cache, so page requests only read. "
+        "The whole universe is re-queued every PRECOMPUTE_SWEEP_INTERVAL seconds and whenever the "
+        "fundamentals data changes; symbols viewed recently are processed first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Jobs claimed per kind and round (default: PRECOMPUTE_BATCH_SIZE).")
+        parser.add_argument('--workers', type=int, default=None, help="Threads per batch (default: PRECOMPUTE_WORKERS).")
+        parser.add_argument('--once', action='store_true', help="Sweep once, drain the queue and exit.")
+        parser.add_argument('--no-sweep', action='store_true', help="Only process jobs already queued (e.g. viewed symbols).")
+
+    def handle(self, *args, **options):
+        worker_id = make_worker_id()
+        batch_size = options['batch_size'] or getattr(settings, 'PRECOMPUTE_BATCH_SIZE', 200)
+        sweep_interval = getattr(settings, 'PRECOMPUTE_SWEEP_INTERVAL', 900)
+        idle_sleep = getattr(settings, 'PRECOMPUTE_IDLE_SLEEP', 2)
+        executor = make_executor(options['workers'])
+        self.stdout.write(f"Precompute worker {worker_id} started.")
+
+        last_sweep, swept_version = None, None
+        try:
+            while True:
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    self.stderr.write(f"Re-queued {requeued} jobs abandoned by another worker.")
+
+                version = get_data_version()
+                sweep_due = last_sweep is None or time.monotonic() - last_sweep >= sweep_interval or version != swept_version
+                if sweep_due and not options['no_sweep']:
+                    queued = enqueue_universe()
+                    last_sweep, swept_version = time.monotonic(), version
+                    self.stdout.write(f"Queued the universe ({queued} symbols, data version {version}).")
+
+                started = time.monotonic()
+                processed = process_next_batch(worker_id, executor, batch_size)
+                if processed:
+                    self.stdout.write(f"Processed {processed} jobs in {time.monotonic() - started:.1f}s.")
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(idle_sleep)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping precompute worker.")
+        finally:
+            executor.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS(f"Precompute worker {worker_id} stopped."))
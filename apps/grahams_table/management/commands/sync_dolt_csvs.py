@@ -0,0 +1,155 @@
+# /apps/grahams_table/management/commands/sync_dolt_csvs.py
+import io
+import os
+import json
+import time
+import shutil
+import subprocess
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.grahams_table.fundamentals_store import write_atomic, file_lock
+
+# Watermarks (last synced Dolt commit per table) live next to the CSVs
+STATE_FILENAME = '.dolt_sync_state.json'
+# Held for the whole run, so a cron run and a manual one never sync at the same time
+LOCK_FILENAME = '.dolt_sync.lock'
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports the DoltHub earnings tables from the local Dolt repo (DOLT_REPO_PATH) into "
+        "DOLT_EARNINGS_DATA_PATH. After the first full export only rows changed since the last "
+        "synced commit are applied."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('config_keys', nargs='*', help="Only sync these DOLTHUB_FILENAMES_CONFIG keys.")
+        parser.add_argument('--no-pull', action='store_true', help="Don't 'dolt pull' before exporting.")
+        parser.add_argument('--full', action='store_true', help="Ignore the watermarks and re-export every table.")
+
+    def handle(self, *args, **options):
+        self.repo_path = getattr(settings, 'DOLT_REPO_PATH', None)
+        if not self.repo_path or not os.path.isdir(self.repo_path):
+            raise CommandError(f"Dolt repo not found at DOLT_REPO_PATH={self.repo_path!r}.")
+        data_path = settings.DOLT_EARNINGS_DATA_PATH
+        os.makedirs(data_path, exist_ok=True)
+        with file_lock(os.path.join(data_path, LOCK_FILENAME)):
+            self._sync(data_path, options)
+
+    def _sync(self, data_path, options):
+        if not options['no_pull']:
+            started = time.monotonic()
+            self._dolt('pull')
+            self.stdout.write(f"dolt pull finished in {time.monotonic() - started:.1f}s")
+
+        head = self._query("SELECT HASHOF('HEAD') AS head")['head'].iloc[0]
+        state_file = os.path.join(data_path, STATE_FILENAME)
+        state = self._read_state(state_file)
+
+        filenames = settings.DOLTHUB_FILENAMES_CONFIG
+        for config_key in options['config_keys'] or list(filenames):
+            if config_key not in filenames:
+                self.stderr.write(f"Skipping unknown config key '{config_key}'.")
+                continue
+            filename = filenames[config_key]
+            table = os.path.splitext(filename)[0]
+            csv_path = os.path.join(data_path, filename)
+            watermark = None if options['full'] else state.get(table, {}).get('commit')
+
+            started = time.monotonic()
+            if watermark == head and os.path.exists(csv_path):
+                mode, rows = 'up to date', 0
+            elif watermark and os.path.exists(csv_path):
+                mode, rows = self._apply_changes(table, csv_path, watermark, head)
+            else:
+                mode, rows = 'full export', self._export_table(table, csv_path)
+
+            state[table] = {'commit': head, 'synced_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+            self._write_state(state_file, state)
+            self.stdout.write(self.style.SUCCESS(
+                f"{table}: {rows} rows ({mode}) in {time.monotonic() - started:.1f}s"
+            ))
+
+    # --- Dolt helpers ---
+    def _dolt(self, *args):
+        executable = getattr(settings, 'DOLT_EXECUTABLE', 'dolt')
+        try:
+            result = subprocess.run(
+                [executable, *args], cwd=self.repo_path, capture_output=True, text=True, check=True,
+            )
+        except FileNotFoundError:
+            raise CommandError(f"'{executable}' not found. Install Dolt or set DOLT_EXECUTABLE.")
+        except subprocess.CalledProcessError as e:
+            raise CommandError(f"dolt {' '.join(args)} failed: {e.stderr.strip()}")
+        return result.stdout
+
+    def _query(self, sql):
+        """Runs a query and returns the result with every value kept as the exact text Dolt printed."""
+        output = self._dolt('sql', '-r', 'csv', '-q', sql)
+        if not output.strip():
+            return pd.DataFrame()
+        return pd.read_csv(io.StringIO(output), dtype=str, keep_default_na=False)
+
+    def _primary_key(self, table):
+        keys = self._query(
+            "SELECT column_name FROM information_schema.key_column_usage "
+            f"WHERE table_name = '{table}' AND constraint_name = 'PRIMARY' ORDER BY ordinal_position"
+        )
+        if keys.empty:
+            raise CommandError(f"Table '{table}' has no primary key; run with --full.")
+        return list(keys.iloc[:, 0])
+
+    # --- Export strategies ---
+    def _export_table(self, table, csv_path):
+        # Dolt picks the export format from the extension
+        write_atomic(csv_path, lambda tmp_path: self._dolt('table', 'export', '--force', table, tmp_path), suffix='.tmp.csv')
+        with open(csv_path, 'rb') as f:
+            return max(sum(1 for _ in f) - 1, 0)
+
+    def _apply_changes(self, table, csv_path, watermark, head):
+        """Applies the rows changed between two commits to the CSV. Returns (mode, rows changed)."""
+        diff = self._query(f"SELECT * FROM dolt_diff('{watermark}', '{head}', '{table}')")
+        if diff.empty:
+            return 'no changes', 0
+
+        # The header parsed as CSV, so quoted column names come through intact
+        columns = list(pd.read_csv(csv_path, nrows=0).columns)
+        new_rows = diff[diff['diff_type'].isin(['added', 'modified'])][[f"to_{c}" for c in columns]]
+        new_rows.columns = columns
+
+        if (diff['diff_type'] == 'added').all():
+            # Inserts only (the usual nightly case): append to a copy instead of rewriting
+            def write(tmp_path):
+                shutil.copyfile(csv_path, tmp_path)
+                with open(tmp_path, 'a', newline='') as f:
+                    new_rows.to_csv(f, header=False, index=False)
+            mode = 'appended'
+        else:
+            primary_key = self._primary_key(table)
+            changed = diff[diff['diff_type'].isin(['modified', 'removed'])]
+            changed_keys = pd.MultiIndex.from_frame(changed[[f"from_{c}" for c in primary_key]])
+
+            df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+            keep = ~pd.MultiIndex.from_frame(df[primary_key]).isin(changed_keys)
+            merged = pd.concat([df[keep], new_rows], ignore_index=True)
+            write = lambda tmp_path: merged.to_csv(tmp_path, index=False)
+            mode = 'merged'
+
+        write_atomic(csv_path, write)
+        return mode, len(diff)
+
+    # --- Watermark state ---
+    def _read_state(self, state_file):
+        try:
+            with open(state_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self, state_file, state):
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f, indent=2)
+        write_atomic(state_file, write)
@@ -0,0 +1,411 @@
+# /apps/grahams_table/market_data.py
+"""
+Market-data gateway shared by the screener and the detail page.
+
+Prices for many symbols are fetched in one batched request through a pluggable
+backend (settings.MARKET_DATA_BACKEND) and kept in a process-wide store, so a
+screener page or a snapshot build costs one download instead of two round trips
+per symbol. Every fetched history is also persisted per symbol on disk
+(PriceHistoryStore); later fetches only ask the backend for the bars since the
+last stored one, and the stored history is served as-is when the backend is down.
+Each batch is fetched under a cache lock, so workers asking for the same cold
+symbols at once download them once and the others read what was stored.
+Company names are persisted next to the prices and only looked up again after
+settings.COMPANY_NAME_TTL.
+Closes are split/dividend adjusted, so every incremental fetch re-reads one bar
+that is already stored: if its close changed, a corporate action re-based the
+whole series and the symbol's full history is downloaded again.
+
+Backends implement:
+    fetch_closes(symbols, period, start=None) -> DataFrame of daily closes (dates x symbols);
+                                                 `start` (a date) overrides `period`
+    fetch_company_names(symbols)              -> {symbol: company name}
+"""
+import os
+import json
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import yfinance as yf
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .fundamentals_store import write_atomic, file_lock
+from .caching import cache_lock, wait_for_lock
+
+logger = logging.getLogger(__name__)
+
+# Relative difference between two fetches of the same adjusted close that means it was re-adjusted
+ADJUSTMENT_TOLERANCE = 1e-6
+
+
+def period_start(end, period):
+    """The first date covered by a yfinance-style period ('1y', '5y', '10y', 'max') ending at `end`."""
+    if not period or period == 'max':
+        return None
+    if period.endswith('y'):
+        return end - pd.DateOffset(years=int(period[:-1]))
+    if period.endswith('mo'):
+        return end - pd.DateOffset(months=int(period[:-2]))
+    if period.endswith('d'):
+        return end - pd.DateOffset(days=int(period[:-1]))
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def _naive_index(df):
+    if isinstance(df.index, pd.DatetimeIndex) and df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    return df
+
+
+# --- Backends ---
+class YFinanceBackend:
+    """Yahoo Finance via one batched `yf.download` call per group of symbols."""
+
+    def fetch_closes(self, symbols, period='10y', start=None):
+        range_kwargs = {'start': start.strftime('%Y-%m-%d')} if start is not None else {'period': period}
+        data = yf.download(
+            list(symbols), auto_adjust=True, group_by='column',
+            threads=True, progress=False, **range_kwargs,
+        )
+        if data is None or data.empty:
+            return pd.DataFrame(columns=list(symbols))
+        if isinstance(data.columns, pd.MultiIndex):
+            closes = data['Close']
+        else:
+            closes = data[['Close']].rename(columns={'Close': symbols[0]})
+        return _naive_index(closes)
+
+    def fetch_company_names(self, symbols):
+        def lookup(symbol):
+            try:
+                return symbol, yf.Ticker(symbol).info.get('longName', symbol)
+            except Exception:
+                return symbol, symbol
+
+        with ThreadPoolExecutor(max_workers=min(8, len(symbols) or 1)) as executor:
+            return dict(executor.map(lookup, symbols))
+
+
+class LocalBackend:
+    """
+    Offline stand-in that reads '<SYMBOL>.csv' files (with 'Date' and 'Close' columns, as
+    exported by yfinance) and an optional 'company_names.csv' (symbol, company_name)
+    from settings.MARKET_DATA_LOCAL_PATH.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or getattr(settings, 'MARKET_DATA_LOCAL_PATH', '')
+
+    def fetch_closes(self, symbols, period='10y', start=None):
+        series = {}
+        for symbol in symbols:
+            csv_path = os.path.join(self.path, f"{symbol}.csv")
+            if not os.path.exists(csv_path):
+                continue
+            df = pd.read_csv(csv_path, usecols=['Date', 'Close'])
+            df['Date'] = pd.to_datetime(df['Date'], utc=True).dt.tz_localize(None)
+            closes = df.set_index('Date')['Close'].sort_index()
+            if not closes.empty:
+                since = start if start is not None else period_start(closes.index[-1], period)
+                series[symbol] = closes[closes.index >= since] if since is not None else closes
+        return pd.DataFrame(series).reindex(columns=list(symbols))
+
+    def fetch_company_names(self, symbols):
+        names_path = os.path.join(self.path, 'company_names.csv')
+        names = {}
+        if os.path.exists(names_path):
+            df = pd.read_csv(names_path)
+            names = dict(zip(df['symbol'], df['company_name']))
+        return {symbol: names.get(symbol, symbol) for symbol in symbols}
+
+
+# --- Persistent Price History ---
+class PriceHistoryStore:
+    """
+    Daily closes persisted as one '<SYMBOL>.parquet' file (date, close) per symbol, and
+    the company names looked up so far in 'company_names.json'.
+    """
+    NAMES_FILENAME = 'company_names.json'
+
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, symbol):
+        return os.path.join(self.path, f"{symbol.replace('/', '_')}.parquet")
+
+    def written_at(self, symbol):
+        """When `symbol`'s closes were last written (Unix time), or None if nothing is stored."""
+        try:
+            return os.path.getmtime(self._file(symbol))
+        except OSError:
+            return None
+
+    def read(self, symbol):
+        """The stored closes for `symbol`, oldest first (empty if nothing is stored)."""
+        try:
+            df = pd.read_parquet(self._file(symbol))
+        except (OSError, ImportError, ValueError):
+            return pd.Series(dtype=float)
+        return df.set_index('date')['close'].rename(None)
+
+    def write(self, symbol, closes):
+        os.makedirs(self.path, exist_ok=True)
+        frame = closes.rename_axis('date').rename('close').reset_index()
+        try:
+            write_atomic(self._file(symbol), lambda tmp_path: frame.to_parquet(tmp_path, index=False))
+        except (OSError, ImportError) as e:
+            logger.warning(f"Could not persist price history for {symbol}: {e}")
+
+    def read_names(self):
+        """{symbol: (company name, Unix time it was looked up)} for every persisted name."""
+        try:
+            with open(os.path.join(self.path, self.NAMES_FILENAME), 'r') as f:
+                return {symbol: tuple(entry) for symbol, entry in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def write_names(self, names):
+        """Adds {symbol: company name} to the persisted names, stamped with the current time."""
+        names_file = os.path.join(self.path, self.NAMES_FILENAME)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with file_lock(f"{names_file}.lock"):
+                persisted = self.read_names()
+                looked_up_at = time.time()
+                persisted.update({symbol: (name, looked_up_at) for symbol, name in names.items()})
+
+                def write(tmp_path):
+                    with open(tmp_path, 'w') as f:
+                        json.dump(persisted, f)
+                write_atomic(names_file, write)
+        except OSError as e:
+            logger.warning(f"Could not persist company names: {e}")
+
+
+def overlap_date(stored):
+    """
+    The date to fetch new bars from: the last stored bar before the latest one, which may have
+    been a partial day. Its close is fetched again to check the adjustment basis (same_adjustment).
+    None (a full download) when nothing is stored.
+    """
+    if stored.empty:
+        return None
+    return stored.index[-2] if len(stored) > 1 else stored.index[-1]
+
+
+def same_adjustment(stored, fetched, date):
+    """
+    Whether `fetched` is adjusted on the same basis as `stored`: the backend returns closes
+    adjusted for splits and dividends, so any corporate action since the last fetch changes
+    the close of a bar both hold.
+    """
+    if date not in stored.index or date not in fetched.index:
+        return False
+    return math.isclose(float(stored[date]), float(fetched[date]), rel_tol=ADJUSTMENT_TOLERANCE)
+
+
+def merge_closes(stored, fetched):
+    """Appends `fetched` bars to `stored`; a re-fetched date replaces the stored bar."""
+    if stored.empty:
+        return fetched
+    if fetched.empty:
+        return stored
+    merged = pd.concat([stored[~stored.index.isin(fetched.index)], fetched])
+    return merged.sort_index()
+
+
+# --- Shared Store ---
+class MarketDataGateway:
+    """
+    Process-wide store of daily closes and company names. Symbols missing from the
+    store (or older than `ttl` seconds) are refreshed together in batches of `batch_size`;
+    symbols with persisted history only fetch the bars since their last stored date.
+    """
+
+    def __init__(self, backend, ttl=900, history_period='10y', batch_size=200, history_store=None, names_ttl=30 * 86400):
+        self.backend = backend
+        self.ttl = ttl
+        self.names_ttl = names_ttl
+        self.history_period = history_period
+        self.batch_size = batch_size
+        self.history_store = history_store
+        self._closes = {}
+        self._fetched_at = {}
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, symbol):
+        fetched_at = self._fetched_at.get(symbol)
+        return fetched_at is not None and time.monotonic() - fetched_at < self.ttl
+
+    def _fetch_batches(self, symbols, start):
+        """{symbol: fetched closes} for `symbols` in batches of `batch_size` (empty where a fetch failed)."""
+        fetched = {}
+        for i in range(0, len(symbols), self.batch_size):
+            batch = symbols[i:i + self.batch_size]
+            try:
+                closes = self.backend.fetch_closes(batch, period=self.history_period, start=start)
+            except Exception as e:
+                logger.error(f"Batched price fetch failed for {len(batch)} symbols, serving stored history: {e}")
+                closes = pd.DataFrame()
+            for symbol in batch:
+                fetched[symbol] = closes[symbol].dropna() if symbol in closes.columns else pd.Series(dtype=float)
+        return fetched
+
+    def _load_recently_stored(self, symbol):
+        """Takes the stored history if it was written within `ttl` (by another thread or worker)."""
+        written_at = self.history_store.written_at(symbol) if self.history_store else None
+        if written_at is None or time.time() - written_at >= self.ttl:
+            return False
+        closes = self.history_store.read(symbol)
+        with self._lock:
+            self._closes[symbol] = closes
+            self._fetched_at[symbol] = time.monotonic()
+        return True
+
+    def prefetch(self, symbols):
+        """
+        Loads the price history of every stale symbol in `symbols` with batched backend calls.
+        Each batch is fetched under a cache lock; whoever finds it taken waits for the holder
+        and then only fetches the symbols that are still stale.
+        """
+        stale = [symbol for symbol in dict.fromkeys(symbols) if not self._is_fresh(symbol)]
+        for i in range(0, len(stale), self.batch_size):
+            batch = stale[i:i + self.batch_size]
+            lock_name = f"market_data:prefetch:{hashlib.md5(','.join(sorted(batch)).encode()).hexdigest()}"
+            with cache_lock(lock_name) as acquired:
+                if not acquired:
+                    wait_for_lock(lock_name)
+                batch = [symbol for symbol in batch if not self._is_fresh(symbol) and not self._load_recently_stored(symbol)]
+                if batch:
+                    self._fetch_stale(batch)
+
+    def _fetch_stale(self, stale):
+        """Fetches `stale` symbols (incrementally where history is stored) and keeps the results."""
+        # Group by the date to fetch from: no stored history means a full download, otherwise
+        # re-fetch from the last completed stored bar (see overlap_date)
+        stored = {}
+        fetch_groups = defaultdict(list)
+        for symbol in stale:
+            stored[symbol] = self._closes.get(symbol)
+            if stored[symbol] is None:
+                stored[symbol] = self.history_store.read(symbol) if self.history_store else pd.Series(dtype=float)
+            fetch_groups[overlap_date(stored[symbol])].append(symbol)
+
+        # symbol -> (closes, whether they changed and should be persisted)
+        results, readjusted = {}, []
+        for start, group in fetch_groups.items():
+            for symbol, fetched in self._fetch_batches(group, start).items():
+                if start is not None and not fetched.empty and not same_adjustment(stored[symbol], fetched, start):
+                    readjusted.append(symbol)
+                else:
+                    results[symbol] = (merge_closes(stored[symbol], fetched), not fetched.empty)
+
+        # A split or dividend since the last fetch changed the adjusted closes of the whole history:
+        # download it again instead of appending bars adjusted on a different basis
+        if readjusted:
+            logger.info(f"Adjusted closes changed for {len(readjusted)} symbols; re-downloading their history")
+            for symbol, fetched in self._fetch_batches(readjusted, None).items():
+                results[symbol] = (fetched, True) if not fetched.empty else (stored[symbol], False)
+
+        now = time.monotonic()
+        for symbol, (closes, changed) in results.items():
+            if changed and self.history_store:
+                self.history_store.write(symbol, closes)
+            with self._lock:
+                self._closes[symbol] = closes
+                self._fetched_at[symbol] = now
+
+    def get_close_history(self, symbol, period=None):
+        """Daily closes for one symbol over `period` (default: everything held), oldest first."""
+        self.prefetch([symbol])
+        closes = self._closes.get(symbol, pd.Series(dtype=float))
+        if closes.empty or not period:
+            return closes
+        return closes[closes.index >= period_start(closes.index[-1], period)]
+
+    def get_close_matrix(self, symbols, period=None):
+        """Daily closes for many symbols as one aligned DataFrame (dates x symbols)."""
+        self.prefetch(symbols)
+        matrix = pd.DataFrame({symbol: self.get_close_history(symbol, period) for symbol in symbols})
+        # Symbols without history contribute an empty non-date index; keep the union a DatetimeIndex
+        matrix.index = pd.DatetimeIndex(matrix.index)
+        return matrix
+
+    def get_prev_close(self, symbol):
+        """The close of the last completed session before today."""
+        closes = self.get_close_history(symbol)
+        if closes.empty:
+            return None
+        if closes.index[-1].date() >= pd.Timestamp.now().date():
+            closes = closes.iloc[:-1]
+        return round(float(closes.iloc[-1]), 2) if not closes.empty else None
+
+    def get_company_names(self, symbols):
+        """
+        {symbol: company name}: held names, then persisted names younger than `names_ttl`
+        (looked up by any worker), and only then one backend lookup for the rest.
+        """
+        missing = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self._names]
+        if missing and self.history_store:
+            cutoff = time.time() - self.names_ttl
+            persisted = {
+                symbol: name for symbol, (name, looked_up_at) in self.history_store.read_names().items()
+                if looked_up_at >= cutoff
+            }
+            with self._lock:
+                self._names.update(persisted)
+            missing = [symbol for symbol in missing if symbol not in self._names]
+        if missing:
+            try:
+                names = self.backend.fetch_company_names(missing)
+            except Exception as e:
+                logger.error(f"Company name lookup failed: {e}")
+                names = {}
+            found = {symbol: names[symbol] for symbol in missing if names.get(symbol) and names[symbol] != symbol}
+            if found and self.history_store:
+                self.history_store.write_names(found)
+            with self._lock:
+                for symbol in missing:
+                    self._names[symbol] = names.get(symbol) or symbol
+        return {symbol: self._names.get(symbol, symbol) for symbol in symbols}
+
+    def known_company_names(self):
+        """{symbol: company name} for every symbol whose name has been looked up, without fetching anything."""
+        with self._lock:
+            return {symbol: name for symbol, name in self._names.items() if name and name != symbol}
+
+    def get_quotes(self, symbols):
+        """{symbol: {'company_name', 'prev_close'}} for all `symbols`, fetched in batches."""
+        self.prefetch(symbols)
+        names = self.get_company_names(symbols)
+        return {
+            symbol: {'company_name': names[symbol], 'prev_close': self.get_prev_close(symbol)}
+            for symbol in symbols
+        }
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_market_data_gateway():
+    """The worker's MarketDataGateway, using the backend named in settings.MARKET_DATA_BACKEND."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                backend_path = getattr(settings, 'MARKET_DATA_BACKEND', 'apps.grahams_table.market_data.YFinanceBackend')
+                history_path = getattr(settings, 'PRICE_HISTORY_PATH', None)
+                _gateway = MarketDataGateway(
+                    import_string(backend_path)(),
+                    ttl=getattr(settings, 'MARKET_DATA_TTL', 900),
+                    history_store=PriceHistoryStore(history_path) if history_path else None,
+                    names_ttl=getattr(settings, 'COMPANY_NAME_TTL', 30 * 86400),
+                )
+    return _gateway
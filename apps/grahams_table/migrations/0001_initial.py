@@ -0,0 +1,38 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScreenerSnapshotRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=16, unique=True)),
+                ('company_name', models.CharField(blank=True, max_length=255)),
+                ('prev_close', models.FloatField(blank=True, null=True)),
+                ('avg_pe_5yr', models.FloatField(blank=True, null=True)),
+                ('latest_eps', models.FloatField(blank=True, null=True)),
+                ('bvps', models.FloatField(blank=True, null=True)),
+                ('graham_number', models.FloatField(blank=True, null=True)),
+                ('graham_diff_pct', models.FloatField(blank=True, db_index=True, null=True)),
+                ('intrinsic_value', models.FloatField(blank=True, null=True)),
+                ('intrinsic_diff_pct', models.FloatField(blank=True, db_index=True, null=True)),
+                ('eps_avg_5yr', models.FloatField(blank=True, null=True)),
+                ('eps_growth', models.FloatField(blank=True, null=True)),
+                ('eps_growth_complex', models.BooleanField(default=False)),
+                ('data_version', models.CharField(blank=True, max_length=32)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['symbol'],
+            },
+        ),
+    ]
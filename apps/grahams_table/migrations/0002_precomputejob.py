@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grahams_table', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecomputeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=16)),
+                ('kind', models.CharField(choices=[('screener_row', 'Screener row'), ('detail', 'Detail payload')], max_length=16)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=8)),
+                ('priority', models.IntegerField(default=0)),
+                ('requested_at', models.DateTimeField()),
+                ('last_viewed_at', models.DateTimeField(blank=True, null=True)),
+                ('claimed_by', models.CharField(blank=True, max_length=64)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'status', 'priority'], name='precompute_job_queue')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='precomputejob',
+            constraint=models.UniqueConstraint(fields=('symbol', 'kind'), name='unique_precompute_job'),
+        ),
+    ]
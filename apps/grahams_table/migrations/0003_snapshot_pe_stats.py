@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grahams_table', '0002_precomputejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='screenersnapshotrow',
+            name='pe_max_5yr',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='screenersnapshotrow',
+            name='pe_median_5yr',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='screenersnapshotrow',
+            name='pe_min_5yr',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
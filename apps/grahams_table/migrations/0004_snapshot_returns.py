@@ -0,0 +1,48 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grahams_table', '0003_snapshot_pe_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='screenersnapshotrow',
+            name='cagr_10y',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='screenersnapshotrow',
+            name='cagr_1y',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='screenersnapshotrow',
+            name='cagr_3y',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='screenersnapshotrow',
+            name='cagr_5y',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='screenersnapshotrow',
+            name='max_drawdown',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='screenersnapshotrow',
+            name='return_ytd',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='screenersnapshotrow',
+            name='volatility',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
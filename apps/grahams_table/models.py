@@ -1,3 +1,132 @@
 from django.db import models
 
-# Create your models here.
+
+class ScreenerSnapshotRow(models.Model):
+    """
+    One precomputed row of the stock screener. The whole table is rebuilt by
+    `python manage.py build_screener_snapshot`, so the screener page can sort,
+    filter and paginate on computed metrics without calculating anything.
+    """
+    symbol = models.CharField(max_length=16, unique=True)
+    company_name = models.CharField(max_length=255, blank=True)
+
+    prev_close = models.FloatField(null=True, blank=True)
+    # Month-end P/E over 5 years, each close against the EPS in effect at the time
+    avg_pe_5yr = models.FloatField(null=True, blank=True)
+    pe_median_5yr = models.FloatField(null=True, blank=True)
+    pe_min_5yr = models.FloatField(null=True, blank=True)
+    pe_max_5yr = models.FloatField(null=True, blank=True)
+    latest_eps = models.FloatField(null=True, blank=True)
+    bvps = models.FloatField(null=True, blank=True)
+    graham_number = models.FloatField(null=True, blank=True)
+    graham_diff_pct = models.FloatField(null=True, blank=True, db_index=True)
+    intrinsic_value = models.FloatField(null=True, blank=True)
+    intrinsic_diff_pct = models.FloatField(null=True, blank=True, db_index=True)
+    eps_avg_5yr = models.FloatField(null=True, blank=True)
+    eps_growth = models.FloatField(null=True, blank=True)
+    eps_growth_complex = models.BooleanField(default=False)
+    # Price returns in percent (see returns_engine)
+    return_ytd = models.FloatField(null=True, blank=True)
+    cagr_1y = models.FloatField(null=True, blank=True)
+    cagr_3y = models.FloatField(null=True, blank=True)
+    cagr_5y = models.FloatField(null=True, blank=True)
+    cagr_10y = models.FloatField(null=True, blank=True)
+    max_drawdown = models.FloatField(null=True, blank=True)
+    volatility = models.FloatField(null=True, blank=True)
+
+    # The fundamentals data version the row was computed from
+    data_version = models.CharField(max_length=32, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['symbol']
+
+    def __str__(self):
+        return f"Screener row for {self.symbol}"
+
+    def as_table_row(self):
+        """The row in the same shape get_screener_data_for_symbols returns."""
+        if self.eps_growth_complex:
+            growth = "N/A (Complex)"
+        else:
+            growth = f"{self.eps_growth}%" if self.eps_growth is not None else "N/A"
+        return {
+            "Company Name": self.company_name or self.symbol,
+            "Symbol": self.symbol,
+            "Prev. Close": self.prev_close,
+            "Avg P/E (5yr)": self.avg_pe_5yr,
+            "Graham Num": self.graham_number,
+            "Graham Diff %": f"{self.graham_diff_pct}%" if self.graham_diff_pct is not None else "N/A",
+            "Intrinsic Val": self.intrinsic_value,
+            "Intrinsic Diff %": f"{self.intrinsic_diff_pct}%" if self.intrinsic_diff_pct is not None else "N/A",
+            "EPS AVG (5yr)": self.eps_avg_5yr,
+            "Growth Rate (avg past 10 yrs)": growth,
+            "YTD %": _percent(self.return_ytd),
+            "CAGR 5y %": _percent(self.cagr_5y),
+            "Max Drawdown %": _percent(self.max_drawdown),
+            "Volatility %": _percent(self.volatility),
+        }
+
+    def returns_data(self):
+        """The row's price returns in the shape the detail page uses (see calculate_historical_returns)."""
+        return {
+            'ytd': self.return_ytd, '1y': self.cagr_1y, '3y': self.cagr_3y, '5y': self.cagr_5y, '10y': self.cagr_10y,
+            'max_drawdown': self.max_drawdown, 'volatility': self.volatility,
+        }
+
+
+def _percent(value):
+    return f"{value}%" if value is not None else "N/A"
+
+
+class PrecomputeJob(models.Model):
+    """
+    One unit of work for the precompute worker (`python manage.py run_precompute_worker`):
+    refresh a symbol's screener snapshot row or its cached detail page payload.
+    There is at most one job per (symbol, kind); re-queuing a symbol resets its job to pending.
+    """
+    KIND_SCREENER_ROW = 'screener_row'
+    KIND_DETAIL = 'detail'
+    KIND_CHOICES = [
+        (KIND_SCREENER_ROW, 'Screener row'),
+        (KIND_DETAIL, 'Detail payload'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    # Higher runs first; symbols someone just looked at jump the universe sweep
+    PRIORITY_SWEEP = 0
+    PRIORITY_VIEWED = 10
+
+    symbol = models.CharField(max_length=16)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    priority = models.IntegerField(default=PRIORITY_SWEEP)
+
+    requested_at = models.DateTimeField()
+    last_viewed_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'kind'], name='unique_precompute_job'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'status', 'priority'], name='precompute_job_queue'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job for {self.symbol} ({self.status})"
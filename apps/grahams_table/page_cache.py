@@ -0,0 +1,124 @@
+# /apps/grahams_table/page_cache.py
+"""
+Conditional GET and a rendered-page cache for the screener and detail pages.
+
+Both pages only change when the fundamentals files, the screener snapshot or
+the live prices behind them change. Each page has a validators function,
+(request, *args, **kwargs) -> (version parts, last modified datetime or None),
+that answers that question with a couple of cheap lookups:
+
+  - the ETag hashes the version parts with the page, its (normalized) query
+    string, the language and the user; Last-Modified is the latest snapshot sync.
+    A request whose If-None-Match / If-Modified-Since still match is answered
+    with 304 before the view computes anything.
+  - GETs from anonymous users are served from a cache of rendered pages keyed
+    by the ETag (settings.PAGE_CACHE_TTL, 0 disables it), so browsing the same
+    pages again costs no rendering at all.
+
+Pages without a snapshot behind them are versioned by CACHE_TTL_QUOTES time
+buckets, the same freshness the memoized live-price calculations have.
+"""
+import time
+import hashlib
+import logging
+import functools
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import ScreenerSnapshotRow
+from .fundamentals_store import get_data_version
+from .caching import get_ttl
+
+logger = logging.getLogger(__name__)
+
+
+def _quotes_bucket():
+    return int(time.time() // max(get_ttl('quotes'), 1))
+
+
+# --- Validators ---
+def screener_validators(request, *args, **kwargs):
+    """The screener changes with the fundamentals and the snapshot (or the live quotes without one)."""
+    snapshot = ScreenerSnapshotRow.objects.aggregate(rows=Count('id'), updated=Max('updated_at'))
+    if snapshot['rows']:
+        return [get_data_version(), snapshot['rows'], snapshot['updated'].timestamp()], snapshot['updated']
+    return [get_data_version(), 'live', _quotes_bucket()], None
+
+
+def detail_validators(request, *args, **kwargs):
+    """A detail page changes with the fundamentals, the symbol's snapshot row and the live quotes."""
+    symbol_ticker = kwargs.get('symbol', '').upper()
+    updated = ScreenerSnapshotRow.objects.filter(symbol=symbol_ticker).values_list('updated_at', flat=True).first()
+    return [get_data_version(), updated.timestamp() if updated else None, _quotes_bucket()], updated
+
+
+# --- Decorator ---
+def _make_etag(request, view_name, version_parts):
+    query = sorted((key, value) for key, values in request.GET.lists() for value in values)
+    user = request.user.pk if request.user.is_authenticated else 'anonymous'
+    parts = [view_name, request.path, repr(query), getattr(request, 'LANGUAGE_CODE', ''), repr(user)]
+    parts += [repr(part) for part in version_parts]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:20]
+
+
+def conditional_page(validators):
+    """
+    Wraps a view's GET with ETag / Last-Modified handling (304 short-circuit) and
+    the rendered-page cache for anonymous users. `validators` is described above.
+    """
+    def decorator(view_func):
+        view_name = f"{view_func.__module__}.{view_func.__qualname__}"
+
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            try:
+                version_parts, last_modified = validators(request, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"Page validators failed for {request.path}, rendering without them: {e}")
+                return view_func(request, *args, **kwargs)
+
+            etag = quote_etag(_make_etag(request, view_name, version_parts))
+            last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+            if response is None:
+                response = _cached_or_rendered(request, etag, view_func, args, kwargs)
+
+            if response.status_code in (200, 304):
+                response.headers.setdefault('ETag', etag)
+                if last_modified_ts:
+                    response.headers.setdefault('Last-Modified', http_date(last_modified_ts))
+                # Browsers may keep the page but must revalidate it (which is what the 304s are for)
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ('Cookie', 'Accept-Language'))
+            return response
+        return wrapper
+    return decorator
+
+
+def _cached_or_rendered(request, etag, view_func, args, kwargs):
+    ttl = getattr(settings, 'PAGE_CACHE_TTL', 600)
+    if not ttl or request.user.is_authenticated:
+        return view_func(request, *args, **kwargs)
+
+    cache_key = 'page:' + etag.strip('"')
+    cached = cache.get(cache_key)
+    if cached is not None:
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+        response['X-Page-Cache'] = 'hit'
+        return response
+
+    response = view_func(request, *args, **kwargs)
+    # A view can opt a response out, e.g. a page rendered with some of its data unavailable
+    if response.status_code == 200 and not response.streaming and getattr(response, 'page_cacheable', True):
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        cache.set(cache_key, (response.content, response['Content-Type']), ttl)
+    return response
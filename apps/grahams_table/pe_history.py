@@ -0,0 +1,174 @@
+# /apps/grahams_table/pe_history.py
+"""
+Historical P/E for many symbols at once.
+
+Each month-end close is divided by the EPS in effect on that date: the
+trailing-twelve-month EPS as of the latest fiscal quarter that had ended,
+falling back to the latest annual EPS for symbols without quarterly history.
+The prices and EPS are joined with one as-of merge for the whole batch.
+Periods with zero or negative EPS have no P/E.
+
+The P/E series are kept per symbol in the worker. When new bars arrive, only
+the months from the last stored one onward are recomputed. When the
+fundamentals data changes, the series are rebuilt.
+"""
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .market_data import get_market_data_gateway, period_start
+
+logger = logging.getLogger(__name__)
+
+PE_STAT_COLUMNS = ['pe_mean', 'pe_median', 'pe_min', 'pe_max']
+
+
+def eps_in_effect(fundamentals):
+    """
+    Long frame (symbol, date, eps) of the EPS that applies from each fiscal period end on:
+    TTM EPS from the quarterly history (four reports within a year), else annual diluted EPS.
+    """
+    eps_history = fundamentals.frames.get('eps_history', pd.DataFrame())
+    parts = []
+    if not eps_history.empty:
+        quarterly = eps_history[['symbol', 'date']].assign(reported=pd.to_numeric(eps_history['reported'], errors='coerce'))
+        quarterly = quarterly.dropna(subset=['date'])
+        by_symbol = quarterly.groupby('symbol', sort=False)
+        ttm = by_symbol['reported'].rolling(4, min_periods=4).sum().reset_index(level=0, drop=True)
+        spans_one_year = (quarterly['date'] - by_symbol['date'].shift(3)) <= pd.Timedelta(days=380)
+        quarterly = quarterly.assign(eps=ttm.where(spans_one_year))[['symbol', 'date', 'eps']].dropna()
+        parts.append(quarterly)
+
+    cash_flow = fundamentals.frames.get('cash_flow', pd.DataFrame())
+    if not cash_flow.empty:
+        annual = cash_flow[['symbol', 'date']].assign(eps=pd.to_numeric(cash_flow['diluted_net_eps'], errors='coerce'))
+        annual = annual.dropna()
+        if parts:
+            annual = annual[~annual['symbol'].isin(parts[0]['symbol'].unique())]
+        parts.append(annual)
+
+    if not parts:
+        return pd.DataFrame(columns=['symbol', 'date', 'eps'])
+    return pd.concat(parts, ignore_index=True).sort_values('date', kind='stable', ignore_index=True)
+
+
+def monthly_closes(close_matrix, since=None):
+    """Month-end closes (dates x symbols) in long form (symbol, date, close), optionally from per-symbol start dates."""
+    if close_matrix.empty:
+        return pd.DataFrame(columns=['symbol', 'date', 'close'])
+    monthly = close_matrix.resample('ME').last()
+    closes = monthly.rename_axis('date').reset_index().melt(id_vars='date', var_name='symbol', value_name='close')
+    closes = closes.dropna(subset=['close'])
+    if since:
+        starts = closes['symbol'].map(since)
+        closes = closes[starts.isna() | (closes['date'] >= starts)]
+    return closes.sort_values('date', kind='stable', ignore_index=True)
+
+
+def compute_pe(closes, eps):
+    """As-of merge of month-end closes with the EPS in effect; returns (symbol, date, pe)."""
+    if closes.empty or eps.empty:
+        return pd.DataFrame(columns=['symbol', 'date', 'pe'])
+    merged = pd.merge_asof(
+        closes.astype({'date': 'datetime64[ns]'}), eps.astype({'date': 'datetime64[ns]'}),
+        on='date', by='symbol', direction='backward',
+    )
+    merged['pe'] = (merged['close'] / merged['eps'].where(merged['eps'] > 0)).round(2)
+    return merged[['symbol', 'date', 'pe']]
+
+
+def pe_stats(series_by_symbol, symbols, years=5):
+    """Mean / median / min / max of each symbol's P/E over its last `years` years."""
+    with_data = [symbol for symbol in symbols if symbol in series_by_symbol and not series_by_symbol[symbol].empty]
+    if not with_data:
+        return pd.DataFrame(np.nan, index=pd.Index(symbols), columns=PE_STAT_COLUMNS)
+    long = pd.concat([series_by_symbol[symbol] for symbol in with_data], keys=with_data, names=['symbol', 'date'])
+    long = long.rename('pe').reset_index()
+    window_start = long.groupby('symbol')['date'].transform('max') - pd.DateOffset(years=years)
+    window = long[(long['date'] >= window_start) & long['pe'].notna()]
+    stats = window.groupby('symbol')['pe'].agg(['mean', 'median', 'min', 'max'])
+    stats.columns = PE_STAT_COLUMNS
+    return stats.reindex(pd.Index(symbols)).round(2)
+
+
+def _split_by_symbol(pe_rows):
+    """Yields (symbol, P/E Series) from long (symbol, date, pe) rows without a groupby per symbol."""
+    pe_rows = pe_rows.sort_values(['symbol', 'date'], kind='stable')
+    symbols = pe_rows['symbol'].to_numpy(dtype=object)
+    if not len(symbols):
+        return
+    dates = pd.DatetimeIndex(pe_rows['date'])
+    values = pe_rows['pe'].to_numpy(dtype=float)
+    boundaries = np.flatnonzero(symbols[1:] != symbols[:-1]) + 1
+    for start, stop in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(symbols)]))):
+        yield symbols[start], pd.Series(values[start:stop], index=dates[start:stop])
+
+
+class PEHistoryEngine:
+    """Per-symbol P/E series for the worker, extended incrementally as new bars arrive."""
+
+    def __init__(self, history_period=None):
+        self.history_period = history_period or getattr(settings, 'PE_HISTORY_PERIOD', '5y')
+        self._series = {}        # symbol -> monthly P/E Series
+        self._last_bar = {}      # symbol -> date of the last daily close the series has seen
+        self._version = None     # fundamentals version the series were computed with
+        self._eps = None
+        self._lock = threading.Lock()
+
+    def get_series(self, fundamentals, symbols):
+        """{symbol: monthly P/E Series (oldest first)} for `symbols`, using `fundamentals` (a FundamentalsIndex)."""
+        symbols = list(dict.fromkeys(symbols))
+        close_matrix = get_market_data_gateway().get_close_matrix(symbols, self.history_period)
+
+        with self._lock:
+            if self._eps is None or self._version != fundamentals.version:
+                self._series, self._last_bar = {}, {}
+                self._eps, self._version = eps_in_effect(fundamentals), fundamentals.version
+
+            # Recompute from the last stored month (its close may have changed); full history otherwise
+            since, to_compute = {}, []
+            for symbol in symbols:
+                closes = close_matrix[symbol].dropna() if symbol in close_matrix.columns else pd.Series(dtype=float)
+                stored = self._series.get(symbol)
+                if closes.empty:
+                    continue
+                if stored is None:
+                    to_compute.append(symbol)
+                elif closes.index[-1] > self._last_bar[symbol]:
+                    if not stored.empty:
+                        since[symbol] = stored.index[-1].to_period('M').start_time
+                    to_compute.append(symbol)
+                self._last_bar[symbol] = closes.index[-1]
+
+            if to_compute:
+                closes = monthly_closes(close_matrix[to_compute], since)
+                computed = compute_pe(closes, self._eps[self._eps['symbol'].isin(to_compute)])
+                for symbol in to_compute:
+                    self._series.setdefault(symbol, pd.Series(dtype=float))
+                for symbol, fresh in _split_by_symbol(computed):
+                    stored = self._series.get(symbol)
+                    if symbol in since and stored is not None:
+                        fresh = pd.concat([stored[stored.index < since[symbol]], fresh])
+                    start = period_start(fresh.index[-1], self.history_period)
+                    self._series[symbol] = fresh[fresh.index >= start] if start is not None else fresh
+                logger.info(f"P/E history updated for {len(to_compute)} symbols ({len(since)} incrementally)")
+
+            return {symbol: self._series.get(symbol, pd.Series(dtype=float)) for symbol in symbols}
+
+    def get_stats(self, fundamentals, symbols, years=5):
+        """DataFrame (index: symbol) with PE_STAT_COLUMNS over the last `years` years."""
+        return pe_stats(self.get_series(fundamentals, symbols), list(dict.fromkeys(symbols)), years)
+
+
+_pe_engine = None
+_pe_engine_lock = threading.Lock()
+
+def get_pe_engine():
+    global _pe_engine
+    if _pe_engine is None:
+        with _pe_engine_lock:
+            if _pe_engine is None:
+                _pe_engine = PEHistoryEngine()
+    return _pe_engine
@@ -0,0 +1,160 @@
+# /apps/grahams_table/precompute.py
+"""
+Database-backed job queue for the precompute worker (`python manage.py run_precompute_worker`).
+
+Pages enqueue the symbols people look at (record_symbol_view) and the worker
+periodically sweeps the whole universe (enqueue_universe). The worker claims
+pending jobs in batches, highest priority first and recently viewed symbols
+before the rest, and writes the results where the pages read them: screener
+rows into the snapshot table, detail payloads into the cache.
+"""
+import os
+import uuid
+import socket
+import logging
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction, connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PrecomputeJob
+from .snapshot import update_snapshot_rows
+from .data_services import precompute_stock_detail_data, load_valid_screener_symbols, get_screener_universe
+
+logger = logging.getLogger(__name__)
+
+JOB_KINDS = [PrecomputeJob.KIND_SCREENER_ROW, PrecomputeJob.KIND_DETAIL]
+
+
+def make_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+# --- Enqueueing ---
+def record_symbol_view(symbol_ticker):
+    """
+    Queues a viewed symbol ahead of the universe sweep. Symbols outside the screener universe
+    (including anything typed into the URL) are not queued. Never fails the page that calls it.
+    """
+    if symbol_ticker.upper() not in get_screener_universe():
+        return
+    now = timezone.now()
+    try:
+        for kind in JOB_KINDS:
+            PrecomputeJob.objects.update_or_create(
+                symbol=symbol_ticker, kind=kind,
+                defaults={
+                    'status': PrecomputeJob.STATUS_PENDING, 'priority': PrecomputeJob.PRIORITY_VIEWED,
+                    'requested_at': now, 'last_viewed_at': now,
+                },
+            )
+    except Exception as e:
+        logger.error(f"Could not queue precompute jobs for {symbol_ticker}: {e}")
+
+
+def enqueue_universe(kinds=None, symbols=None):
+    """Queues every symbol of the screener universe (or `symbols`) at sweep priority. Returns the count."""
+    symbols = [symbol.upper() for symbol in (symbols or load_valid_screener_symbols() or [])]
+    if not symbols:
+        return 0
+    now = timezone.now()
+    for kind in kinds or JOB_KINDS:
+        with transaction.atomic():
+            # Jobs already pending keep their (possibly higher) priority
+            PrecomputeJob.objects.filter(kind=kind, symbol__in=symbols).exclude(status=PrecomputeJob.STATUS_PENDING).update(
+                status=PrecomputeJob.STATUS_PENDING, priority=PrecomputeJob.PRIORITY_SWEEP, requested_at=now,
+            )
+            PrecomputeJob.objects.bulk_create(
+                [PrecomputeJob(symbol=symbol, kind=kind, requested_at=now) for symbol in symbols],
+                batch_size=500, ignore_conflicts=True,
+            )
+    return len(symbols)
+
+
+def requeue_stale_jobs(timeout=None):
+    """Jobs claimed by a worker that died mid-batch go back to pending."""
+    timeout = timeout or getattr(settings, 'PRECOMPUTE_JOB_TIMEOUT', 600)
+    return PrecomputeJob.objects.filter(
+        status=PrecomputeJob.STATUS_RUNNING, started_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status=PrecomputeJob.STATUS_PENDING, claimed_by='')
+
+
+# --- Claiming and running ---
+def claim_jobs(kind, worker_id, limit):
+    """Marks up to `limit` pending jobs of `kind` as running for this worker and returns them."""
+    queue = PrecomputeJob.objects.filter(kind=kind, status=PrecomputeJob.STATUS_PENDING).order_by(
+        '-priority', F('last_viewed_at').desc(nulls_last=True), 'requested_at',
+    )
+    with transaction.atomic():
+        job_ids = list(queue.values_list('id', flat=True)[:limit])
+        if not job_ids:
+            return []
+        # The status condition makes the claim safe when several workers race for the same jobs
+        PrecomputeJob.objects.filter(id__in=job_ids, status=PrecomputeJob.STATUS_PENDING).update(
+            status=PrecomputeJob.STATUS_RUNNING, claimed_by=worker_id,
+            started_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+    return list(PrecomputeJob.objects.filter(id__in=job_ids, claimed_by=worker_id, status=PrecomputeJob.STATUS_RUNNING))
+
+
+def _finish(job_ids, status, error=''):
+    PrecomputeJob.objects.filter(id__in=job_ids).update(
+        status=status, finished_at=timezone.now(), last_error=error[:2000], claimed_by='',
+    )
+
+
+def _run_screener_rows(jobs):
+    """One vectorized snapshot update for the whole batch."""
+    try:
+        update_snapshot_rows([job.symbol for job in jobs])
+        _finish([job.id for job in jobs], PrecomputeJob.STATUS_DONE)
+    finally:
+        connections.close_all()  # this pool thread's connections
+
+
+def _run_detail(job):
+    try:
+        if precompute_stock_detail_data(job.symbol):
+            _finish([job.id], PrecomputeJob.STATUS_DONE)
+        else:
+            _finish([job.id], PrecomputeJob.STATUS_FAILED, "Some detail sources were unavailable.")
+    except Exception as e:
+        _finish([job.id], PrecomputeJob.STATUS_FAILED, str(e))
+    finally:
+        connections.close_all()
+
+
+def run_jobs(kind, jobs, executor):
+    """Runs a claimed batch: screener rows as sub-batches, detail payloads one symbol per task."""
+    if kind == PrecomputeJob.KIND_SCREENER_ROW:
+        chunk_size = getattr(settings, 'PRECOMPUTE_SCREENER_CHUNK', 100)
+        chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+        futures = [(chunk, executor.submit(_run_screener_rows, chunk)) for chunk in chunks]
+    else:
+        futures = [([job], executor.submit(_run_detail, job)) for job in jobs]
+
+    for chunk, future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"Precompute {kind} batch of {len(chunk)} symbols failed: {e}")
+            _finish([job.id for job in chunk], PrecomputeJob.STATUS_FAILED, str(e))
+
+
+def process_next_batch(worker_id, executor, batch_size):
+    """Claims and runs one batch of every job kind. Returns the number of jobs run."""
+    processed = 0
+    for kind in JOB_KINDS:
+        jobs = claim_jobs(kind, worker_id, batch_size)
+        if jobs:
+            run_jobs(kind, jobs, executor)
+            processed += len(jobs)
+    return processed
+
+
+def make_executor(workers=None):
+    return ThreadPoolExecutor(
+        max_workers=workers or getattr(settings, 'PRECOMPUTE_WORKERS', 4), thread_name_prefix='precompute',
+    )
@@ -0,0 +1,205 @@
+# /apps/grahams_table/prefilter.py
+"""
+Builds the screener universe (valid_tickers_for_screener.txt).
+
+Fundamentals checks run as one vectorized pass over the FundamentalsIndex for
+every ticker. Stored price files are read across a process pool, only for
+tickers whose data changed since the last run (per the fingerprints kept in
+the JSON manifest); the manifest keeps each ticker's last bar date so price
+staleness is still judged against today's date on every run.
+"""
+import os
+import json
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+
+from .data_services import get_fundamentals_index, get_universe_metrics
+from .market_data import PriceHistoryStore
+from .fundamentals_store import write_atomic
+
+logger = logging.getLogger(__name__)
+
+VALID_TICKERS_FILENAME = 'valid_tickers_for_screener.txt'
+MANIFEST_FILENAME = 'prefilter_manifest.json'
+
+
+def _write_atomic(path, text):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+    write_atomic(path, write)
+
+
+def load_universe(fundamentals):
+    """Tickers listed in ALL_TICKERS_FILE_PATH, or every symbol in the fundamentals if there is no such file."""
+    all_tickers_file = getattr(settings, 'ALL_TICKERS_FILE_PATH', None)
+    if all_tickers_file and os.path.exists(all_tickers_file):
+        with open(all_tickers_file, 'r') as f:
+            return sorted({line.strip().upper() for line in f if line.strip()})
+    return fundamentals.symbols
+
+
+def fundamentals_fingerprints(fundamentals, symbols):
+    """A per-symbol hash of every row the checks look at; changes whenever a symbol's data changes."""
+    per_source = {}
+    for config_key, df in fundamentals.frames.items():
+        if df.empty:
+            continue
+        # Row hashes folded to 32 bits so the per-symbol int64 sums can't overflow
+        row_hashes = (pd.util.hash_pandas_object(df, index=False).to_numpy() % (2 ** 32)).astype('int64')
+        per_source[config_key] = pd.Series(row_hashes).groupby(df['symbol'].to_numpy()).sum()
+    sums = pd.DataFrame(per_source).reindex(pd.Index(symbols)).fillna(0).astype('int64').astype(str)
+    return sums.apply('-'.join, axis=1) if not sums.empty else pd.Series('', index=pd.Index(symbols))
+
+
+def fundamentals_exclusions(fundamentals, symbols, min_annual_periods):
+    """Vectorized eligibility for all `symbols`: {symbol: [reasons it is excluded]}."""
+    symbols = pd.Index(symbols)
+    metrics = get_universe_metrics().reindex(symbols)
+
+    # Without a cash flow or equity file every symbol counts as having no annual periods / shares
+    cash_flow = fundamentals.frames.get('cash_flow', pd.DataFrame())
+    annual_periods = cash_flow.groupby('symbol').size().reindex(symbols, fill_value=0) \
+        if not cash_flow.empty and 'symbol' in cash_flow else pd.Series(0, index=symbols)
+    equity = fundamentals.frames.get('equity', pd.DataFrame())
+    latest_shares = pd.to_numeric(
+        equity.drop_duplicates('symbol', keep='last').set_index('symbol')['shares_outstanding'], errors='coerce',
+    ).reindex(symbols) if not equity.empty and 'shares_outstanding' in equity else pd.Series(np.nan, index=symbols)
+
+    checks = {
+        f"fewer than {min_annual_periods} annual periods": annual_periods < min_annual_periods,
+        "latest annual EPS missing or not positive": ~(metrics['latest_eps'] > 0),
+        "book value per share missing or not positive": ~(metrics['bvps'] > 0),
+        "shares outstanding missing": latest_shares.isna() | (latest_shares == 0),
+    }
+    failed = pd.DataFrame(checks)
+    return {
+        symbol: [reason for reason, is_failed in row.items() if is_failed]
+        for symbol, row in zip(symbols, failed.to_dict('records'))
+    }
+
+
+def _last_price_dates(history_path, symbols):
+    """Process-pool worker: {symbol: date of the last stored bar ('YYYY-MM-DD'), or None without history}."""
+    store = PriceHistoryStore(history_path)
+    results = {}
+    for symbol in symbols:
+        closes = store.read(symbol)
+        results[symbol] = None if closes.empty else closes.index[-1].strftime('%Y-%m-%d')
+    return results
+
+
+def _price_reason(last_price_date, cutoff, max_age_days):
+    """Why a ticker fails the price check given its last bar date, or None if it passes."""
+    if last_price_date is None:
+        return "no stored price history"
+    if pd.Timestamp(last_price_date) < cutoff:
+        return f"no price in the last {max_age_days} days"
+    return None
+
+
+def _price_file_signature(history_path, symbol):
+    try:
+        stat = os.stat(os.path.join(history_path, f"{symbol.replace('/', '_')}.parquet"))
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+    except OSError:
+        return 'missing'
+
+
+def prefilter_tickers(check_prices=False, full=False, workers=None, min_annual_periods=None, chunk_size=250):
+    """
+    Writes valid_tickers_for_screener.txt and a JSON manifest explaining every exclusion.
+    Returns a summary dict (total, eligible, re-evaluated, seconds).
+    """
+    started = time.monotonic()
+    data_path = settings.DOLT_EARNINGS_DATA_PATH
+    manifest_path = os.path.join(data_path, MANIFEST_FILENAME)
+    min_annual_periods = min_annual_periods or getattr(settings, 'SCREENER_MIN_ANNUAL_PERIODS', 5)
+    history_path = getattr(settings, 'PRICE_HISTORY_PATH', '')
+    max_age_days = getattr(settings, 'SCREENER_MAX_PRICE_AGE_DAYS', 10)
+
+    previous = {}
+    if not full:
+        try:
+            with open(manifest_path, 'r') as f:
+                previous = json.load(f).get('tickers', {})
+        except (OSError, ValueError):
+            previous = {}
+
+    fundamentals = get_fundamentals_index()
+    symbols = load_universe(fundamentals)
+    fingerprints = fundamentals_fingerprints(fundamentals, symbols)
+    if check_prices:
+        fingerprints = pd.Series({
+            symbol: f"{fingerprints[symbol]}|{_price_file_signature(history_path, symbol)}" for symbol in symbols
+        })
+
+    # The vectorized fundamentals checks are cheap enough to always run for everyone
+    exclusions = fundamentals_exclusions(fundamentals, symbols, min_annual_periods)
+
+    # Price files are only re-read for tickers whose data changed since the last run. Staleness
+    # depends on today's date, not just the file, so it is judged again from the last bar date every run.
+    price_reasons, last_price_dates = {}, {}
+    if check_prices:
+        changed = [
+            s for s in symbols
+            if previous.get(s, {}).get('fingerprint') != fingerprints[s] or 'last_price_date' not in previous[s]
+        ]
+        changed_set = set(changed)
+        for symbol in symbols:
+            if symbol not in changed_set:
+                last_price_dates[symbol] = previous[symbol]['last_price_date']
+        chunks = [changed[i:i + chunk_size] for i in range(0, len(changed), chunk_size)]
+        if chunks:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_last_price_dates, history_path, chunk) for chunk in chunks]
+                for future in futures:
+                    last_price_dates.update(future.result())
+        cutoff = pd.Timestamp.now().normalize() - pd.Timedelta(days=max_age_days)
+        price_reasons = {
+            symbol: _price_reason(last_price_dates.get(symbol), cutoff, max_age_days) for symbol in symbols
+        }
+        reevaluated = len(changed)
+    else:
+        reevaluated = len(symbols)
+
+    tickers = {}
+    valid = []
+    for symbol in symbols:
+        reasons = list(exclusions[symbol])
+        entry = {'fingerprint': fingerprints[symbol]}
+        if check_prices:
+            entry['last_price_date'] = last_price_dates.get(symbol)
+            entry['price_check'] = price_reasons.get(symbol)
+            if price_reasons.get(symbol):
+                reasons.append(price_reasons[symbol])
+        entry['eligible'] = not reasons
+        entry['reasons'] = reasons
+        tickers[symbol] = entry
+        if not reasons:
+            valid.append(symbol)
+
+    _write_atomic(os.path.join(data_path, VALID_TICKERS_FILENAME), '\n'.join(valid) + '\n')
+    _write_atomic(manifest_path, json.dumps({
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'data_version': fundamentals.version,
+        'criteria': {
+            'min_annual_periods': min_annual_periods,
+            'check_prices': check_prices,
+            'max_price_age_days': max_age_days if check_prices else None,
+        },
+        'tickers': tickers,
+    }, indent=1))
+    cache.delete('valid_screener_symbols')
+
+    summary = {
+        'total': len(symbols), 'eligible': len(valid), 'reevaluated': reevaluated,
+        'seconds': round(time.monotonic() - started, 2),
+    }
+    logger.info(f"Prefilter finished: {summary}")
+    return summary
@@ -0,0 +1,91 @@
+# /apps/grahams_table/returns_engine.py
+"""
+Historical returns for many symbols at once, from an aligned close-price matrix
+(dates x symbols) in one NumPy pass:
+
+    return_ytd     price change since the first close of the current year, in percent
+    cagr_<N>y      annualized return over N years (as of the close on or before N years back)
+    max_drawdown   largest peak-to-trough fall over the whole matrix, in percent (<= 0)
+    volatility     annualized standard deviation of daily returns over the last year, in percent
+
+Each symbol is measured up to its own last close, so a symbol that stopped
+trading is not compared against dates it has no prices for.
+"""
+import numpy as np
+import pandas as pd
+
+CAGR_YEARS = (1, 3, 5, 10)
+RETURN_COLUMNS = ['return_ytd'] + [f'cagr_{years}y' for years in CAGR_YEARS] + ['max_drawdown', 'volatility']
+TRADING_DAYS_PER_YEAR = 252
+
+
+def compute_returns(close_matrix):
+    """DataFrame (index: symbol) with RETURN_COLUMNS for every column of `close_matrix`."""
+    symbols = pd.Index(close_matrix.columns)
+    if close_matrix.empty:
+        return pd.DataFrame(np.nan, index=symbols, columns=RETURN_COLUMNS)
+
+    close_matrix = close_matrix.sort_index()
+    dates = close_matrix.index.to_numpy(dtype='datetime64[ns]')
+    closes = close_matrix.to_numpy(dtype=float)
+    n_dates, n_symbols = closes.shape
+    columns = np.arange(n_symbols)
+    valid = ~np.isnan(closes) & (closes > 0)
+
+    # Row of the latest valid close on or before each date, and of the earliest on or after it
+    rows = np.arange(n_dates)[:, None]
+    last_valid = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    next_valid = np.minimum.accumulate(np.where(valid, rows, n_dates)[::-1], axis=0)[::-1]
+
+    has_data = last_valid[-1] >= 0
+    end_row = np.where(has_data, last_valid[-1], 0)
+    end_date = dates[end_row]
+    end_price = np.where(has_data, closes[end_row, columns], np.nan)
+
+    def close_at(row_matrix, row, ok):
+        """Close at `row_matrix[row]` per symbol (NaN where not `ok` or no such close)."""
+        row = np.clip(row, 0, n_dates - 1)
+        found = row_matrix[row, columns]
+        ok = ok & (found >= 0) & (found < n_dates) & has_data
+        found = np.clip(found, 0, n_dates - 1)
+        return np.where(ok, closes[found, columns], np.nan), found
+
+    results = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # YTD: from the first close of the year the symbol's last close falls in
+        year_start = end_date.astype('datetime64[Y]').astype('datetime64[ns]')
+        row = np.searchsorted(dates, year_start, side='left')
+        start_price, found = close_at(next_valid, row, row < n_dates)
+        start_price = np.where(found <= end_row, start_price, np.nan)
+        results['return_ytd'] = (end_price / start_price - 1) * 100
+
+        # CAGR: as of the close on or before the same day N years back
+        end_stamps = pd.DatetimeIndex(end_date)
+        for years in CAGR_YEARS:
+            target = (end_stamps - pd.DateOffset(years=years)).to_numpy(dtype='datetime64[ns]')
+            row = np.searchsorted(dates, target, side='right') - 1
+            start_price, found = close_at(last_valid, row, row >= 0)
+            elapsed = (end_date - dates[found]) / np.timedelta64(1, 'D') / 365.25
+            results[f'cagr_{years}y'] = np.where(
+                elapsed > 0, ((end_price / start_price) ** (1 / np.where(elapsed > 0, elapsed, 1)) - 1) * 100, np.nan,
+            )
+
+        # Max drawdown against the running peak
+        filled = close_matrix.ffill().to_numpy(dtype=float)
+        peaks = np.fmax.accumulate(filled, axis=0)
+        drawdowns = np.where(valid, filled / peaks - 1, np.inf)
+        results['max_drawdown'] = np.where(has_data, drawdowns.min(axis=0) * 100, np.nan)
+
+        # Volatility of the daily returns within each symbol's last year of closes
+        daily = np.full_like(filled, np.nan)
+        daily[1:] = np.where(valid[1:] & ~np.isnan(filled[:-1]), filled[1:] / filled[:-1] - 1, np.nan)
+        year_back = (end_stamps - pd.DateOffset(years=1)).to_numpy(dtype='datetime64[ns]')
+        in_window = (dates[:, None] > year_back[None, :]) & (rows <= end_row[None, :])
+        daily = np.where(in_window, daily, np.nan)
+        observations = (~np.isnan(daily)).sum(axis=0)
+        mean = np.nansum(daily, axis=0) / np.maximum(observations, 1)
+        variance = np.nansum((daily - mean) ** 2, axis=0) / np.maximum(observations - 1, 1)
+        results['volatility'] = np.where(observations > 1, np.sqrt(variance * TRADING_DAYS_PER_YEAR) * 100, np.nan)
+
+    returns = pd.DataFrame(results, index=symbols)[RETURN_COLUMNS]
+    return returns.replace([np.inf, -np.inf], np.nan).round(2)
@@ -0,0 +1,120 @@
+# /apps/grahams_table/screener_engine.py
+"""
+Whole-universe Graham / intrinsic value computation.
+
+Works on the sorted frames held by a FundamentalsIndex and computes every
+screener metric for all symbols at once with grouped pandas / NumPy operations.
+The results match the scalar helpers in data_services (get_latest_annual_eps,
+calculate_eps_growth_rate, calculate_graham_number, ...) row for row.
+
+The Graham formulas themselves live in apply_valuation(), which only needs the
+per-symbol inputs, so any ValuationParams (see valuation.py) can be applied to the
+whole universe again in milliseconds without touching the fundamentals.
+"""
+import numpy as np
+import pandas as pd
+
+from .valuation import EPS_SOURCES, get_default_params
+
+METRIC_COLUMNS = [
+    'latest_eps', 'bvps', 'eps_growth', 'eps_growth_complex', 'eps_avg_5yr', 'eps_ttm',
+    'graham_number', 'intrinsic_value', 'prev_close', 'graham_diff_pct', 'intrinsic_diff_pct',
+]
+
+
+def _latest_rows(df):
+    """The most recent row of every symbol (frames are sorted by symbol, then date)."""
+    if df.empty:
+        return df
+    return df.drop_duplicates('symbol', keep='last').set_index('symbol')
+
+
+def _eps_growth_and_average(annual_eps, growth_years=10, avg_years=5):
+    """Per-symbol EPS CAGR over the last `growth_years` complete years and the mean of the last `avg_years`."""
+    growth, complex_growth = annual_eps.growth(growth_years)
+    return pd.DataFrame({
+        'eps_growth': np.round(growth, 2),
+        'eps_growth_complex': complex_growth,
+        'eps_avg_5yr': np.round(annual_eps.average(avg_years), 2),
+    }, index=annual_eps.symbols)
+
+
+def _trailing_eps(df_eps_hist, quarters=4):
+    """Sum of each symbol's last `quarters` reported EPS values (NaN with fewer reports)."""
+    reported = pd.to_numeric(df_eps_hist['reported'], errors='coerce')
+    recent = reported.groupby(df_eps_hist['symbol']).tail(quarters)
+    grouped = recent.groupby(df_eps_hist['symbol'].loc[recent.index])
+    return grouped.sum().where(grouped.count() == quarters).round(2)
+
+
+def compute_universe_metrics(fundamentals, prev_closes=None, params=None):
+    """
+    Computes the screener metrics for every symbol in `fundamentals` (a FundamentalsIndex).
+    `prev_closes` is an optional symbol -> price mapping/Series used for the diff percentages.
+    `params` are the ValuationParams to value with (default: the configured ones).
+    Returns a DataFrame indexed by symbol with METRIC_COLUMNS; missing values are NaN.
+    """
+    frames = fundamentals.frames
+    symbols = pd.Index(fundamentals.symbols, name='symbol')
+    metrics = pd.DataFrame(index=symbols)
+
+    latest_cash_flow = _latest_rows(frames.get('cash_flow', pd.DataFrame()))
+    if not latest_cash_flow.empty:
+        metrics['latest_eps'] = pd.to_numeric(latest_cash_flow['diluted_net_eps'], errors='coerce')
+
+    latest_equity = _latest_rows(frames.get('equity', pd.DataFrame()))
+    if not latest_equity.empty:
+        total_equity = pd.to_numeric(latest_equity['total_equity'], errors='coerce')
+        shares_out = pd.to_numeric(latest_equity['shares_outstanding'], errors='coerce')
+        metrics['bvps'] = (total_equity / shares_out.where(shares_out != 0)).round(2)
+
+    eps_history = frames.get('eps_history', pd.DataFrame())
+    if not eps_history.empty:
+        metrics = metrics.join(_eps_growth_and_average(fundamentals.annual_eps))
+        metrics['eps_ttm'] = _trailing_eps(eps_history)
+
+    metrics = metrics.reindex(columns=METRIC_COLUMNS)
+    metrics['eps_growth_complex'] = metrics['eps_growth_complex'].fillna(False).astype(bool)
+
+    metrics = apply_valuation(metrics, params)
+    return apply_prev_closes(metrics, prev_closes) if prev_closes is not None else metrics
+
+
+def apply_valuation(metrics, params=None):
+    """
+    Returns a copy of `metrics` with graham_number and intrinsic_value computed with `params`
+    (and the diff percentages refreshed when prices are present). Vectorized over all rows.
+    """
+    params = params or get_default_params()
+    metrics = metrics.copy()
+    eps = metrics[EPS_SOURCES.get(params.eps_source, 'latest_eps')]
+    bvps, growth = metrics['bvps'], metrics['eps_growth']
+    if params.growth_cap is not None:
+        growth = growth.clip(upper=params.growth_cap)
+
+    graham_ok = (eps > 0) & (bvps > 0)
+    metrics['graham_number'] = np.sqrt(params.graham_multiplier * eps.where(graham_ok) * bvps.where(graham_ok)).round(2)
+
+    intrinsic_ok = (eps > 0) & growth.notna()
+    intrinsic = eps * (params.base_pe + params.growth_multiplier * growth) * params.yield_numerator / params.aaa_yield
+    metrics['intrinsic_value'] = intrinsic.where(intrinsic_ok).round(2)
+
+    if metrics['prev_close'].notna().any():
+        metrics['graham_diff_pct'] = _diff_pct(metrics['prev_close'], metrics['graham_number'])
+        metrics['intrinsic_diff_pct'] = _diff_pct(metrics['prev_close'], metrics['intrinsic_value'])
+    return metrics
+
+
+def apply_prev_closes(metrics, prev_closes):
+    """Returns a copy of `metrics` with `prev_close` set from `prev_closes` and the diff percentages filled in."""
+    metrics = metrics.copy()
+    metrics['prev_close'] = pd.Series(prev_closes, dtype=float).reindex(metrics.index)
+    metrics['graham_diff_pct'] = _diff_pct(metrics['prev_close'], metrics['graham_number'])
+    metrics['intrinsic_diff_pct'] = _diff_pct(metrics['prev_close'], metrics['intrinsic_value'])
+    return metrics
+
+
+def _diff_pct(price, value):
+    """How far `price` sits above (+) or below (-) `value`, in percent."""
+    ok = (price > 0) & (value != 0) & value.notna()
+    return (((price - value) / value) * 100).where(ok).round(2)
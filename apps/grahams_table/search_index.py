@@ -0,0 +1,194 @@
+# /apps/grahams_table/search_index.py
+"""
+Prebuilt search index over the screener universe (symbol and company name).
+
+    index = get_search_index()
+    index.search('app', limit=10)  # -> [SearchMatch(symbol, name, rank), ...]
+
+Results are ranked exact ticker > ticker prefix > ticker substring > company name
+match (word prefix before substring), then by ticker length and alphabetically.
+Ticker prefixes are found by bisecting a sorted array, substrings through an
+n-gram index, so a lookup touches only candidate entries instead of scanning
+the whole universe.
+
+Company names come from the market-data gateway, the app's name source, with
+the snapshot table as an extra source. Names the gateway hasn't looked up yet
+are fetched in the background, so name search works on a fresh install before
+any snapshot has been built; the index is rebuilt as they arrive.
+"""
+import os
+import time
+import heapq
+import bisect
+import logging
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import ScreenerSnapshotRow
+from .data_services import load_valid_screener_symbols
+from .market_data import get_market_data_gateway
+
+logger = logging.getLogger(__name__)
+
+RANK_EXACT, RANK_PREFIX, RANK_SUBSTRING, RANK_NAME_WORD, RANK_NAME = range(5)
+RANK_LABELS = {
+    RANK_EXACT: 'exact', RANK_PREFIX: 'prefix', RANK_SUBSTRING: 'substring',
+    RANK_NAME_WORD: 'name', RANK_NAME: 'name',
+}
+NGRAM_SIZE = 3
+NAME_LOOKUP_CHUNK = 200
+
+SearchMatch = namedtuple('SearchMatch', ['symbol', 'name', 'rank'])
+
+
+def _ngrams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class SymbolSearchIndex:
+    """Immutable index over (symbol, company name) pairs."""
+
+    def __init__(self, entries, version=None):
+        self.version = version
+        self.symbols = []
+        self.names = []
+        for symbol, name in sorted(entries):
+            self.symbols.append(symbol.upper())
+            self.names.append(name or '')
+
+        self.exact = {symbol: i for i, symbol in enumerate(self.symbols)}
+        # Entry ids are in sorted-symbol order, so self.symbols doubles as the prefix array
+        self.symbol_grams = defaultdict(set)  # every 1..NGRAM_SIZE-gram of every ticker
+        self.name_grams = defaultdict(set)    # NGRAM_SIZE-grams of the company names
+        name_words = []
+        for i, (symbol, name) in enumerate(zip(self.symbols, self.names)):
+            for size in range(1, NGRAM_SIZE + 1):
+                for gram in _ngrams(symbol, size):
+                    self.symbol_grams[gram].add(i)
+            upper_name = name.upper()
+            for gram in _ngrams(upper_name, NGRAM_SIZE):
+                self.name_grams[gram].add(i)
+            name_words.extend((word, i) for word in upper_name.split())
+        name_words.sort()
+        self.name_words = [word for word, _ in name_words]
+        self.name_word_ids = [i for _, i in name_words]
+        self.upper_names = [name.upper() for name in self.names]
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _prefix_range(self, keys, query):
+        start = bisect.bisect_left(keys, query)
+        stop = bisect.bisect_left(keys, query + '\uffff')
+        return start, stop
+
+    def _candidates(self, grams_index, query):
+        """Entries containing every n-gram of `query` (a superset of the substring matches)."""
+        size = min(len(query), NGRAM_SIZE)
+        posting_lists = sorted((grams_index.get(gram, set()) for gram in _ngrams(query, size)), key=len)
+        if not posting_lists:
+            return set()
+        return set.intersection(*posting_lists) if len(posting_lists) > 1 else set(posting_lists[0])
+
+    def search(self, query, limit=None):
+        """Ranked matches for `query` (best first); all of them unless `limit` is given."""
+        query = (query or '').strip().upper()
+        if not query:
+            return []
+
+        ranks = {}
+        exact_id = self.exact.get(query)
+        if exact_id is not None:
+            ranks[exact_id] = RANK_EXACT
+
+        start, stop = self._prefix_range(self.symbols, query)
+        for i in range(start, stop):
+            ranks.setdefault(i, RANK_PREFIX)
+
+        for i in self._candidates(self.symbol_grams, query):
+            if i not in ranks and query in self.symbols[i]:
+                ranks[i] = RANK_SUBSTRING
+
+        start, stop = self._prefix_range(self.name_words, query)
+        for position in range(start, stop):
+            ranks.setdefault(self.name_word_ids[position], RANK_NAME_WORD)
+
+        if len(query) >= NGRAM_SIZE:
+            for i in self._candidates(self.name_grams, query):
+                if i not in ranks and query in self.upper_names[i]:
+                    ranks[i] = RANK_NAME
+
+        # Only the top `limit` need ordering: short queries can match thousands of names
+        sort_key = lambda i: (ranks[i], len(self.symbols[i]), self.symbols[i])
+        ordered = heapq.nsmallest(limit, ranks, key=sort_key) if limit is not None else sorted(ranks, key=sort_key)
+        return [SearchMatch(self.symbols[i], self.names[i], ranks[i]) for i in ordered]
+
+    def search_symbols(self, query):
+        return [match.symbol for match in self.search(query)]
+
+
+# --- Process-wide index ---
+_name_lookup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search-names')
+_name_lookups_requested = set()
+
+def _index_version():
+    """Changes whenever the universe file, the names known to the gateway or the snapshot change."""
+    valid_tickers_file = os.path.join(settings.DOLT_EARNINGS_DATA_PATH, "valid_tickers_for_screener.txt")
+    try:
+        stat = os.stat(valid_tickers_file)
+        file_part = f"{stat.st_mtime_ns}:{stat.st_size}"
+    except OSError:
+        file_part = 'missing'
+    snapshot = ScreenerSnapshotRow.objects.aggregate(rows=Count('id'), updated=Max('updated_at'))
+    known_names = len(get_market_data_gateway().known_company_names())
+    return f"{file_part}|{snapshot['rows']}:{snapshot['updated']}|{known_names}"
+
+
+def _look_up_company_names(symbols):
+    """Background task: asks the gateway for the names of `symbols`, a chunk at a time."""
+    gateway = get_market_data_gateway()
+    for i in range(0, len(symbols), NAME_LOOKUP_CHUNK):
+        try:
+            gateway.get_company_names(symbols[i:i + NAME_LOOKUP_CHUNK])
+        except Exception as e:
+            logger.error(f"Company name lookup for the search index failed: {e}")
+
+
+def _build_index(version):
+    names = get_market_data_gateway().known_company_names()
+    names.update((symbol, name) for symbol, name in ScreenerSnapshotRow.objects.values_list('symbol', 'company_name') if name)
+    symbols = {symbol.upper() for symbol in load_valid_screener_symbols() or []} | set(names)
+
+    missing = sorted(symbol for symbol in symbols if symbol not in names and symbol not in _name_lookups_requested)
+    if missing:
+        _name_lookups_requested.update(missing)
+        _name_lookup_executor.submit(_look_up_company_names, missing)
+    return SymbolSearchIndex([(symbol, names.get(symbol, '')) for symbol in symbols], version=version)
+
+
+_search_index = None
+_search_index_checked_at = 0.0
+_search_index_lock = threading.Lock()
+
+def get_search_index():
+    """
+    This worker's SymbolSearchIndex. Whether the universe changed is checked at most every
+    SEARCH_INDEX_CHECK_INTERVAL seconds, so lookups in between don't touch the disk or database.
+    """
+    global _search_index, _search_index_checked_at
+    check_interval = getattr(settings, 'SEARCH_INDEX_CHECK_INTERVAL', 30)
+    if _search_index is not None and time.monotonic() - _search_index_checked_at < check_interval:
+        return _search_index
+
+    with _search_index_lock:
+        if _search_index is None or time.monotonic() - _search_index_checked_at >= check_interval:
+            version = _index_version()
+            if _search_index is None or _search_index.version != version:
+                started = time.monotonic()
+                _search_index = _build_index(version)
+                logger.info(f"Built symbol search index with {len(_search_index)} entries in {time.monotonic() - started:.2f}s")
+            _search_index_checked_at = time.monotonic()
+    return _search_index
@@ -0,0 +1,291 @@
+# /apps/grahams_table/snapshot.py
+"""
+Precomputed screener snapshot: building it, and sorting / filtering / searching it.
+"""
+import math
+import logging
+import pandas as pd
+from django.db import transaction
+from django.db.models import F, Case, When, Value, IntegerField
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .models import ScreenerSnapshotRow
+from .caching import cache_lock
+from .screener_engine import apply_prev_closes, apply_valuation
+from .market_data import get_market_data_gateway
+from .search_index import get_search_index
+from .returns_engine import RETURN_COLUMNS
+from .data_services import (
+    get_universe_metrics, get_fundamentals_index, get_pe_stats, get_returns, load_valid_screener_symbols,
+    get_screener_universe,
+)
+
+logger = logging.getLogger(__name__)
+
+# Query-string sort/filter key -> ScreenerSnapshotRow field
+SORT_FIELDS = {
+    'company': 'company_name',
+    'symbol': 'symbol',
+    'prev_close': 'prev_close',
+    'avg_pe': 'avg_pe_5yr',
+    'pe_median': 'pe_median_5yr',
+    'pe_min': 'pe_min_5yr',
+    'pe_max': 'pe_max_5yr',
+    'graham': 'graham_number',
+    'graham_diff': 'graham_diff_pct',
+    'intrinsic': 'intrinsic_value',
+    'intrinsic_diff': 'intrinsic_diff_pct',
+    'eps_avg': 'eps_avg_5yr',
+    'growth': 'eps_growth',
+    'ytd': 'return_ytd',
+    'cagr_1y': 'cagr_1y',
+    'cagr_3y': 'cagr_3y',
+    'cagr_5y': 'cagr_5y',
+    'cagr_10y': 'cagr_10y',
+    'drawdown': 'max_drawdown',
+    'volatility': 'volatility',
+}
+NUMERIC_FILTER_KEYS = [key for key in SORT_FIELDS if key not in ('company', 'symbol')]
+
+# Screener table header -> sort key
+HEADER_SORT_KEYS = {
+    "Company Name": 'company',
+    "Symbol": 'symbol',
+    "Prev. Close": 'prev_close',
+    "Avg P/E (5yr)": 'avg_pe',
+    "Graham Num": 'graham',
+    "Graham Diff %": 'graham_diff',
+    "Intrinsic Val": 'intrinsic',
+    "Intrinsic Diff %": 'intrinsic_diff',
+    "EPS AVG (5yr)": 'eps_avg',
+    "Growth Rate (avg past 10 yrs)": 'growth',
+    "YTD %": 'ytd',
+    "CAGR 5y %": 'cagr_5y',
+    "Max Drawdown %": 'drawdown',
+    "Volatility %": 'volatility',
+}
+
+SNAPSHOT_FIELDS = [
+    'company_name', 'prev_close', 'avg_pe_5yr', 'pe_median_5yr', 'pe_min_5yr', 'pe_max_5yr',
+    'latest_eps', 'bvps', 'graham_number', 'graham_diff_pct', 'intrinsic_value', 'intrinsic_diff_pct',
+    'eps_avg_5yr', 'eps_growth', 'eps_growth_complex', *RETURN_COLUMNS, 'data_version',
+]
+
+
+def _optional_float(value):
+    return None if value is None or pd.isna(value) else float(value)
+
+
+def build_screener_snapshot(symbols=None):
+    """
+    Recomputes every screener column for `symbols` (default: the valid screener universe)
+    and replaces the snapshot table with the result. Returns the number of rows written.
+    Only one build runs at a time across all workers sharing the cache.
+    """
+    with cache_lock('screener_snapshot_build', timeout=3600) as acquired:
+        if not acquired:
+            logger.warning("A screener snapshot build is already running; skipping.")
+            return 0
+        return _build_screener_snapshot(symbols)
+
+
+def _build_screener_snapshot(symbols):
+    symbols = symbols or load_valid_screener_symbols() or []
+    if not symbols:
+        logger.warning("No symbols to build the screener snapshot for.")
+        return 0
+
+    rows = compute_snapshot_rows(symbols)
+    with transaction.atomic():
+        ScreenerSnapshotRow.objects.exclude(symbol__in=[row.symbol for row in rows]).delete()
+        _save_snapshot_rows(rows)
+    logger.info(f"Screener snapshot rebuilt with {len(rows)} rows (data version {rows[0].data_version if rows else ''}).")
+    return len(rows)
+
+
+def update_snapshot_rows(symbols):
+    """
+    Recomputes and saves the snapshot rows of just `symbols`, leaving every other row alone.
+    Only existing rows of screener-universe symbols are refreshed; rows are never created
+    here, so a symbol joins the snapshot only through a full build.
+    """
+    universe = get_screener_universe()
+    existing = dict(
+        ScreenerSnapshotRow.objects.filter(symbol__in=[symbol for symbol in symbols if symbol in universe])
+        .values_list('symbol', 'id')
+    )
+    if not existing:
+        return 0
+    rows = compute_snapshot_rows(list(existing))
+    now = timezone.now()
+    for row in rows:
+        row.pk, row.updated_at = existing[row.symbol], now
+    with transaction.atomic():
+        ScreenerSnapshotRow.objects.bulk_update(rows, SNAPSHOT_FIELDS + ['updated_at'], batch_size=500)
+    return len(rows)
+
+
+def compute_snapshot_rows(symbols):
+    """Unsaved ScreenerSnapshotRow objects with every screener column computed for `symbols`."""
+    fundamentals = get_fundamentals_index()
+    metrics = get_universe_metrics().reindex(symbols)
+
+    # One batched price download for the whole universe
+    quotes = get_market_data_gateway().get_quotes(symbols)
+
+    # Historical P/E statistics for the whole universe in one as-of merge
+    pe_stats = get_pe_stats(symbols)
+
+    # YTD / CAGR / drawdown / volatility for the whole universe in one pass over the close matrix
+    returns = get_returns(symbols)
+
+    company_names, prev_closes = {}, {}
+    for symbol in symbols:
+        yf_data = quotes[symbol]
+        company_names[symbol] = yf_data.get('company_name') or symbol
+        prev_closes[symbol] = yf_data.get('prev_close')
+    metrics = apply_prev_closes(metrics, prev_closes)
+
+    rows = []
+    for symbol, metric in metrics.iterrows():
+        rows.append(ScreenerSnapshotRow(
+            symbol=symbol.upper(),
+            company_name=company_names[symbol][:255],
+            prev_close=_optional_float(metric['prev_close']),
+            avg_pe_5yr=_optional_float(pe_stats.at[symbol, 'pe_mean']),
+            pe_median_5yr=_optional_float(pe_stats.at[symbol, 'pe_median']),
+            pe_min_5yr=_optional_float(pe_stats.at[symbol, 'pe_min']),
+            pe_max_5yr=_optional_float(pe_stats.at[symbol, 'pe_max']),
+            latest_eps=_optional_float(metric['latest_eps']),
+            bvps=_optional_float(metric['bvps']),
+            graham_number=_optional_float(metric['graham_number']),
+            graham_diff_pct=_optional_float(metric['graham_diff_pct']),
+            intrinsic_value=_optional_float(metric['intrinsic_value']),
+            intrinsic_diff_pct=_optional_float(metric['intrinsic_diff_pct']),
+            eps_avg_5yr=_optional_float(metric['eps_avg_5yr']),
+            eps_growth=_optional_float(metric['eps_growth']),
+            eps_growth_complex=bool(metric['eps_growth_complex']) if pd.notna(metric['eps_growth_complex']) else False,
+            **{column: _optional_float(returns.at[symbol, column]) for column in RETURN_COLUMNS},
+            data_version=fundamentals.version or '',
+        ))
+    return rows
+
+
+def _save_snapshot_rows(rows):
+    ScreenerSnapshotRow.objects.bulk_create(
+        rows, batch_size=500, update_conflicts=True,
+        unique_fields=['symbol'], update_fields=SNAPSHOT_FIELDS + ['updated_at'],
+    )
+
+
+def _parse_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    # 'nan' / 'inf' parse too, but would filter out every row
+    return value if math.isfinite(value) else None
+
+
+def query_screener_snapshot(params):
+    """
+    Applies the screener query-string parameters to the snapshot table:
+      q=<text>                     symbol / company name search (see search_index); without an
+                                   explicit sort the results come in search-rank order
+      sort=<key>&dir=asc|desc      order by any SORT_FIELDS key (missing values last)
+      <key>_min=<n> / <key>_max=<n> numeric range filters, e.g. graham_diff_max=-20
+    Returns (queryset, options) where options echoes the sort and filters actually applied.
+    """
+    queryset = ScreenerSnapshotRow.objects.all()
+
+    search_rank = None
+    search_query = params.get('q', '').strip()
+    if search_query:
+        matches = get_search_index().search(search_query)
+        queryset = queryset.filter(symbol__in=[match.symbol for match in matches])
+        symbols_by_rank = {}
+        for match in matches:
+            symbols_by_rank.setdefault(match.rank, []).append(match.symbol)
+        search_rank = Case(
+            *[When(symbol__in=symbols, then=Value(rank)) for rank, symbols in symbols_by_rank.items()],
+            default=Value(len(symbols_by_rank)), output_field=IntegerField(),
+        )
+
+    filters = {}
+    for key in NUMERIC_FILTER_KEYS:
+        for bound, lookup in (('min', 'gte'), ('max', 'lte')):
+            value = _parse_float(params.get(f"{key}_{bound}"))
+            if value is not None:
+                queryset = queryset.filter(**{f"{SORT_FIELDS[key]}__{lookup}": value})
+                filters[f"{key}_{bound}"] = value
+
+    sort_key = params.get('sort', 'symbol')
+    if sort_key not in SORT_FIELDS:
+        sort_key = 'symbol'
+    direction = 'desc' if params.get('dir') == 'desc' else 'asc'
+    if search_rank is not None and 'sort' not in params:
+        # Best matches first: exact ticker, ticker prefix, ticker substring, company name
+        queryset = queryset.order_by(search_rank, Length('symbol'), 'symbol')
+        return queryset, {'sort': 'relevance', 'dir': direction, 'filters': filters}
+
+    sort_field = F(SORT_FIELDS[sort_key])
+    order = sort_field.desc(nulls_last=True) if direction == 'desc' else sort_field.asc(nulls_last=True)
+    queryset = queryset.order_by(order, 'symbol')
+
+    return queryset, {'sort': sort_key, 'dir': direction, 'filters': filters}
+
+
+def query_screener_what_if(params, valuation_params):
+    """
+    query_screener_snapshot() for a what-if scenario: the snapshot's prices with the Graham
+    columns recomputed for the whole universe using `valuation_params` (ValuationParams),
+    then searched, filtered and sorted in memory with the same query-string parameters.
+    Returns (list of row dicts keyed by ScreenerSnapshotRow field, options).
+    """
+    stored_fields = [
+        'symbol', 'company_name', 'prev_close', 'avg_pe_5yr', 'pe_median_5yr', 'pe_min_5yr', 'pe_max_5yr', *RETURN_COLUMNS,
+    ]
+    snapshot = pd.DataFrame.from_records(
+        ScreenerSnapshotRow.objects.values(*stored_fields), columns=stored_fields,
+    ).set_index('symbol')
+    metrics = get_universe_metrics().reindex(snapshot.index)
+    metrics['prev_close'] = snapshot['prev_close']
+    valued = apply_valuation(metrics, valuation_params)
+
+    frame = valued[[field for field in SNAPSHOT_FIELDS if field in valued.columns and field != 'prev_close']]
+    frame = frame.join(snapshot)
+    frame['eps_growth_complex'] = frame['eps_growth_complex'].fillna(False).astype(bool)
+
+    search_rank = None
+    search_query = params.get('q', '').strip()
+    if search_query:
+        search_rank = pd.Series({match.symbol: match.rank for match in get_search_index().search(search_query)}, dtype=float)
+        frame = frame[frame.index.isin(search_rank.index)]
+
+    filters = {}
+    for key in NUMERIC_FILTER_KEYS:
+        for bound in ('min', 'max'):
+            value = _parse_float(params.get(f"{key}_{bound}"))
+            if value is not None:
+                column = frame[SORT_FIELDS[key]]
+                frame = frame[(column >= value) if bound == 'min' else (column <= value)]
+                filters[f"{key}_{bound}"] = value
+
+    sort_key = params.get('sort', 'symbol')
+    if sort_key not in SORT_FIELDS:
+        sort_key = 'symbol'
+    direction = 'desc' if params.get('dir') == 'desc' else 'asc'
+    frame = frame.sort_index()
+    if search_rank is not None and 'sort' not in params:
+        order = pd.DataFrame({'rank': search_rank.reindex(frame.index), 'length': frame.index.str.len()}, index=frame.index)
+        frame = frame.loc[order.sort_values(['rank', 'length'], kind='stable').index]
+        sort_key = 'relevance'
+    elif sort_key != 'symbol':
+        frame = frame.sort_values(SORT_FIELDS[sort_key], ascending=direction == 'asc', na_position='last', kind='stable')
+    elif direction == 'desc':
+        frame = frame.iloc[::-1]
+
+    frame = frame.astype(object).where(frame.notna(), None)
+    rows = frame.reset_index().to_dict('records')
+    return rows, {'sort': sort_key, 'dir': direction, 'filters': filters}
@@ -1,3 +1,1002 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+from django.utils import timezone
 
-# Create your tests here.
+from . import fundamentals_store, data_services, search_index, caching, page_cache
+from .models import ScreenerSnapshotRow, PrecomputeJob
+from .eps_matrix import AnnualEpsMatrix
+from .data_services import calculate_cagr
+from .precompute import record_symbol_view, enqueue_universe, claim_jobs, requeue_stale_jobs, run_jobs
+from .snapshot import update_snapshot_rows, query_screener_snapshot
+from .prefilter import prefilter_tickers, fundamentals_exclusions
+from .market_data import PriceHistoryStore, MarketDataGateway
+from .returns_engine import RETURN_COLUMNS, TRADING_DAYS_PER_YEAR, compute_returns
+from .screener_engine import compute_universe_metrics, apply_prev_closes, apply_valuation, METRIC_COLUMNS
+from .pe_history import eps_in_effect, monthly_closes, compute_pe, pe_stats, PEHistoryEngine
+from .management.commands.sync_dolt_csvs import Command as SyncDoltCsvsCommand
+from .valuation import params_from_query, get_default_params, graham_number, intrinsic_value
+
+
+def eps_history(reports):
+    """EPS history rows ('symbol', 'date', 'reported') from {symbol: [(date, eps), ...]}."""
+    rows = [(symbol, pd.Timestamp(date), eps) for symbol, entries in reports.items() for date, eps in entries]
+    return pd.DataFrame(rows, columns=['symbol', 'date', 'reported'])
+
+
+def quarterly(years, eps_for_year, extra=None):
+    """Four quarterly reports per year (each a quarter of the annual EPS), plus any `extra` reports."""
+    entries = [
+        (f'{year}-{month:02d}-28', eps_for_year(year) / 4)
+        for year in years for month in (3, 6, 9, 12)
+    ]
+    return sorted(entries + list(extra or []))
+
+
+# The per-symbol helpers the matrix replaced, kept as the reference the matrix must agree with
+def scalar_eps_growth(df_eps_hist, symbol_ticker, years=10):
+    symbol_data = df_eps_hist[df_eps_hist['symbol'] == symbol_ticker]
+    annual_eps = symbol_data.set_index('date')['reported'].resample('YE').sum().dropna()
+    if len(annual_eps) < 2:
+        return None
+    years_for_growth = min(years, len(annual_eps) - 1)
+    return calculate_cagr(annual_eps.tail(years_for_growth + 1))
+
+
+def scalar_eps_avg(df_eps_hist, symbol_ticker, years=5):
+    symbol_data = df_eps_hist[df_eps_hist['symbol'] == symbol_ticker]
+    annual_eps = symbol_data.set_index('date')['reported'].resample('YE').sum().dropna()
+    if annual_eps.empty:
+        return None
+    return round(float(annual_eps.tail(years).mean()), 2)
+
+
+class AnnualEpsMatrixTests(SimpleTestCase):
+
+    def setUp(self):
+        self.history = eps_history({
+            'GROW': quarterly(range(2012, 2022), lambda year: 1.0 + 0.25 * (year - 2012)),
+            # 52/53-week fiscal calendar: 2019 holds five quarterly reports
+            'WEEK': quarterly(range(2014, 2022), lambda year: 2.0 + 0.1 * (year - 2014), extra=[('2019-01-02', 0.5)]),
+            'TURN': quarterly(range(2016, 2022), lambda year: -1.0 if year < 2019 else 1.5),
+        })
+        self.matrix = AnnualEpsMatrix.from_eps_history(self.history)
+
+    def test_matches_scalar_helpers(self):
+        for symbol in ('GROW', 'WEEK', 'TURN'):
+            for years in (1, 3, 5, 10):
+                with self.subTest(symbol=symbol, years=years):
+                    self.assertEqual(self.matrix.symbol_growth(symbol, years), scalar_eps_growth(self.history, symbol, years))
+                    self.assertEqual(self.matrix.symbol_average(symbol, years), scalar_eps_avg(self.history, symbol, years))
+
+    def test_five_report_year_keeps_four_report_years(self):
+        series = self.matrix.series('WEEK')
+        self.assertEqual(list(series.index), list(range(2014, 2022)))
+        self.assertAlmostEqual(series[2019], 2.5 + 0.5)
+        self.assertIsNotNone(self.matrix.symbol_growth('WEEK', 5))
+
+    def test_partial_year_is_left_out(self):
+        history = eps_history({'PART': quarterly(range(2018, 2021), lambda year: 4.0) + [('2021-03-28', 1.0)]})
+        series = AnnualEpsMatrix.from_eps_history(history).series('PART')
+        self.assertEqual(list(series.index), [2018, 2019, 2020])
+
+    def test_semiannual_reporter_keeps_its_years(self):
+        history = eps_history({'SEMI': [(f'{year}-{month:02d}-30', 1.0) for year in (2019, 2020) for month in (6, 12)]})
+        self.assertEqual(AnnualEpsMatrix.from_eps_history(history).series('SEMI').to_dict(), {2019: 2.0, 2020: 2.0})
+
+    def test_whole_universe_matches_per_symbol(self):
+        growth, complex_growth = self.matrix.growth(5)
+        averages = self.matrix.average(5)
+        for i, symbol in enumerate(self.matrix.symbols):
+            with self.subTest(symbol=symbol):
+                expected = self.matrix.symbol_growth(symbol, 5)
+                if expected == "N/A (Complex)":
+                    self.assertTrue(complex_growth[i])
+                else:
+                    self.assertAlmostEqual(round(float(growth[i]), 2), expected)
+                self.assertAlmostEqual(round(float(averages[i]), 2), self.matrix.symbol_average(symbol, 5))
+
+
+class MemoizeKeyTests(SimpleTestCase):
+
+    def test_only_a_versioned_fundamentals_index_is_keyed_by_version(self):
+        index = data_services.FundamentalsIndex({}, version='v7')
+        self.assertEqual(caching._key_part(index), 'FundamentalsIndex@v7')
+        for value in (data_services.FundamentalsIndex({}), mock.Mock(version='v7'), pd.DataFrame()):
+            with self.assertRaises(caching.UncacheableArgument):
+                caching._key_part(value)
+
+    def test_index_lookups_skip_the_cache(self):
+        fundamentals = fundamentals_index(
+            cash_flow={'AAA': [('2021-12-31', 3.0)]}, equity={'AAA': [('2021-12-31', 150.0, 10.0)]}, eps_reports={},
+        )
+        fundamentals.version = 'v1'
+        with mock.patch.object(caching, 'get_or_compute') as get_or_compute:
+            self.assertEqual(data_services.get_latest_annual_eps(fundamentals, 'AAA'), 3.0)
+            self.assertEqual(data_services.get_latest_bvps(fundamentals, 'AAA'), 15.0)
+        get_or_compute.assert_not_called()
+
+
+class CacheBackendCheckTests(SimpleTestCase):
+
+    def check(self, backend, workers):
+        with override_settings(CACHES={'default': {'BACKEND': backend}}, SERVER_WORKERS=workers):
+            return caching.check_cache_backend()
+
+    def test_shared_atomic_backends_pass(self):
+        self.assertEqual(self.check('django.core.cache.backends.redis.RedisCache', 4), [])
+        self.assertEqual(self.check('django.core.cache.backends.memcached.PyMemcacheCache', 4), [])
+        self.assertEqual(self.check('django.core.cache.backends.locmem.LocMemCache', 1), [])
+
+    def test_locmem_behind_several_workers_is_reported(self):
+        with self.assertLogs('apps.grahams_table.caching', 'WARNING'):
+            warnings = self.check('django.core.cache.backends.locmem.LocMemCache', 4)
+        self.assertEqual(len(warnings), 1)
+        self.assertIn('4 workers', warnings[0])
+
+    def test_a_file_cache_is_reported_as_not_atomic(self):
+        warnings = self.check('django.core.cache.backends.filebased.FileBasedCache', 1)
+        self.assertEqual(len(warnings), 1)
+        self.assertIn('no atomic add', warnings[0])
+
+
+class SnapshotUpdateTests(TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        with open(os.path.join(self.data_dir, 'valid_tickers_for_screener.txt'), 'w') as f:
+            f.write("AAPL\nMSFT\n")
+        settings_override = override_settings(DOLT_EARNINGS_DATA_PATH=self.data_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_symbols_outside_the_universe_are_not_queued(self):
+        record_symbol_view('ZZZZNOTREAL')
+        self.assertFalse(PrecomputeJob.objects.exists())
+        record_symbol_view('AAPL')
+        self.assertEqual(set(PrecomputeJob.objects.values_list('symbol', flat=True)), {'AAPL'})
+
+    def test_update_refreshes_existing_rows_only(self):
+        ScreenerSnapshotRow.objects.create(symbol='AAPL', company_name='Apple', prev_close=1.0)
+        computed = [ScreenerSnapshotRow(symbol='AAPL', company_name='Apple Inc.', prev_close=2.0)]
+        with mock.patch('apps.grahams_table.snapshot.compute_snapshot_rows', return_value=computed) as compute:
+            self.assertEqual(update_snapshot_rows(['AAPL', 'MSFT', 'ZZZZNOTREAL']), 1)
+        compute.assert_called_once_with(['AAPL'])
+        self.assertEqual(list(ScreenerSnapshotRow.objects.values_list('symbol', 'prev_close')), [('AAPL', 2.0)])
+
+
+
+class InlineExecutor:
+    """Runs submitted calls right away, in the test's thread (and so in its database transaction)."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class PrecomputeQueueTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def job(self, symbol, kind=PrecomputeJob.KIND_DETAIL, minutes_ago=0, **fields):
+        return PrecomputeJob.objects.create(
+            symbol=symbol, kind=kind, requested_at=self.now - timedelta(minutes=minutes_ago), **fields,
+        )
+
+    def test_viewed_symbols_are_claimed_first_and_only_once(self):
+        self.job('OLD', minutes_ago=30)
+        self.job('NEW', minutes_ago=5)
+        self.job('SEEN', priority=PrecomputeJob.PRIORITY_VIEWED, last_viewed_at=self.now - timedelta(minutes=10))
+        self.job('JUST', priority=PrecomputeJob.PRIORITY_VIEWED, last_viewed_at=self.now)
+        self.job('ROW', kind=PrecomputeJob.KIND_SCREENER_ROW)
+
+        first = claim_jobs(PrecomputeJob.KIND_DETAIL, 'worker-1', 3)
+        second = claim_jobs(PrecomputeJob.KIND_DETAIL, 'worker-2', 3)
+
+        self.assertEqual({job.symbol for job in first}, {'JUST', 'SEEN', 'OLD'})
+        self.assertEqual([job.symbol for job in second], ['NEW'])
+        self.assertTrue(all(job.status == PrecomputeJob.STATUS_RUNNING and job.attempts == 1 for job in first))
+        self.assertEqual(claim_jobs(PrecomputeJob.KIND_DETAIL, 'worker-3', 3), [])
+
+    def test_jobs_taken_by_another_worker_meanwhile_are_not_returned(self):
+        self.job('AAA')
+        taken = self.job('BBB')
+        pending = PrecomputeJob.objects.filter
+
+        def claimed_meanwhile(*args, **kwargs):
+            # Another worker claims BBB between this worker's read of the queue and its update
+            if 'id__in' in kwargs and 'claimed_by' not in kwargs:
+                pending(pk=taken.pk).update(status=PrecomputeJob.STATUS_RUNNING, claimed_by='worker-2')
+            return pending(*args, **kwargs)
+
+        with mock.patch.object(PrecomputeJob.objects, 'filter', side_effect=claimed_meanwhile):
+            claimed = claim_jobs(PrecomputeJob.KIND_DETAIL, 'worker-1', 10)
+
+        self.assertEqual([job.symbol for job in claimed], ['AAA'])
+        self.assertEqual(PrecomputeJob.objects.get(pk=taken.pk).claimed_by, 'worker-2')
+
+    def test_jobs_of_a_dead_worker_are_requeued(self):
+        self.job('STUCK', status=PrecomputeJob.STATUS_RUNNING, claimed_by='gone', started_at=self.now - timedelta(hours=1))
+        self.job('BUSY', status=PrecomputeJob.STATUS_RUNNING, claimed_by='alive', started_at=self.now)
+
+        self.assertEqual(requeue_stale_jobs(timeout=600), 1)
+        self.assertEqual(
+            dict(PrecomputeJob.objects.values_list('symbol', 'status')),
+            {'STUCK': PrecomputeJob.STATUS_PENDING, 'BUSY': PrecomputeJob.STATUS_RUNNING},
+        )
+
+    def test_sweep_keeps_the_priority_of_pending_viewed_jobs(self):
+        self.job('AAPL', priority=PrecomputeJob.PRIORITY_VIEWED)
+        self.job('MSFT', status=PrecomputeJob.STATUS_DONE, priority=PrecomputeJob.PRIORITY_VIEWED)
+
+        self.assertEqual(enqueue_universe(kinds=[PrecomputeJob.KIND_DETAIL], symbols=['aapl', 'msft', 'nvda']), 3)
+        self.assertEqual(
+            dict(PrecomputeJob.objects.values_list('symbol', 'priority')),
+            {'AAPL': PrecomputeJob.PRIORITY_VIEWED, 'MSFT': PrecomputeJob.PRIORITY_SWEEP, 'NVDA': PrecomputeJob.PRIORITY_SWEEP},
+        )
+        self.assertFalse(PrecomputeJob.objects.exclude(status=PrecomputeJob.STATUS_PENDING).exists())
+
+    def test_failed_jobs_record_their_error(self):
+        for symbol in ('GOOD', 'PARTIAL', 'BROKEN'):
+            self.job(symbol)
+        jobs = claim_jobs(PrecomputeJob.KIND_DETAIL, 'worker-1', 10)
+
+        def precompute(symbol):
+            if symbol == 'BROKEN':
+                raise RuntimeError('no fundamentals')
+            return symbol == 'GOOD'
+
+        with mock.patch('apps.grahams_table.precompute.precompute_stock_detail_data', side_effect=precompute), \
+                mock.patch('apps.grahams_table.precompute.connections'):
+            run_jobs(PrecomputeJob.KIND_DETAIL, jobs, InlineExecutor())
+
+        results = {job.symbol: (job.status, job.last_error, job.claimed_by) for job in PrecomputeJob.objects.all()}
+        self.assertEqual(results['GOOD'], (PrecomputeJob.STATUS_DONE, '', ''))
+        self.assertEqual(results['PARTIAL'][0], PrecomputeJob.STATUS_FAILED)
+        self.assertEqual(results['BROKEN'], (PrecomputeJob.STATUS_FAILED, 'no fundamentals', ''))
+
+
+class SnapshotQueryTests(TestCase):
+
+    def setUp(self):
+        for symbol, graham_diff, volatility in (('AAA', -30.0, 20.0), ('BBB', 10.0, None), ('CCC', -50.0, 35.0)):
+            ScreenerSnapshotRow.objects.create(symbol=symbol, graham_diff_pct=graham_diff, volatility=volatility)
+
+    def query(self, **params):
+        queryset, options = query_screener_snapshot(params)
+        return [row.symbol for row in queryset], options
+
+    def test_sorting_puts_missing_values_last(self):
+        self.assertEqual(self.query(sort='graham_diff')[0], ['CCC', 'AAA', 'BBB'])
+        self.assertEqual(self.query(sort='volatility', dir='desc')[0], ['CCC', 'AAA', 'BBB'])
+        self.assertEqual(self.query(sort='volatility')[0], ['AAA', 'CCC', 'BBB'])
+
+    def test_range_filters(self):
+        symbols, options = self.query(graham_diff_max='-20', volatility_min='25')
+        self.assertEqual(symbols, ['CCC'])
+        self.assertEqual(options['filters'], {'graham_diff_max': -20.0, 'volatility_min': 25.0})
+
+    def test_invalid_sort_and_filter_values_are_ignored(self):
+        symbols, options = self.query(sort='no_such_column', dir='sideways', graham_diff_max='nan', volatility_min='abc')
+        self.assertEqual(symbols, ['AAA', 'BBB', 'CCC'])
+        self.assertEqual((options['sort'], options['dir'], options['filters']), ('symbol', 'asc', {}))
+
+
+class PrefilterPriceCheckTests(SimpleTestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.history_path = os.path.join(self.data_dir, 'price_history')
+        last_bar = pd.Timestamp.now().normalize() - pd.Timedelta(days=5)
+        PriceHistoryStore(self.history_path).write('AAA', pd.Series([10.0, 11.0], index=[last_bar - pd.Timedelta(days=1), last_bar]))
+
+        fundamentals = mock.Mock(symbols=['AAA', 'BBB'], version='v1')
+        for target, value in (
+            ('get_fundamentals_index', fundamentals),
+            ('fundamentals_fingerprints', pd.Series({'AAA': 'f-aaa', 'BBB': 'f-bbb'})),
+            ('fundamentals_exclusions', {'AAA': [], 'BBB': []}),
+        ):
+            patcher = mock.patch(f'apps.grahams_table.prefilter.{target}', return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_prefilter(self, max_age_days):
+        with override_settings(
+            DOLT_EARNINGS_DATA_PATH=self.data_dir, PRICE_HISTORY_PATH=self.history_path,
+            SCREENER_MAX_PRICE_AGE_DAYS=max_age_days,
+        ):
+            summary = prefilter_tickers(check_prices=True, workers=1)
+        with open(os.path.join(self.data_dir, 'valid_tickers_for_screener.txt')) as f:
+            return summary, f.read().split()
+
+    def test_staleness_is_judged_again_when_the_price_file_is_unchanged(self):
+        summary, valid = self.run_prefilter(max_age_days=10)
+        self.assertEqual((summary['reevaluated'], valid), (2, ['AAA']))
+
+        # Same files, later cutoff: the ticker's last bar is now too old
+        summary, valid = self.run_prefilter(max_age_days=3)
+        self.assertEqual((summary['reevaluated'], valid), (0, []))
+
+
+class PrefilterFundamentalsTests(SimpleTestCase):
+
+    def exclusions(self, frames, symbols):
+        fundamentals = data_services.FundamentalsIndex(frames)
+        with mock.patch('apps.grahams_table.prefilter.get_universe_metrics', return_value=compute_universe_metrics(fundamentals)):
+            return fundamentals, fundamentals_exclusions(fundamentals, symbols, min_annual_periods=5)
+
+    def test_a_missing_cash_flow_file_counts_as_no_annual_periods(self):
+        equity = pd.DataFrame({
+            'symbol': ['AAA'], 'date': [pd.Timestamp('2021-12-31')], 'period': ['Year'],
+            'total_equity': [100.0], 'shares_outstanding': [10.0],
+        })
+        fundamentals, exclusions = self.exclusions(
+            {'cash_flow': pd.DataFrame(), 'equity': equity, 'eps_history': eps_history({'AAA': quarterly(range(2019, 2022), lambda year: 2.0)})},
+            ['AAA'],
+        )
+        self.assertEqual(list(fundamentals.frames['cash_flow'].columns), ['symbol', 'date', 'period', 'diluted_net_eps'])
+        self.assertEqual(exclusions['AAA'], ["fewer than 5 annual periods", "latest annual EPS missing or not positive"])
+
+    def test_without_any_fundamentals_every_symbol_is_excluded(self):
+        _, exclusions = self.exclusions({key: pd.DataFrame() for key in data_services.FundamentalsIndex.SOURCES}, ['AAA'])
+        self.assertEqual(len(exclusions['AAA']), 4)
+
+
+class FakePriceBackend:
+    """Serves `closes` (a Series) for every symbol and records the `start` of every fetch."""
+
+    def __init__(self, closes):
+        self.closes = closes
+        self.starts = []
+
+    def fetch_closes(self, symbols, period='10y', start=None):
+        self.starts.append(start)
+        closes = self.closes[self.closes.index >= start] if start is not None else self.closes
+        return pd.DataFrame({symbol: closes for symbol in symbols})
+
+    def fetch_company_names(self, symbols):
+        return {symbol: symbol for symbol in symbols}
+
+
+class IncrementalPriceHistoryTests(SimpleTestCase):
+
+    def setUp(self):
+        history_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, history_path)
+        self.store = PriceHistoryStore(history_path)
+        self.dates = pd.bdate_range('2024-01-01', periods=10)
+        self.store.write('AAA', pd.Series([100.0 + i for i in range(8)], index=self.dates[:8]))
+        # Stored a day ago, so it is older than the gateway's TTL
+        day_ago = time.time() - 86400
+        os.utime(self.store._file('AAA'), (day_ago, day_ago))
+
+    def test_only_new_bars_are_fetched_when_the_basis_is_unchanged(self):
+        backend = FakePriceBackend(pd.Series([100.0 + i for i in range(10)], index=self.dates))
+        closes = MarketDataGateway(backend, history_store=self.store).get_close_history('AAA')
+        self.assertEqual(backend.starts, [self.dates[6]])
+        self.assertEqual(list(closes), [100.0 + i for i in range(10)])
+
+    def test_full_history_is_reloaded_after_a_split(self):
+        # A 2:1 split on the last day: every earlier adjusted close is halved
+        split_adjusted = pd.Series([(100.0 + i) / 2 for i in range(9)] + [55.0], index=self.dates)
+        backend = FakePriceBackend(split_adjusted)
+        closes = MarketDataGateway(backend, history_store=self.store).get_close_history('AAA')
+        self.assertEqual(backend.starts, [self.dates[6], None])
+        for reloaded in (closes, self.store.read('AAA')):
+            self.assertEqual(list(reloaded), list(split_adjusted))
+
+    def test_stored_history_is_served_when_the_backend_is_down(self):
+        backend = FakePriceBackend(pd.Series(dtype=float))
+        backend.fetch_closes = mock.Mock(side_effect=ConnectionError('backend down'))
+        with self.assertLogs('apps.grahams_table.market_data', 'ERROR'):
+            closes = MarketDataGateway(backend, history_store=self.store).get_close_history('AAA')
+        self.assertEqual(list(closes), [100.0 + i for i in range(8)])
+        self.assertEqual(len(self.store.read('AAA')), 8)
+
+    def test_stored_history_is_kept_when_the_re_download_fails(self):
+        split_adjusted = pd.Series([(100.0 + i) / 2 for i in range(10)], index=self.dates)
+        backend = FakePriceBackend(split_adjusted)
+        fetch_closes = backend.fetch_closes
+
+        def fail_full_downloads(symbols, period='10y', start=None):
+            if start is None:
+                raise ConnectionError('backend down')
+            return fetch_closes(symbols, period, start)
+
+        backend.fetch_closes = fail_full_downloads
+        with self.assertLogs('apps.grahams_table.market_data', 'ERROR'):
+            closes = MarketDataGateway(backend, history_store=self.store).get_close_history('AAA')
+        # Bars adjusted on the new basis are not appended to the old ones
+        for kept in (closes, self.store.read('AAA')):
+            self.assertEqual(list(kept), [100.0 + i for i in range(8)])
+
+
+class SharedPriceFetchTests(SimpleTestCase):
+    """Two gateways over one history store stand in for two workers."""
+
+    def setUp(self):
+        cache.clear()
+        history_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, history_path)
+        self.store = PriceHistoryStore(history_path)
+        self.closes = pd.Series([10.0, 11.0, 12.0], index=pd.bdate_range('2024-01-01', periods=3))
+
+    def test_cold_symbols_are_downloaded_once_by_concurrent_workers(self):
+        fetching, release = threading.Event(), threading.Event()
+        backend = FakePriceBackend(self.closes)
+        fetch_closes = backend.fetch_closes
+
+        def slow_fetch(*args, **kwargs):
+            fetching.set()
+            release.wait(5)
+            return fetch_closes(*args, **kwargs)
+        backend.fetch_closes = slow_fetch
+
+        first, second = (MarketDataGateway(backend, history_store=self.store) for _ in range(2))
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first_result = executor.submit(first.get_close_history, 'AAA')
+            fetching.wait(5)
+            second_result = executor.submit(second.get_close_history, 'AAA')
+            release.set()
+            histories = [first_result.result(), second_result.result()]
+
+        self.assertEqual(backend.starts, [None])
+        for closes in histories:
+            self.assertEqual(list(closes), [10.0, 11.0, 12.0])
+
+    def test_company_names_are_persisted_for_other_workers(self):
+        backend = mock.Mock()
+        backend.fetch_company_names.return_value = {'AAA': 'Alpha Inc', 'BBB': 'BBB'}
+        MarketDataGateway(backend, history_store=self.store).get_company_names(['AAA', 'BBB'])
+
+        names = MarketDataGateway(backend, history_store=self.store).get_company_names(['AAA'])
+
+        self.assertEqual(names, {'AAA': 'Alpha Inc'})
+        backend.fetch_company_names.assert_called_once_with(['AAA', 'BBB'])
+        # A name that was never found is not persisted, so it is looked up again
+        MarketDataGateway(backend, history_store=self.store).get_company_names(['BBB'])
+        backend.fetch_company_names.assert_called_with(['BBB'])
+
+    def test_persisted_names_are_refreshed_after_their_ttl(self):
+        backend = mock.Mock()
+        backend.fetch_company_names.return_value = {'AAA': 'Alpha Inc'}
+        self.store.write_names({'AAA': 'Alpha Old'})
+
+        names = MarketDataGateway(backend, history_store=self.store, names_ttl=0).get_company_names(['AAA'])
+
+        self.assertEqual(names, {'AAA': 'Alpha Inc'})
+        self.assertEqual(self.store.read_names()['AAA'][0], 'Alpha Inc')
+
+
+class FundamentalsStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.csv_path = os.path.join(self.data_dir, 'eps_history.csv')
+        pd.DataFrame({
+            'act_symbol': ['BBB', 'AAA', 'AAA'], 'period_end_date': ['2020-03-31', '2020-06-30', '2020-03-31'],
+            'reported': [1.0, 2.0, 3.0],
+        }).to_csv(self.csv_path, index=False)
+        settings_override = override_settings(FUNDAMENTALS_STORE_PATH=os.path.join(self.data_dir, 'columnar'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_concurrent_readers_build_a_stale_store_once(self):
+        with mock.patch.object(fundamentals_store.pd, 'read_csv', wraps=pd.read_csv) as read_csv:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                frames = list(executor.map(
+                    lambda _: fundamentals_store.read_fundamentals('eps_history', self.csv_path), range(4),
+                ))
+        self.assertEqual(read_csv.call_count, 1)
+        self.assertEqual(list(frames[0]['act_symbol']), ['AAA', 'AAA', 'BBB'])
+        self.assertTrue(fundamentals_store.is_store_current('eps_history', self.csv_path))
+        self.assertEqual(
+            sorted(os.listdir(fundamentals_store.get_store_path())),
+            ['eps_history.lock', 'eps_history.manifest.json', 'eps_history.parquet'],
+        )
+
+
+class SyncDoltCsvsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.csv_path = os.path.join(self.data_dir, 'eps_history.csv')
+        with open(self.csv_path, 'w', newline='') as f:
+            f.write('act_symbol,"period, end",reported\nAAA,2020-12-31,1.5\n')
+
+    def test_changes_are_applied_under_a_quoted_header(self):
+        command = SyncDoltCsvsCommand()
+        diff = pd.DataFrame({
+            'diff_type': ['added'], 'to_act_symbol': ['BBB'], 'to_period, end': ['2021-12-31'], 'to_reported': ['2.5'],
+        })
+        with mock.patch.object(command, '_query', return_value=diff):
+            self.assertEqual(command._apply_changes('eps_history', self.csv_path, 'old', 'new'), ('appended', 1))
+
+        synced = pd.read_csv(self.csv_path)
+        self.assertEqual(list(synced.columns), ['act_symbol', 'period, end', 'reported'])
+        self.assertEqual(list(synced['act_symbol']), ['AAA', 'BBB'])
+        self.assertEqual(os.listdir(self.data_dir), ['eps_history.csv'])  # no temp file left behind
+
+
+class StreamedScreenerRowsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.symbols = ['AAA', 'BBB', 'CCC']
+        self.gateway = mock.Mock()
+        self.gateway.get_quotes.side_effect = lambda symbols: {
+            symbol: {'company_name': f"{symbol} Inc", 'prev_close': 10.0} for symbol in symbols
+        }
+        metrics = pd.DataFrame(
+            {'graham_number': [20.0] * 3, 'eps_growth': [5.0] * 3, 'eps_growth_complex': [False] * 3,
+             'eps_avg_5yr': [1.0] * 3, 'intrinsic_value': [40.0] * 3}, index=self.symbols,
+        )
+        pe_stats = pd.DataFrame({'pe_mean': [12.0, np.nan, 8.0]}, index=self.symbols)
+        self.get_pe_stats = mock.Mock(side_effect=lambda symbols: pe_stats.loc[symbols])
+        self.get_returns = mock.Mock(side_effect=lambda symbols: pd.DataFrame(np.nan, index=symbols, columns=RETURN_COLUMNS))
+        for name, value in (
+            ('get_market_data_gateway', mock.Mock(return_value=self.gateway)),
+            ('get_universe_metrics', mock.Mock(return_value=metrics)),
+            ('get_pe_stats', self.get_pe_stats), ('get_returns', self.get_returns),
+        ):
+            patcher = mock.patch.object(data_services, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def merged_rows(self, items):
+        rows = {}
+        for position, cells in items:
+            rows.setdefault(position, {}).update(cells)
+        return [rows[position] for position in sorted(rows)]
+
+    def test_fundamentals_cells_are_yielded_before_the_quotes_arrive(self):
+        release = threading.Event()
+        get_quotes = self.gateway.get_quotes.side_effect
+        self.gateway.get_quotes.side_effect = lambda symbols: release.wait(5) and get_quotes(symbols)
+
+        rows = data_services.iter_screener_rows(self.symbols)
+        first = next(rows)
+        self.assertFalse(release.is_set())
+        self.assertEqual(first, (0, {
+            'Symbol': 'AAA', 'Graham Num': 20.0, 'Intrinsic Val': 40.0, 'EPS AVG (5yr)': 1.0,
+            'Growth Rate (avg past 10 yrs)': '5.0%',
+        }))
+        release.set()
+        merged = self.merged_rows([first, *rows])
+
+        self.assertEqual(merged, data_services.get_screener_data_for_symbols(self.symbols))
+        self.assertEqual([row['Avg P/E (5yr)'] for row in merged], [12.0, None, 8.0])
+        self.assertEqual(merged[0]['Graham Diff %'], "-50.0%")
+
+    @override_settings(SCREENER_STREAM_CHUNK=2)
+    def test_parts_are_fetched_in_batches(self):
+        list(data_services.iter_screener_rows(self.symbols))
+
+        self.assertEqual(sorted(call.args[0] for call in self.gateway.get_quotes.call_args_list), [['AAA', 'BBB'], ['CCC']])
+        self.assertEqual(sorted(call.args[0] for call in self.get_pe_stats.call_args_list), [['AAA', 'BBB'], ['CCC']])
+        self.assertEqual(sorted(call.args[0] for call in self.get_returns.call_args_list), [['AAA', 'BBB'], ['CCC']])
+
+    def test_a_failed_part_is_shown_as_not_available(self):
+        self.gateway.get_quotes.side_effect = RuntimeError("quotes down")
+
+        merged = self.merged_rows(data_services.iter_screener_rows(self.symbols))
+
+        self.assertEqual(merged[1]['Company Name'], 'BBB')
+        self.assertIsNone(merged[1]['Prev. Close'])
+        self.assertEqual(merged[1]['Graham Diff %'], "N/A")
+        self.assertEqual(merged[2]['Avg P/E (5yr)'], 8.0)
+
+
+class DetailSourceTimeoutTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+        def slow(symbol):
+            self.release.wait(5)
+            return {'chart_data': {'dates': ['late']}}
+
+        def broken(symbol):
+            raise RuntimeError("statement store unavailable")
+
+        sources = {
+            'profile': (lambda symbol: {'profile': {'longName': 'Acme Corp'}}, lambda symbol: {'profile': {}}),
+            'prices': (slow, lambda symbol: {'chart_data': {}}),
+            'financials': (broken, lambda symbol: {'financials': {}}),
+        }
+        patcher = mock.patch.dict(data_services.DETAIL_DATA_SOURCES, sources, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(DETAIL_SOURCE_TIMEOUTS={'default': 1, 'prices': 0.2})
+    def test_late_and_failing_sources_fall_back_without_holding_up_the_page(self):
+        started = time.monotonic()
+        detail = data_services.get_stock_detail_data('ACME')
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(detail['profile'], {'longName': 'Acme Corp'})
+        self.assertEqual(detail['chart_data'], {})
+        self.assertEqual(detail['financials'], {})
+        self.assertEqual(sorted(detail['unavailable_sources']), ['financials', 'prices'])
+
+    @override_settings(DETAIL_SOURCE_TIMEOUTS={'default': 1, 'prices': 0.2})
+    def test_payloads_with_fallbacks_are_not_precomputed(self):
+        self.assertFalse(data_services.precompute_stock_detail_data('ACME'))
+
+        self.release.set()
+        data_services.DETAIL_DATA_SOURCES['financials'] = (lambda symbol: {'financials': {'rows': 1}}, None)
+        self.assertTrue(data_services.precompute_stock_detail_data('ACME'))
+        with mock.patch.object(data_services, '_fetch_stock_detail_data') as fetch:
+            self.assertEqual(data_services.get_stock_detail_data('ACME')['financials'], {'rows': 1})
+        fetch.assert_not_called()
+
+
+class ConditionalPageTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.version = ['v1']
+        self.rendered = []
+        self.cacheable = True
+
+        def view(request):
+            self.rendered.append(request)
+            response = HttpResponse(f"page {len(self.rendered)}")
+            response.page_cacheable = self.cacheable
+            return response
+        self.view = page_cache.conditional_page(lambda request: (list(self.version), None))(view)
+
+    def get(self, user=None, **headers):
+        request = RequestFactory().get('/grahams-table/', {'page': '2'}, **headers)
+        request.user = user or AnonymousUser()
+        return self.view(request)
+
+    def test_matching_etag_is_answered_with_304_before_rendering(self):
+        etag = self.get()['ETag']
+        response = self.get(user=mock.Mock(is_authenticated=True, pk=1), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)  # the ETag is per user
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(self.rendered), 2)
+
+        self.version[0] = 'v2'
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_anonymous_pages_are_served_from_the_page_cache(self):
+        self.get()
+        response = self.get()
+        self.assertEqual((response['X-Page-Cache'], response.content), ('hit', b"page 1"))
+        self.assertEqual(len(self.rendered), 1)
+
+    def test_pages_with_unavailable_data_are_not_cached(self):
+        self.cacheable = False
+        self.get()
+        self.assertEqual(self.get().content, b"page 2")
+
+    def test_failing_validators_render_the_page_without_an_etag(self):
+        view = page_cache.conditional_page(mock.Mock(side_effect=RuntimeError("db down")))(lambda request: HttpResponse("page"))
+        request = RequestFactory().get('/grahams-table/')
+        request.user = AnonymousUser()
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class SearchIndexNamesTests(TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        with open(os.path.join(self.data_dir, 'valid_tickers_for_screener.txt'), 'w') as f:
+            f.write("AAPL\nMSFT\n")
+        settings_override = override_settings(DOLT_EARNINGS_DATA_PATH=self.data_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        backend = FakePriceBackend(pd.Series(dtype=float))
+        backend.fetch_company_names = lambda symbols: {'AAPL': 'Apple Inc.', 'MSFT': 'Microsoft Corporation'}
+        patcher = mock.patch.object(search_index, 'get_market_data_gateway', return_value=MarketDataGateway(backend))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Let background name lookups finish while the fake gateway is still in place
+        self.addCleanup(lambda: search_index._name_lookup_executor.submit(lambda: None).result())
+        search_index._name_lookups_requested.clear()
+
+    def test_names_are_searchable_without_a_snapshot(self):
+        self.assertFalse(ScreenerSnapshotRow.objects.exists())
+        version = search_index._index_version()
+        search_index._build_index(version)
+        search_index._name_lookup_executor.submit(lambda: None).result()  # the background name lookup has run
+
+        self.assertNotEqual(search_index._index_version(), version)
+        index = search_index._build_index(search_index._index_version())
+        self.assertEqual([match.symbol for match in index.search('micro')], ['MSFT'])
+
+    def test_snapshot_names_are_an_extra_source(self):
+        ScreenerSnapshotRow.objects.create(symbol='ZZZZ', company_name='Zebra Holdings')
+        index = search_index._build_index('v1')
+        self.assertEqual([match.symbol for match in index.search('zebra')], ['ZZZZ'])
+
+
+def fundamentals_index(cash_flow, equity, eps_reports):
+    """A FundamentalsIndex over synthetic frames: {symbol: [(date, eps)]}, {symbol: [(date, equity, shares)]}."""
+    frames = {
+        'cash_flow': pd.DataFrame(
+            [(symbol, pd.Timestamp(date), 'Year', eps) for symbol, rows in cash_flow.items() for date, eps in rows],
+            columns=['symbol', 'date', 'period', 'diluted_net_eps'],
+        ),
+        'equity': pd.DataFrame(
+            [(symbol, pd.Timestamp(date), 'Year', total, shares) for symbol, rows in equity.items() for date, total, shares in rows],
+            columns=['symbol', 'date', 'period', 'total_equity', 'shares_outstanding'],
+        ),
+        'eps_history': eps_history(eps_reports),
+    }
+    return data_services.FundamentalsIndex(frames)
+
+
+class UniverseMetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.fundamentals = fundamentals_index(
+            cash_flow={
+                'GROW': [('2020-12-31', 2.0), ('2021-12-31', 3.0)],
+                'LOSS': [('2021-12-31', -1.5)],
+                'TURN': [('2021-12-31', 1.5)],
+                'NOEQ': [('2021-12-31', 2.5)],
+            },
+            equity={
+                'GROW': [('2020-12-31', 100.0, 10.0), ('2021-12-31', 150.0, 10.0)],
+                'LOSS': [('2021-12-31', 80.0, 4.0)],
+                'TURN': [('2021-12-31', 60.0, 3.0)],
+                'NOEQ': [('2021-12-31', 50.0, 0.0)],
+            },
+            eps_reports={
+                'GROW': quarterly(range(2012, 2022), lambda year: 1.0 + 0.2 * (year - 2012)),
+                'LOSS': quarterly(range(2018, 2022), lambda year: -1.5),
+                'TURN': quarterly(range(2016, 2022), lambda year: -1.0 if year < 2019 else 1.5),
+                'NOEQ': quarterly(range(2019, 2022), lambda year: 2.5),
+            },
+        )
+        self.metrics = compute_universe_metrics(self.fundamentals)
+
+    def assertMetric(self, symbol, column, expected):
+        value = self.metrics.at[symbol, column]
+        if expected is None:
+            self.assertTrue(pd.isna(value), f"{symbol} {column}: expected no value, got {value}")
+        else:
+            self.assertAlmostEqual(float(value), float(expected), places=6, msg=f"{symbol} {column}")
+
+    def test_matches_scalar_helpers(self):
+        for symbol in self.fundamentals.symbols:
+            with self.subTest(symbol=symbol):
+                eps = data_services.get_latest_annual_eps(self.fundamentals, symbol)
+                bvps = data_services.get_latest_bvps(self.fundamentals, symbol)
+                growth = data_services.calculate_eps_growth_rate(self.fundamentals, symbol)
+
+                self.assertMetric(symbol, 'latest_eps', eps)
+                self.assertMetric(symbol, 'bvps', bvps)
+                self.assertMetric(symbol, 'eps_avg_5yr', data_services.calculate_eps_avg(self.fundamentals, symbol))
+                self.assertMetric(symbol, 'graham_number', data_services.calculate_graham_number(eps, bvps))
+                self.assertMetric(symbol, 'intrinsic_value', data_services.calculate_intrinsic_value(eps, growth))
+                if growth == "N/A (Complex)":
+                    self.assertTrue(self.metrics.at[symbol, 'eps_growth_complex'])
+                else:
+                    self.assertMetric(symbol, 'eps_growth', growth)
+
+    def test_known_values(self):
+        self.assertMetric('GROW', 'bvps', 15.0)
+        self.assertMetric('GROW', 'graham_number', round(np.sqrt(22.5 * 3.0 * 15.0), 2))
+        self.assertMetric('LOSS', 'graham_number', None)
+        self.assertMetric('NOEQ', 'bvps', None)
+        self.assertTrue(self.metrics.at['TURN', 'eps_growth_complex'])
+
+    def test_diff_percentages_follow_prices(self):
+        priced = apply_prev_closes(self.metrics, {'GROW': 50.0})
+        graham = priced.at['GROW', 'graham_number']
+        self.assertAlmostEqual(priced.at['GROW', 'graham_diff_pct'], round((50.0 - graham) / graham * 100, 2))
+        self.assertTrue(pd.isna(priced.at['LOSS', 'graham_diff_pct']))
+
+
+class WhatIfValuationTests(SimpleTestCase):
+
+    def setUp(self):
+        self.metrics = pd.DataFrame({
+            'latest_eps': [3.0, -1.0, 2.0], 'eps_avg_5yr': [2.0, 1.0, np.nan], 'eps_ttm': [3.2, np.nan, 2.1],
+            'bvps': [15.0, 5.0, 8.0], 'eps_growth': [25.0, 4.0, np.nan],
+            'prev_close': [60.0, 10.0, 30.0],
+        }, index=['AAA', 'BBB', 'CCC']).reindex(columns=METRIC_COLUMNS)
+
+    def test_matches_scalar_formulas(self):
+        params, _ = params_from_query({'base_pe': '8.5', 'growth_mult': '2', 'aaa_yield': '5.1', 'growth_cap': '15'})
+        valued = apply_valuation(self.metrics, params)
+        for symbol, row in self.metrics.iterrows():
+            with self.subTest(symbol=symbol):
+                eps, growth = row['latest_eps'], None if pd.isna(row['eps_growth']) else row['eps_growth']
+                for column, expected in (
+                    ('graham_number', graham_number(eps, row['bvps'], params)),
+                    ('intrinsic_value', intrinsic_value(eps, growth, params)),
+                ):
+                    if expected is None:
+                        self.assertTrue(pd.isna(valued.at[symbol, column]))
+                    else:
+                        self.assertAlmostEqual(valued.at[symbol, column], expected)
+
+    def test_growth_cap_and_eps_source(self):
+        params, _ = params_from_query({'growth_cap': '10', 'eps_source': 'avg5'})
+        valued = apply_valuation(self.metrics, params)
+        expected = round(2.0 * (params.base_pe + params.growth_multiplier * 10) * params.yield_numerator / params.aaa_yield, 2)
+        self.assertAlmostEqual(valued.at['AAA', 'intrinsic_value'], expected)
+        self.assertAlmostEqual(valued.at['AAA', 'intrinsic_diff_pct'], round((60.0 - expected) / expected * 100, 2))
+
+    def test_invalid_query_values_are_ignored(self):
+        params, overrides = params_from_query({'base_pe': 'abc', 'aaa_yield': '0', 'eps_source': 'magic', 'growth_mult': '1.5'})
+        self.assertEqual(overrides, {'growth_mult': 1.5})
+        self.assertEqual(params, get_default_params()._replace(growth_multiplier=1.5))
+
+    def test_non_finite_values_are_ignored(self):
+        params, overrides = params_from_query({
+            'aaa_yield': 'nan', 'growth_cap': 'inf', 'base_pe': '-Infinity', 'graham_mult': 'NaN', 'growth_mult': '2',
+        })
+        self.assertEqual(overrides, {'growth_mult': 2.0})
+        self.assertEqual(params, get_default_params()._replace(growth_multiplier=2.0))
+
+
+class PEHistoryTests(SimpleTestCase):
+
+    def setUp(self):
+        # AAA reports 0.5 a quarter (TTM 2.0 from its fourth report); BBB only has annual EPS
+        self.fundamentals = fundamentals_index(
+            cash_flow={'AAA': [('2019-12-31', 2.0)], 'BBB': [('2019-12-31', 4.0), ('2020-12-31', -1.0)]},
+            equity={},
+            eps_reports={'AAA': quarterly(range(2019, 2021), lambda year: 2.0 if year == 2019 else 4.0)},
+        )
+        self.dates = pd.bdate_range('2019-01-01', '2021-06-30')
+        self.closes = pd.DataFrame({'AAA': 20.0, 'BBB': 40.0}, index=self.dates)
+
+    def test_eps_in_effect(self):
+        eps = eps_in_effect(self.fundamentals)
+        aaa = eps[eps['symbol'] == 'AAA'].set_index('date')['eps']
+        self.assertEqual(aaa.index[0], pd.Timestamp('2019-12-28'))  # the first date with four quarters
+        self.assertEqual(list(aaa.round(2)), [2.0, 2.5, 3.0, 3.5, 4.0])
+        self.assertEqual(list(eps[eps['symbol'] == 'BBB']['eps']), [4.0, -1.0])
+
+    def test_pe_uses_the_eps_in_effect_at_each_month_end(self):
+        pe = compute_pe(monthly_closes(self.closes), eps_in_effect(self.fundamentals)).set_index(['symbol', 'date'])['pe']
+        self.assertTrue(pd.isna(pe['AAA', pd.Timestamp('2019-11-30')]))       # before four quarters were reported
+        self.assertEqual(pe['AAA', pd.Timestamp('2019-12-31')], 10.0)         # 20 / 2.0
+        self.assertEqual(pe['AAA', pd.Timestamp('2020-07-31')], round(20 / 3.0, 2))
+        self.assertEqual(pe['AAA', pd.Timestamp('2021-06-30')], 5.0)          # 20 / 4.0
+        self.assertEqual(pe['BBB', pd.Timestamp('2020-06-30')], 10.0)         # 40 / 4.0
+        self.assertTrue(pd.isna(pe['BBB', pd.Timestamp('2021-01-31')]))       # negative EPS: no P/E
+
+    def test_incremental_update_matches_a_full_computation(self):
+        gateway = mock.Mock()
+        engine = PEHistoryEngine(history_period='5y')
+        with mock.patch('apps.grahams_table.pe_history.get_market_data_gateway', return_value=gateway):
+            gateway.get_close_matrix.return_value = self.closes[self.closes.index < '2021-03-15']
+            engine.get_series(self.fundamentals, ['AAA', 'BBB'])
+            gateway.get_close_matrix.return_value = self.closes
+            incremental = engine.get_series(self.fundamentals, ['AAA', 'BBB'])
+            full = PEHistoryEngine(history_period='5y').get_series(self.fundamentals, ['AAA', 'BBB'])
+        for symbol in ('AAA', 'BBB'):
+            pd.testing.assert_series_equal(incremental[symbol], full[symbol], check_freq=False)
+
+    def test_stats_over_the_window(self):
+        series = {'AAA': pd.Series([10.0, np.nan, 20.0, 30.0], index=pd.to_datetime(['2014-01-31', '2019-01-31', '2020-01-31', '2021-01-31']))}
+        stats = pe_stats(series, ['AAA', 'ZZZ'], years=5)
+        self.assertEqual(stats.loc['AAA'].tolist(), [25.0, 25.0, 20.0, 30.0])
+        self.assertTrue(stats.loc['ZZZ'].isna().all())
+
+
+class ReturnsEngineTests(SimpleTestCase):
+
+    def setUp(self):
+        dates = pd.bdate_range('2014-01-01', '2024-06-28')
+        self.closes = pd.DataFrame({
+            'FLAT': 50.0,
+            'STEP': np.where(dates < '2024-03-01', 100.0, 121.0),
+            'DROP': np.select([dates < '2018-01-01', dates < '2019-01-01'], [100.0, 50.0], 80.0),
+            # Stops trading mid-2020; measured up to its own last close
+            'GONE': np.where(dates < '2020-04-01', 10.0, np.where(dates <= '2020-06-30', 12.0, np.nan)),
+        }, index=dates)
+        self.returns = compute_returns(self.closes)
+
+    def cagr(self, start_price, end_price, start, end):
+        years = (pd.Timestamp(end) - pd.Timestamp(start)).days / 365.25
+        return round(((end_price / start_price) ** (1 / years) - 1) * 100, 2)
+
+    def test_known_values(self):
+        self.assertEqual(list(self.returns.columns), RETURN_COLUMNS)
+        self.assertEqual(self.returns.loc['FLAT'].tolist(), [0.0] * len(RETURN_COLUMNS))
+        self.assertEqual(self.returns.at['STEP', 'return_ytd'], 21.0)
+        self.assertEqual(self.returns.at['STEP', 'cagr_1y'], self.cagr(100.0, 121.0, '2023-06-28', '2024-06-28'))
+        self.assertEqual(self.returns.at['STEP', 'cagr_10y'], self.cagr(100.0, 121.0, '2014-06-27', '2024-06-28'))
+        self.assertEqual(self.returns.at['DROP', 'max_drawdown'], -50.0)
+        self.assertEqual(self.returns.at['DROP', 'cagr_5y'], 0.0)
+
+    def test_symbol_that_stopped_trading(self):
+        self.assertEqual(self.returns.at['GONE', 'return_ytd'], 20.0)
+        self.assertEqual(self.returns.at['GONE', 'cagr_1y'], self.cagr(10.0, 12.0, '2019-06-28', '2020-06-30'))
+        self.assertTrue(pd.isna(self.returns.at['GONE', 'cagr_10y']))  # no close ten years before its last one
+
+    def test_volatility_of_the_last_year(self):
+        daily = self.closes['STEP'].pct_change()
+        daily = daily[daily.index > pd.Timestamp('2023-06-28')]
+        expected = round(daily.std() * np.sqrt(TRADING_DAYS_PER_YEAR) * 100, 2)
+        self.assertAlmostEqual(self.returns.at['STEP', 'volatility'], expected)
+
+    def test_empty_matrix(self):
+        returns = compute_returns(pd.DataFrame(columns=['AAA'], dtype=float))
+        self.assertTrue(returns.loc['AAA'].isna().all())
+
+
+class StockFinancialsViewTests(SimpleTestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        settings_override = override_settings(
+            DOLT_EARNINGS_DATA_PATH=self.data_dir, FUNDAMENTALS_STORE_PATH=os.path.join(self.data_dir, 'columnar'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch('apps.grahams_table.views.get_company_name', return_value='Acme')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_statement(self, filename, **line_items):
+        pd.DataFrame({
+            'act_symbol': ['ACME', 'ACME'], 'date': ['2022-12-31', '2023-12-31'], 'period': ['Year', 'Year'], **line_items,
+        }).to_csv(os.path.join(self.data_dir, filename), index=False)
+
+    def get(self, statement_type):
+        return self.client.get(f'/grahams-table/stock/ACME/financials/{statement_type}/')
+
+    def test_a_missing_section_file_is_left_out(self):
+        # balance_sheet_assets.csv is missing
+        self.write_statement('balance_sheet_liabilities.csv', total_liabilities=[500.0, 600.0])
+        self.write_statement('balance_sheet_equity.csv', total_equity=[100.0, 150.0], shares_outstanding=[10.0, 10.0])
+
+        response = self.get('balance-sheet')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([table['title'] for table in response.context['statement_tables']], ['Liabilities', 'Equity'])
+        self.assertContains(response, '2023-12-31')
+
+    def test_without_any_statement_file_the_page_shows_no_data(self):
+        response = self.get('cash-flow')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['statement_tables'], [])
+        self.assertContains(response, 'No data available.')
+
+    def test_per_share_lines_keep_their_cents(self):
+        self.write_statement('income_statement.csv', sales=[1234567.4, 2345678.6], diluted_net_eps=[1.23, 2.5])
+
+        response = self.get('income-statement')
+
+        self.assertContains(response, '2,345,679')
+        self.assertContains(response, '1.23')
+        self.assertContains(response, '2.50')
@@ -1,7 +1,7 @@
 # /apps/grahams_table/urls.py
 from django.urls import path
 # Import the class-based views from your new views.py file
-from .views import StockScreenerPageView, StockDetailView
+from .views import StockScreenerPageView, StockDetailView, StockFinancialsView, SymbolSearchView, ScreenerRowsStreamView
 
 app_name = 'grahams_table'
 
@@ -9,6 +9,15 @@
     # URL for the main list of stocks, now pointing to the class-based view
     path('', StockScreenerPageView.as_view(), name='grahams_table_list'),
 
+    # Streamed rows (NDJSON) for a screener page rendered without them
+    path('rows/', ScreenerRowsStreamView.as_view(), name='screener_rows'),
+
+    # JSON typeahead for the screener search box
+    path('search/', SymbolSearchView.as_view(), name='symbol_search'),
+
     # URL for the detail page of a single stock
     path('stock/<str:symbol>/', StockDetailView.as_view(), name='stock_detail'),
+
+    # Financial statements for a single stock (income-statement, balance-sheet, cash-flow)
+    path('stock/<str:symbol>/financials/<str:statement_type>/', StockFinancialsView.as_view(), name='stock_financials'),
 ]
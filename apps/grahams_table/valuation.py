@@ -0,0 +1,97 @@
+# /apps/grahams_table/valuation.py
+"""
+Parameters of the Graham formulas used across the app.
+
+    graham number   = sqrt(graham_multiplier * eps * bvps)
+    intrinsic value = eps * (base_pe + growth_multiplier * g) * yield_numerator / aaa_yield
+
+with g the EPS growth rate in percent (optionally capped at growth_cap) and eps
+taken from eps_source: the latest annual EPS, the 5-year average or the trailing
+twelve months. The defaults come from settings.GRAHAM_VALUATION and
+settings.CURRENT_AAA_BOND_YIELD; the screener can override any of them per request
+(see params_from_query) to run what-if scenarios over the whole universe.
+"""
+import math
+from collections import namedtuple
+import numpy as np
+from django.conf import settings
+
+# eps_source -> universe metrics column
+EPS_SOURCES = {
+    'latest': 'latest_eps',
+    'avg5': 'eps_avg_5yr',
+    'ttm': 'eps_ttm',
+}
+
+ValuationParams = namedtuple('ValuationParams', [
+    'base_pe', 'growth_multiplier', 'yield_numerator', 'aaa_yield', 'growth_cap', 'eps_source', 'graham_multiplier',
+])
+
+# Query-string parameter -> ValuationParams field
+QUERY_PARAMS = {
+    'base_pe': 'base_pe',
+    'growth_mult': 'growth_multiplier',
+    'aaa_yield': 'aaa_yield',
+    'growth_cap': 'growth_cap',
+    'eps_source': 'eps_source',
+    'graham_mult': 'graham_multiplier',
+}
+
+
+def get_default_params():
+    """The valuation parameters from settings (these are what the snapshot is computed with)."""
+    configured = getattr(settings, 'GRAHAM_VALUATION', {})
+    return ValuationParams(
+        base_pe=configured.get('base_pe', 7.0),
+        growth_multiplier=configured.get('growth_multiplier', 1.0),
+        yield_numerator=configured.get('yield_numerator', 4.4),
+        aaa_yield=getattr(settings, 'CURRENT_AAA_BOND_YIELD', 4.5),
+        growth_cap=configured.get('growth_cap'),
+        eps_source=configured.get('eps_source', 'latest'),
+        graham_multiplier=configured.get('graham_multiplier', 22.5),
+    )
+
+
+def params_from_query(query):
+    """
+    The default parameters with any overrides from the query string applied.
+    Returns (params, overrides) where overrides holds only the valid parameters actually given.
+    """
+    params = get_default_params()
+    overrides = {}
+    for query_key, field in QUERY_PARAMS.items():
+        raw = (query.get(query_key) or '').strip()
+        if not raw:
+            continue
+        if field == 'eps_source':
+            if raw in EPS_SOURCES:
+                overrides[field] = raw
+            continue
+        try:
+            value = float(raw)
+        except ValueError:
+            continue
+        # float() also accepts 'nan' / 'inf', which would turn every valuation into N/A
+        if not math.isfinite(value):
+            continue
+        if field == 'aaa_yield' and value <= 0:
+            continue
+        overrides[field] = value
+    return params._replace(**overrides), {key: overrides[field] for key, field in QUERY_PARAMS.items() if field in overrides}
+
+
+def graham_number(eps, bvps, params=None):
+    params = params or get_default_params()
+    if eps is None or bvps is None or eps <= 0 or bvps <= 0: return None
+    try: return round(float(np.sqrt(params.graham_multiplier * eps * bvps)), 2)
+    except: return None
+
+
+def intrinsic_value(eps, growth_rate_pct, params=None):
+    params = params or get_default_params()
+    if eps is None or eps <= 0 or growth_rate_pct is None or not isinstance(growth_rate_pct, (int, float)): return None
+    if params.growth_cap is not None:
+        growth_rate_pct = min(growth_rate_pct, params.growth_cap)
+    try:
+        return round((eps * (params.base_pe + params.growth_multiplier * growth_rate_pct) * params.yield_numerator) / params.aaa_yield, 2)
+    except: return None
@@ -1,8 +1,23 @@
 # django_stock_screener_materio/apps/screener_app/views.py
 from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
+import json
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views import View
 from web_project.views import TemplateView # <-- Make sure this is the one being used
 from django.utils.translation import gettext_lazy as _
-from .data_services import get_screener_data_for_symbols, get_stock_detail_data
+from .data_services import (
+    get_screener_data_for_symbols, iter_screener_rows, get_stock_detail_data, load_valid_screener_symbols,
+    FINANCIAL_STATEMENTS, get_statement_periods, get_statement_tables, get_company_name,
+)
+from .models import ScreenerSnapshotRow
+from .caching import get_or_compute
+from .snapshot import query_screener_snapshot, query_screener_what_if, HEADER_SORT_KEYS
+from .valuation import params_from_query, EPS_SOURCES
+from .search_index import get_search_index, RANK_LABELS
+from .precompute import record_symbol_view
+from .page_cache import conditional_page, screener_validators, detail_validators
+from django.utils.decorators import method_decorator
 from django.core.paginator import Paginator
 import pandas as pd
 import logging
@@ -13,55 +28,153 @@
 
 logger = logging.getLogger(__name__)
 
+@method_decorator(conditional_page(screener_validators), name='get')
 class StockScreenerPageView(TemplateView):
     def get(self, request, *args, **kwargs):
         # A function to init the global layout. It is defined in web_project/__init__.py file
         context = TemplateLayout.init(self, super().get_context_data(**kwargs))
 
         # --- High-Performance Workflow ---
-
-        # Get pre-filtered list of valid symbols, using cache
-        valid_symbols = cache.get('valid_screener_symbols')
-        if not valid_symbols:
-            valid_tickers_file = os.path.join(settings.DOLT_EARNINGS_DATA_PATH, "valid_tickers_for_screener.txt")
-            if not os.path.exists(valid_tickers_file):
-                context['error_message'] = "The list of valid stocks has not been generated yet. Please run 'python manage.py prefilter_tickers' from your terminal."
-                return render(request, 'grahams_table/error_page.html', context)
-
-            with open(valid_tickers_file, 'r') as f:
-                valid_symbols = [line.strip() for line in f if line.strip()]
-            cache.set('valid_screener_symbols', valid_symbols, 3600)
-
-        # Handle Search
-        search_query = request.GET.get('q', '').strip()
-        symbols_to_display = valid_symbols
-        if search_query:
-            symbols_to_display = [s for s in valid_symbols if search_query.upper() in s.upper()]
-
-        # Paginate the list of SYMBOLS
-        paginator = Paginator(symbols_to_display, 15)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-
-        # Process data ONLY for the symbols on the current page
-        processed_stocks = get_screener_data_for_symbols(page_obj.object_list)
-
         table_headers = [
             "Company Name", "Symbol", "Prev. Close", "Avg P/E (5yr)",
             "Graham Num", "Graham Diff %", "Intrinsic Val", "Intrinsic Diff %",
-            "EPS AVG (5yr)", "Growth Rate (avg past 10 yrs)"
+            "EPS AVG (5yr)", "Growth Rate (avg past 10 yrs)",
+            "YTD %", "CAGR 5y %", "Max Drawdown %", "Volatility %",
         ]
+        search_query = request.GET.get('q', '').strip()
+        valuation_params, valuation_overrides = params_from_query(request.GET)
+        context.update({
+            'valuation': valuation_params._asdict(),
+            'valuation_overrides': valuation_overrides,
+            'eps_sources': list(EPS_SOURCES),
+        })
+
+        # Serve straight from the precomputed snapshot when one has been built
+        if ScreenerSnapshotRow.objects.exists():
+            if valuation_overrides:
+                # What-if: revalue the whole universe with the requested parameters
+                rows, options = query_screener_what_if(request.GET, valuation_params)
+                paginator = Paginator(rows, 15)
+                page_obj = paginator.get_page(request.GET.get('page'))
+                stocks_list = [ScreenerSnapshotRow(**row).as_table_row() for row in page_obj.object_list]
+            else:
+                queryset, options = query_screener_snapshot(request.GET)
+                paginator = Paginator(queryset, 15)
+                page_obj = paginator.get_page(request.GET.get('page'))
+                stocks_list = [row.as_table_row() for row in page_obj.object_list]
+
+            # Query string without sort/page so the header links keep the active filters
+            base_query = request.GET.copy()
+            for param in ('sort', 'dir', 'page'):
+                base_query.pop(param, None)
+
+            context.update({
+                'page_obj': page_obj,
+                'stocks_list': stocks_list,
+                'page_title': _('Stock Screener'),
+                'table_headers': table_headers,
+                'sort_keys': HEADER_SORT_KEYS,
+                'current_sort': options['sort'],
+                'current_dir': options['dir'],
+                'active_filters': options['filters'],
+                'base_query': base_query.urlencode(),
+                'search_query': search_query,
+                'total_results': paginator.count
+            })
+            return render(request, 'grahams_table/grahams_table_list.html', context)
+
+        # No snapshot yet: compute the current page on the fly
+        page = _screener_symbols_page(request)
+        if page is None:
+            context['error_message'] = "The list of valid stocks has not been generated yet. Please run 'python manage.py prefilter_tickers' from your terminal."
+            return render(request, 'grahams_table/error_page.html', context)
+        paginator, page_obj = page
+
+        if getattr(settings, 'SCREENER_ASYNC_ROWS', True):
+            # Send the table skeleton straight away; the rows stream in from ScreenerRowsStreamView
+            processed_stocks = [{"Symbol": symbol.upper()} for symbol in page_obj.object_list]
+            context['rows_stream_url'] = f"{reverse('grahams_table:screener_rows')}?{request.GET.urlencode()}"
+        else:
+            # Process data ONLY for the symbols on the current page
+            processed_stocks = get_screener_data_for_symbols(page_obj.object_list)
 
         context.update({
             'page_obj': page_obj,
             'stocks_list': processed_stocks,
             'page_title': _('Stock Screener'),
             'table_headers': table_headers,
+            'sort_keys': {},
             'search_query': search_query,
             'total_results': paginator.count
         })
         return render(request, 'grahams_table/grahams_table_list.html', context)
 
+
+def _screener_symbols_page(request):
+    """(paginator, page) over the symbols matching the request's search, or None without a universe file."""
+    # Get pre-filtered list of valid symbols, using the shared cache (one worker reads the file)
+    valid_symbols = get_or_compute('valid_screener_symbols', load_valid_screener_symbols, 3600)
+    if valid_symbols is None:
+        return None
+
+    # Handle Search
+    search_query = request.GET.get('q', '').strip()
+    symbols_to_display = valid_symbols
+    if search_query:
+        symbols_to_display = get_search_index().search_symbols(search_query)
+
+    # Paginate the list of SYMBOLS
+    paginator = Paginator(symbols_to_display, 15)
+    page_number = request.GET.get('page')
+    return paginator, paginator.get_page(page_number)
+
+
+class ScreenerRowsStreamView(View):
+    """
+    The rows of one screener page (same q/page parameters as the page itself) as
+    newline-delimited JSON {"index", "row"} lines, then {"done": true}. Each line carries
+    some of a row's cells (see iter_screener_rows); the page merges them by index.
+    """
+
+    def get(self, request, *args, **kwargs):
+        page = _screener_symbols_page(request)
+        symbols = list(page[1].object_list) if page else []
+
+        def lines():
+            for position, row in iter_screener_rows(symbols):
+                yield json.dumps({'index': position, 'row': row}, default=str) + "\n"
+            yield json.dumps({'done': True}) + "\n"
+
+        response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # don't let a proxy hold the rows back
+        return response
+
+class SymbolSearchView(View):
+    """
+    Typeahead for the screener search box: ranked ticker / company name matches as JSON.
+      q=<text>    what has been typed so far
+      limit=<n>   maximum number of results (default 10, at most 50)
+    """
+    max_limit = 50
+
+    def get(self, request, *args, **kwargs):
+        search_query = request.GET.get('q', '').strip()
+        try:
+            limit = min(max(int(request.GET.get('limit', 10)), 1), self.max_limit)
+        except ValueError:
+            limit = 10
+
+        matches = get_search_index().search(search_query, limit=limit)
+        return JsonResponse({
+            'query': search_query,
+            'results': [
+                {'symbol': match.symbol, 'name': match.name, 'match': RANK_LABELS[match.rank]}
+                for match in matches
+            ],
+        })
+
+@method_decorator(conditional_page(detail_validators), name='get')
 class StockDetailView(TemplateView):
     def get(self, request, *args, **kwargs):
         # A function to init the global layout. It is defined in web_project/__init__.py file
@@ -69,6 +182,8 @@ def get(self, request, *args, **kwargs):
 
         symbol_ticker = kwargs.get('symbol').upper()
         stock_data = get_stock_detail_data(symbol_ticker)
+        # Keep this symbol's screener row and detail payload fresh ahead of the universe sweep
+        record_symbol_view(symbol_ticker)
 
         context.update({
             'page_title': f"{stock_data.get('profile', {}).get('longName', symbol_ticker)} ({symbol_ticker})",
@@ -80,24 +195,41 @@ def get(self, request, *args, **kwargs):
             'financials': stock_data.get('financials'),
             'calculations': stock_data.get('calculations'),
         })
-        return render(request, 'grahams_table/grahams_table_list.html', context)
+        response = render(request, 'grahams_table/grahams_table_list.html', context)
+        # Don't keep a page with fallbacks in the page cache (see page_cache)
+        response.page_cacheable = not stock_data.get('unavailable_sources')
+        return response
 
 class StockFinancialsView(TemplateView):
+    """
+    Income statement, balance sheet (assets / liabilities / equity) or cash flow for one
+    symbol, straight from the indexed statement store. Query params:
+      period=Year|Quarter   which reports to show (default: annual)
+      page=<n>              which block of periods (newest first)
+    """
+    periods_per_page = 8
+
     def get(self, request, *args, **kwargs):
         context = TemplateLayout.init(self, super().get_context_data(**kwargs))
         symbol_ticker = kwargs.get('symbol').upper()
         statement_type = kwargs.get('statement_type')
+        if statement_type not in FINANCIAL_STATEMENTS:
+            raise Http404(f"Unknown statement type: {statement_type}")
 
-        # You can add logic here later to fetch the specific financial data
-        # based on the statement_type (e.g., balance-sheet, income-statement)
-        # For now, we'll just set the context for the template.
-
-        stock_data = get_stock_detail_data(symbol_ticker) # Reuse existing function to get company name
+        annual_indicator = getattr(settings, 'ANNUAL_REPORT_PERIOD_INDICATOR', 'Year')
+        period_type = request.GET.get('period', annual_indicator)
+        period_dates = get_statement_periods(statement_type, symbol_ticker, period_type)
+        paginator = Paginator(period_dates, self.periods_per_page)
+        page_obj = paginator.get_page(request.GET.get('page'))
 
         context.update({
-            'page_title': f"{stock_data.get('profile', {}).get('longName', symbol_ticker)} - {statement_type.replace('-', ' ').title()}",
+            'page_title': f"{get_company_name(symbol_ticker)} - {statement_type.replace('-', ' ').title()}",
             'symbol': symbol_ticker,
             'statement_type': statement_type,
+            'statement_types': list(FINANCIAL_STATEMENTS),
+            'period_type': period_type,
+            'page_obj': page_obj,
+            'statement_tables': get_statement_tables(statement_type, symbol_ticker, period_type, list(page_obj.object_list)),
             'detail_page_name': statement_type, # This is for highlighting the active menu item
         })
-        return render(request, 'grahams_table/grahams_table_list.html', context)
+        return render(request, 'grahams_table/stock_financials.html', context)
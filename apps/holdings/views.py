@@ -4,28 +4,37 @@
 from django.conf import settings
 import requests
 import json
-from apps.connection_page.models import SchwabToken
+from apps.connection_page.models import SchwabToken, SchwabAccount
+from apps.connection_page.schwab_client import get_schwab_client
+from apps.connection_page.account_registry import with_accounts, fetch_for_accounts, select_accounts
 
 @login_required
 def holdings_list(request):
     holdings = []
     error_message = None
 
+    # All linked accounts by default, or the one picked in the account filter
+    accounts = list(SchwabAccount.objects.filter(user=request.user))
+    selected_account = request.GET.get('account', '')
+
     try:
         token_obj = SchwabToken.objects.get(user=request.user)
-        accounts_url = f'https://api.schwabapi.com/trader/v1/accounts?fields=positions'
-        headers = {
-            'Authorization': f'Bearer {token_obj.access_token}'
-        }
 
-        response = requests.get(accounts_url, headers=headers)
-        response.raise_for_status()
-        accounts_data = response.json()
+        # Positions of every account, addressed by its stored hash and fetched concurrently
+        def fetch_account(account):
+            return get_schwab_client().get_json(
+                f'/trader/v1/accounts/{account.hash_value}', token_obj.access_token, params={'fields': 'positions'},
+            )
+
+        def fetch(registered):
+            return fetch_for_accounts(select_accounts(registered, selected_account or None), fetch_account)
 
-        if accounts_data and isinstance(accounts_data, list) and len(accounts_data) > 0:
-            first_account = accounts_data[0]
-            if 'securitiesAccount' in first_account:
-                holdings = first_account['securitiesAccount'].get('positions', [])
+        for account, account_data in with_accounts(request.user, token_obj.access_token, fetch):
+            if account_data and 'securitiesAccount' in account_data:
+                for position in account_data['securitiesAccount'].get('positions', []):
+                    holdings.append(dict(position, account_number=account.account_number, account=account.display_name))
+        if not accounts:
+            accounts = list(SchwabAccount.objects.filter(user=request.user))
 
     except SchwabToken.DoesNotExist:
         error_message = "You haven't connected a Schwab account yet."
@@ -37,6 +46,9 @@ def holdings_list(request):
     context = {
         'holdings': holdings,
         'error_message': error_message,
+        'accounts': accounts,
+        'selected_account': selected_account,
+        'show_accounts': len(accounts) > 1 and not selected_account,
         'is_menu': True,
     }
     return render(request, 'holdings/holdings_list.html', context)
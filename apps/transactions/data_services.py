@@ -2,43 +2,47 @@
 import requests
 from django.conf import settings
 from apps.connection_page.models import SchwabToken
-from datetime import datetime, timedelta
+from apps.connection_page.schwab_client import get_schwab_client
+from apps.connection_page.account_registry import with_accounts, fetch_for_accounts, select_accounts
+from datetime import datetime, timedelta, timezone as dt_timezone
 import json
 import pandas as pd
 
+def _api_timestamp(moment):
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(dt_timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def fetch_account_transactions(access_token, account, start_date, end_date):
+    """One account's transactions between two datetimes, straight from the API (raises requests.HTTPError)."""
+    params = {'startDate': _api_timestamp(start_date), 'endDate': _api_timestamp(end_date)}
+    return get_schwab_client().get_json(f'/trader/v1/accounts/{account.hash_value}/transactions', access_token, params=params) or []
+
 # The function now accepts a date range
-def get_transactions_for_user(user, start_date, end_date):
+def get_transactions_for_user(user, start_date, end_date, account_id=None):
     """
-    Fetches transaction history for a user's linked Schwab account for a specific date range.
+    Fetches transaction history for a specific date range from every linked Schwab account
+    (or only the SchwabAccount with pk `account_id`). The accounts are fetched concurrently
+    and merged newest first; each transaction is tagged with its 'account_number' and 'account'
+    (the masked number shown in the UI). The transactions page reads the local ledger instead
+    (see ledger.py); this is the live call.
     """
     try:
         token_obj = SchwabToken.objects.get(user=user)
-        headers = {'Authorization': f'Bearer {token_obj.access_token}'}
-
-        # Step 1: Get the account hash
-        account_numbers_url = 'https://api.schwabapi.com/trader/v1/accounts/accountNumbers'
-        acc_num_response = requests.get(account_numbers_url, headers=headers)
-        acc_num_response.raise_for_status()
-        account_hashes = acc_num_response.json()
-
-        if not (account_hashes and isinstance(account_hashes, list) and len(account_hashes) > 0):
-            return []
-
-        account_hash = account_hashes[0].get('hashValue')
-        if not account_hash:
-            return []
 
-        # Step 2: Use the hash to fetch transactions with the provided date range
-        transactions_url = f'https://api.schwabapi.com/trader/v1/accounts/{account_hash}/transactions'
-        params = {
-            'startDate': start_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
-            'endDate': end_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
-        }
+        def fetch_account(account):
+            return fetch_account_transactions(token_obj.access_token, account, start_date, end_date)
 
-        trx_response = requests.get(transactions_url, headers=headers, params=params)
-        trx_response.raise_for_status()
+        # The account hashes come from the stored registry, not a lookup per request
+        def fetch(accounts):
+            merged = []
+            for account, transactions in fetch_for_accounts(select_accounts(accounts, account_id), fetch_account):
+                for trx in transactions or []:
+                    merged.append(dict(trx, account_number=account.account_number, account=account.display_name))
+            merged.sort(key=lambda trx: trx.get('time') or trx.get('transactionDate') or '', reverse=True)
+            return merged
 
-        return trx_response.json()
+        return with_accounts(user, token_obj.access_token, fetch)
 
     except SchwabToken.DoesNotExist:
         print(">>> ERROR: User does not have a Schwab token.")
@@ -0,0 +1,268 @@
+# /apps/transactions/ledger.py
+"""
+Local ledger of Schwab transactions (the Transaction model).
+
+sync_transactions(user) brings every linked account up to date. It fetches
+only the range since the account's last sync: from synced_through, minus
+TRANSACTIONS_SYNC_OVERLAP_DAYS for entries that post late. A new account is
+back-filled TRANSACTIONS_BACKFILL_DAYS. The range is split into windows of at
+most SCHWAB_TRANSACTIONS_MAX_WINDOW_DAYS, the API's largest date range, and
+rows are upserted by activity id, so syncing the same range twice is harmless.
+Rows in a re-synced range that Schwab no longer returns (cancelled, or
+re-issued under a new id) are removed; older changes are only picked up by
+re-syncing the account from scratch. Accounts are synced concurrently and
+independently (one failing account doesn't stop the others); only one sync
+per user runs at a time.
+
+The transactions page calls ensure_synced(user) and then queries the ledger.
+A user's first visit waits for the backfill. Later visits are served from the
+ledger straight away, and a sync older than TRANSACTIONS_SYNC_INTERVAL is
+refreshed in the background. Page views start at most one sync per user per
+interval, so a failing sync isn't retried on every view.
+`python manage.py sync_transactions` syncs everyone, e.g. from cron.
+"""
+import json
+import hashlib
+import logging
+from datetime import timedelta, timezone as dt_timezone
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.connection_page.models import SchwabToken, SchwabAccount
+from apps.connection_page.account_registry import with_accounts, fetch_for_accounts, is_stale_account_error
+from apps.grahams_table.caching import cache_lock
+from .models import Transaction, TransactionSyncState
+from .data_services import fetch_account_transactions
+
+logger = logging.getLogger(__name__)
+
+LEDGER_FIELDS = ['type', 'transaction_date', 'symbol', 'description', 'net_amount', 'raw']
+SYNC_CLAIM_KEY = 'transactions_sync_claimed:{}'
+SYNC_ERROR_KEY = 'transactions_sync_error:{}'
+
+_sync_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='transactions-sync')
+
+
+# --- Parsing ---
+def _transaction_date(trx):
+    for key in ('time', 'transactionDate', 'tradeDate', 'settlementDate'):
+        value = trx.get(key)
+        moment = parse_datetime(value) if isinstance(value, str) else None
+        if moment is not None:
+            return moment if timezone.is_aware(moment) else timezone.make_aware(moment, dt_timezone.utc)
+    return None
+
+
+def _transaction_symbol(trx):
+    # Schwab lists the instruments under transferItems (cash legs included); older payloads use transactionItem
+    for item in trx.get('transferItems') or []:
+        instrument = item.get('instrument') or {}
+        if instrument.get('assetType') != 'CURRENCY' and instrument.get('symbol'):
+            return instrument['symbol']
+    return ((trx.get('transactionItem') or {}).get('instrument') or {}).get('symbol') or ''
+
+
+def ledger_row(user, account, trx):
+    """An unsaved Transaction for one API transaction, or None if it has no usable date."""
+    transaction_date = _transaction_date(trx)
+    if transaction_date is None:
+        return None
+    activity_id = trx.get('activityId') or trx.get('transactionId')
+    if activity_id is None:
+        activity_id = hashlib.sha1(json.dumps(trx, sort_keys=True, default=str).encode()).hexdigest()
+    try:
+        net_amount = float(trx.get('netAmount') or 0)
+    except (TypeError, ValueError):
+        net_amount = 0.0
+    return Transaction(
+        user=user, account=account, activity_id=str(activity_id)[:64],
+        type=(trx.get('type') or '')[:64], transaction_date=transaction_date,
+        symbol=_transaction_symbol(trx)[:32], description=trx.get('description') or '',
+        net_amount=net_amount, raw=trx,
+    )
+
+
+# --- Sync ---
+def sync_windows(start, end, max_days=None):
+    """[(start, end), ...] covering start..end in windows the API accepts."""
+    max_days = max_days or getattr(settings, 'SCHWAB_TRANSACTIONS_MAX_WINDOW_DAYS', 365)
+    windows = []
+    while start < end:
+        window_end = min(start + timedelta(days=max_days), end)
+        windows.append((start, window_end))
+        start = window_end
+    return windows
+
+
+def _fetch_account_since(access_token, account, start, end):
+    """
+    (transactions, synced_through) for one account, window by window. A failure in the first
+    window is raised (it may be a stale account hash); a later one keeps what was fetched so far.
+    """
+    fetched, synced_through = [], None
+    for i, (window_start, window_end) in enumerate(sync_windows(start, end)):
+        try:
+            fetched.extend(fetch_account_transactions(access_token, account, window_start, window_end))
+        except Exception as e:
+            if i == 0:
+                raise
+            logger.warning(f"Transaction sync for {account.display_name} stopped at {window_start:%Y-%m-%d}: {e}")
+            break
+        synced_through = window_end
+    return fetched, synced_through
+
+
+def _fetch_account_or_error(access_token, account, start, end):
+    """(transactions, synced_through, None), or ([], None, error) when the account couldn't be fetched."""
+    try:
+        return (*_fetch_account_since(access_token, account, start, end), None)
+    except Exception as e:
+        return [], None, e
+
+
+def _error_message(error):
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return f"Schwab returned HTTP {error.response.status_code}"
+    return str(error)[:1000]
+
+
+def sync_transactions(user):
+    """
+    Syncs every linked account of `user` into the ledger; returns the number of transactions written.
+    An account that fails is logged and recorded in its TransactionSyncState, and the others still sync.
+    """
+    with cache_lock(f'transactions_sync:{user.pk}', timeout=getattr(settings, 'TRANSACTIONS_SYNC_LOCK_TIMEOUT', 600)) as acquired:
+        if not acquired:
+            logger.info(f"A transaction sync for user {user.pk} is already running; skipping.")
+            return 0
+        return _sync_transactions(user)
+
+
+def _sync_transactions(user):
+    token_obj = SchwabToken.objects.get(user=user)
+    now = timezone.now()
+    overlap = timedelta(days=getattr(settings, 'TRANSACTIONS_SYNC_OVERLAP_DAYS', 3))
+    backfill_start = now - timedelta(days=getattr(settings, 'TRANSACTIONS_BACKFILL_DAYS', 1825))
+    starts, resyncs, attempts = {}, set(), []
+
+    def fetch(accounts):
+        attempts.append(accounts)
+        for account in accounts:
+            state, _ = TransactionSyncState.objects.get_or_create(account=account)
+            if state.synced_through:
+                starts[account.pk] = max(state.synced_through - overlap, backfill_start)
+                resyncs.add(account.pk)
+            else:
+                starts[account.pk] = backfill_start
+        results = fetch_for_accounts(
+            accounts, lambda account: _fetch_account_or_error(token_obj.access_token, account, starts[account.pk], now),
+        )
+        # A 401 / 404 may mean a stale account hash: raise it once so with_accounts refreshes the registry
+        stale = [error for _, (_, _, error) in results if is_stale_account_error(error)]
+        if stale and len(attempts) == 1:
+            raise stale[0]
+        return results
+
+    written, failed = 0, 0
+    for account, (fetched, synced_through, error) in with_accounts(user, token_obj.access_token, fetch):
+        if error is not None:
+            logger.error(f"Transaction sync for {account.display_name} (user {user.pk}) failed: {error}")
+            TransactionSyncState.objects.filter(account=account).update(last_error=_error_message(error))
+            failed += 1
+            continue
+
+        rows = [row for row in (ledger_row(user, account, trx) for trx in fetched) if row is not None]
+        with transaction.atomic():
+            Transaction.objects.bulk_create(
+                rows, batch_size=500, update_conflicts=True,
+                unique_fields=['account', 'activity_id'], update_fields=LEDGER_FIELDS + ['updated_at'],
+            )
+            if account.pk in resyncs:
+                _reconcile(account, starts[account.pk], synced_through, rows)
+            TransactionSyncState.objects.filter(account=account).update(
+                synced_through=synced_through or now, last_synced_at=now, last_error='',
+            )
+        written += len(rows)
+    cache.delete(SYNC_ERROR_KEY.format(user.pk))
+    logger.info(f"Transaction ledger synced for user {user.pk}: {written} transactions written, {failed} accounts failed")
+    return written
+
+
+def _reconcile(account, start, end, rows):
+    """
+    Removes ledger rows of `account` dated start..end that Schwab no longer returns for that
+    range (cancelled or re-issued under a new activity id). Corrections that keep their
+    activity id are already applied by the upsert.
+    """
+    removed, _ = Transaction.objects.filter(account=account, transaction_date__range=(start, end)).exclude(
+        activity_id__in=[row.activity_id for row in rows],
+    ).delete()
+    if removed:
+        logger.info(f"Removed {removed} transactions no longer returned by Schwab for {account.display_name}")
+
+
+# --- Page views ---
+def _claim_sync(user_id):
+    """True at most once per TRANSACTIONS_SYNC_INTERVAL per user, so a failing sync isn't retried on every view."""
+    return cache.add(SYNC_CLAIM_KEY.format(user_id), True, getattr(settings, 'TRANSACTIONS_SYNC_INTERVAL', 900))
+
+
+def _record_failure(user_id, message):
+    TransactionSyncState.objects.filter(account__user_id=user_id).update(last_error=message)
+    cache.set(SYNC_ERROR_KEY.format(user_id), message, getattr(settings, 'TRANSACTIONS_SYNC_INTERVAL', 900))
+
+
+def _background_sync(user_id):
+    try:
+        sync_transactions(get_user_model().objects.get(pk=user_id))
+    except Exception as e:
+        logger.error(f"Background transaction sync for user {user_id} failed: {e}")
+        _record_failure(user_id, _error_message(e))
+    finally:
+        connections.close_all()
+
+
+def _sync_error(user):
+    """The latest sync failure to show the user: an account's, or that of a sync that failed as a whole."""
+    account_error = TransactionSyncState.objects.filter(account__user=user).exclude(last_error='').values_list(
+        'last_error', flat=True,
+    ).first()
+    return account_error or cache.get(SYNC_ERROR_KEY.format(user.pk))
+
+
+def ensure_synced(user):
+    """
+    Makes sure the ledger is usable for `user` before it is queried: syncs now if an account
+    has never been synced, otherwise starts a background sync when the last one is older than
+    TRANSACTIONS_SYNC_INTERVAL. Either kind of sync starts at most once per interval, failed
+    or not. Returns an error message when a sync failed, else None.
+    """
+    states = {
+        account.pk: getattr(account, 'transaction_sync', None)
+        for account in SchwabAccount.objects.filter(user=user).select_related('transaction_sync')
+    }
+    never_synced = not states or any(state is None or state.synced_through is None for state in states.values())
+    if never_synced:
+        if _claim_sync(user.pk):
+            try:
+                sync_transactions(user)
+            except SchwabToken.DoesNotExist:
+                return None
+            except Exception as e:
+                logger.error(f"Transaction sync for user {user.pk} failed: {e}")
+                _record_failure(user.pk, _error_message(e))
+        error = _sync_error(user)
+        return f"Could not sync transactions from Schwab: {error}" if error else None
+
+    interval = timedelta(seconds=getattr(settings, 'TRANSACTIONS_SYNC_INTERVAL', 900))
+    last_synced = min(state.last_synced_at or state.synced_through for state in states.values())
+    if timezone.now() - last_synced >= interval and _claim_sync(user.pk):
+        _sync_executor.submit(_background_sync, user.pk)
+    error = _sync_error(user)
+    return f"Showing the last synced transactions; the latest sync failed: {error}" if error else None
@@ -0,0 +1,30 @@
+# /apps/transactions/management/commands/sync_transactions.py
+import time
+from django.core.management.base import BaseCommand
+
+from apps.connection_page.models import SchwabToken
+from apps.transactions.ledger import sync_transactions
+
+
+class Command(BaseCommand):
+    help = (
+        "Brings the local transaction ledger up to date for every user with a Schwab connection, "
+        "fetching only what is new since each account's last sync. Run it periodically (e.g. via cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help="Only sync these users (default: everyone with a Schwab token).")
+
+    def handle(self, *args, **options):
+        tokens = SchwabToken.objects.select_related('user')
+        if options['usernames']:
+            tokens = tokens.filter(user__username__in=options['usernames'])
+
+        started = time.monotonic()
+        for token_obj in tokens:
+            try:
+                written = sync_transactions(token_obj.user)
+                self.stdout.write(f"{token_obj.user.username}: {written} transactions written.")
+            except Exception as e:
+                self.stderr.write(f"{token_obj.user.username}: sync failed: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Transaction ledger synced in {time.monotonic() - started:.1f}s."))
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('connection_page', '0002_schwabaccount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('synced_through', models.DateTimeField(blank=True, null=True)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_sync', to='connection_page.schwabaccount')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_id', models.CharField(max_length=64)),
+                ('type', models.CharField(blank=True, max_length=64)),
+                ('transaction_date', models.DateTimeField()),
+                ('symbol', models.CharField(blank=True, max_length=32)),
+                ('description', models.TextField(blank=True)),
+                ('net_amount', models.FloatField(default=0)),
+                ('raw', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='connection_page.schwabaccount')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-transaction_date', '-id'],
+                'indexes': [models.Index(fields=['user', 'transaction_date'], name='trx_user_date_idx'), models.Index(fields=['user', 'account', 'transaction_date'], name='trx_user_account_date_idx'), models.Index(fields=['user', 'type', 'transaction_date'], name='trx_user_type_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(fields=('account', 'activity_id'), name='unique_transaction_per_account'),
+        ),
+    ]
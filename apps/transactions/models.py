@@ -1,3 +1,54 @@
 from django.db import models
+from django.conf import settings
 
-# Create your models here.
+
+class Transaction(models.Model):
+    """
+    One Schwab transaction in the local ledger, kept up to date by ledger.sync_transactions
+    so the transactions page can browse any date range without calling the API.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transactions')
+    account = models.ForeignKey('connection_page.SchwabAccount', on_delete=models.CASCADE, related_name='transactions')
+    # Schwab's activityId (or a hash of the payload when it has none)
+    activity_id = models.CharField(max_length=64)
+    type = models.CharField(max_length=64, blank=True)
+    transaction_date = models.DateTimeField()
+    symbol = models.CharField(max_length=32, blank=True)
+    description = models.TextField(blank=True)
+    net_amount = models.FloatField(default=0)
+    # The transaction as the API returned it
+    raw = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-transaction_date', '-id']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'activity_id'], name='unique_transaction_per_account'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'transaction_date'], name='trx_user_date_idx'),
+            models.Index(fields=['user', 'account', 'transaction_date'], name='trx_user_account_date_idx'),
+            models.Index(fields=['user', 'type', 'transaction_date'], name='trx_user_type_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.net_amount} on {self.transaction_date:%Y-%m-%d} ({self.account.display_name})"
+
+    def as_api_dict(self):
+        """The transaction in the shape the API returns, tagged like get_transactions_for_user's results."""
+        return dict(
+            self.raw, type=self.type, netAmount=self.net_amount, transactionDate=self.transaction_date, symbol=self.symbol,
+            account_number=self.account.account_number, account=self.account.display_name,
+        )
+
+
+class TransactionSyncState(models.Model):
+    """How far each account's ledger has been synced from the API."""
+    account = models.OneToOneField('connection_page.SchwabAccount', on_delete=models.CASCADE, related_name='transaction_sync')
+    # Transactions up to this time are in the ledger; the next sync starts from here
+    synced_through = models.DateTimeField(null=True, blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Transaction sync for {self.account.display_name}: through {self.synced_through}"
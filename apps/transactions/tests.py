@@ -1,3 +1,225 @@
-from django.test import TestCase
+import threading
+from datetime import datetime, timedelta
+from unittest import mock
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
 
-# Create your tests here.
+from apps.connection_page.models import SchwabToken, SchwabAccount
+from apps.connection_page.account_registry import get_accounts
+from .models import Transaction, TransactionSyncState
+from .ledger import sync_transactions, ensure_synced
+from .data_services import get_transactions_for_user
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(f"{status_code} error", response=response)
+
+
+class FakeTransactionsApi:
+    """Stands in for fetch_account_transactions: serves `transactions` per account hash and records every window."""
+
+    def __init__(self):
+        self.transactions = {}
+        self.calls = []
+        self.failures = {}  # account hash -> (fail windows starting at or after this time, exception)
+
+    def add(self, hash_value, activity_id, days_ago, amount=10.0):
+        moment = timezone.now() - timedelta(days=days_ago)
+        self.transactions.setdefault(hash_value, []).append({
+            'activityId': activity_id, 'time': moment.isoformat(), 'type': 'DIVIDEND_OR_INTEREST', 'netAmount': amount,
+        })
+
+    def __call__(self, access_token, account, start, end):
+        self.calls.append((account.hash_value, start, end))
+        failure = self.failures.get(account.hash_value)
+        if failure and start >= failure[0]:
+            raise failure[1]
+        return [
+            trx for trx in self.transactions.get(account.hash_value, [])
+            if start <= datetime.fromisoformat(trx['time']) <= end
+        ]
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    TRANSACTIONS_BACKFILL_DAYS=800, SCHWAB_TRANSACTIONS_MAX_WINDOW_DAYS=365,
+    TRANSACTIONS_SYNC_OVERLAP_DAYS=3, TRANSACTIONS_SYNC_INTERVAL=900,
+)
+class LedgerSyncTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('investor', password='secret')
+        SchwabToken.objects.create(user=self.user, access_token='token')
+        self.first = SchwabAccount.objects.create(user=self.user, account_number='11111111', hash_value='HASH1')
+        self.second = SchwabAccount.objects.create(user=self.user, account_number='22222222', hash_value='HASH2')
+        self.api = FakeTransactionsApi()
+        patcher = mock.patch('apps.transactions.ledger.fetch_account_transactions', self.api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ledger_ids(self, account):
+        return set(Transaction.objects.filter(account=account).values_list('activity_id', flat=True))
+
+    def test_backfill_is_fetched_in_windows(self):
+        for days_ago, activity_id in ((700, 'old'), (400, 'middle'), (10, 'recent')):
+            self.api.add('HASH1', activity_id, days_ago)
+
+        self.assertEqual(sync_transactions(self.user), 3)
+
+        windows = [(start, end) for hash_value, start, end in self.api.calls if hash_value == 'HASH1']
+        self.assertEqual(len(windows), 3)
+        self.assertTrue(all(end - start <= timedelta(days=365) for start, end in windows))
+        self.assertTrue(all(windows[i][1] == windows[i + 1][0] for i in range(len(windows) - 1)))
+        self.assertEqual(self.ledger_ids(self.first), {'old', 'middle', 'recent'})
+        self.assertEqual(TransactionSyncState.objects.get(account=self.first).synced_through, windows[-1][1])
+
+    def test_sync_resumes_after_a_failed_window(self):
+        self.api.add('HASH1', 'old', 700)
+        self.api.add('HASH1', 'recent', 10)
+        # The last of the three backfill windows fails
+        self.api.failures['HASH1'] = (timezone.now() - timedelta(days=100), http_error(503))
+
+        sync_transactions(self.user)
+        state = TransactionSyncState.objects.get(account=self.first)
+        self.assertEqual(self.ledger_ids(self.first), {'old'})
+        self.assertLess(state.synced_through, timezone.now() - timedelta(days=10))
+
+        del self.api.failures['HASH1']
+        self.api.calls.clear()
+        sync_transactions(self.user)
+        resumed_from = min(start for hash_value, start, _ in self.api.calls if hash_value == 'HASH1')
+        self.assertEqual(resumed_from, state.synced_through - timedelta(days=3))
+        self.assertEqual(self.ledger_ids(self.first), {'old', 'recent'})
+
+    def test_a_failing_account_does_not_stop_the_others(self):
+        self.api.add('HASH1', 'first', 10)
+        self.api.add('HASH2', 'second', 10)
+        self.api.failures['HASH1'] = (timezone.now() - timedelta(days=1000), http_error(500))
+
+        self.assertEqual(sync_transactions(self.user), 1)
+
+        self.assertEqual(self.ledger_ids(self.second), {'second'})
+        failed = TransactionSyncState.objects.get(account=self.first)
+        self.assertIsNone(failed.synced_through)
+        self.assertIn('500', failed.last_error)
+
+    def test_resync_removes_cancelled_transactions(self):
+        self.api.add('HASH1', 'kept', 30)
+        self.api.add('HASH1', 'cancelled', 1)
+        sync_transactions(self.user)
+
+        self.api.transactions['HASH1'] = [trx for trx in self.api.transactions['HASH1'] if trx['activityId'] == 'kept']
+        sync_transactions(self.user)
+        self.assertEqual(self.ledger_ids(self.first), {'kept'})
+
+    def test_page_views_retry_a_failed_sync_once_per_interval(self):
+        for hash_value in ('HASH1', 'HASH2'):
+            self.api.failures[hash_value] = (timezone.now() - timedelta(days=1000), http_error(500))
+
+        self.assertIn('500', ensure_synced(self.user))
+        calls = len(self.api.calls)
+        self.assertIn('500', ensure_synced(self.user))
+        self.assertEqual(len(self.api.calls), calls)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AccountRegistryTests(TestCase):
+
+    def test_a_connection_without_accounts_is_not_looked_up_on_every_call(self):
+        cache.clear()
+        user = get_user_model().objects.create_user('empty', password='secret')
+        client = mock.Mock()
+        client.get_json.return_value = []
+        with mock.patch('apps.connection_page.account_registry.get_schwab_client', return_value=client):
+            self.assertEqual(get_accounts(user, 'token'), [])
+            self.assertEqual(get_accounts(user, 'token'), [])
+        client.get_json.assert_called_once()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LiveTransactionsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('trader', password='secret')
+        SchwabToken.objects.create(user=self.user, access_token='token')
+        self.first = SchwabAccount.objects.create(user=self.user, account_number='11111111', hash_value='HASH1')
+        self.second = SchwabAccount.objects.create(user=self.user, account_number='22222222', hash_value='HASH2')
+        self.api = FakeTransactionsApi()
+        patcher = mock.patch('apps.transactions.data_services.fetch_account_transactions', self.api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry_client = mock.Mock()
+        patcher = mock.patch('apps.connection_page.account_registry.get_schwab_client', return_value=self.registry_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, account_id=None):
+        return get_transactions_for_user(self.user, timezone.now() - timedelta(days=90), timezone.now(), account_id)
+
+    def test_accounts_are_fetched_concurrently_and_merged_newest_first(self):
+        self.api.add('HASH1', 'older', 20)
+        self.api.add('HASH2', 'newer', 5)
+        self.api.add('HASH1', 'newest', 1)
+        both_started = threading.Barrier(2, timeout=5)
+        api = self.api
+
+        def fetch_once_both_are_running(access_token, account, start, end):
+            both_started.wait()  # breaks (and fails the fetch) if the accounts are fetched one after the other
+            return api(access_token, account, start, end)
+
+        with mock.patch('apps.transactions.data_services.fetch_account_transactions', fetch_once_both_are_running):
+            transactions = self.fetch()
+
+        self.assertEqual([trx['activityId'] for trx in transactions], ['newest', 'newer', 'older'])
+        self.assertEqual(
+            [(trx['account_number'], trx['account']) for trx in transactions],
+            [('11111111', '...1111'), ('22222222', '...2222'), ('11111111', '...1111')],
+        )
+        self.registry_client.get_json.assert_not_called()
+
+    def test_one_account_can_be_selected(self):
+        self.api.add('HASH1', 'first', 1)
+        self.api.add('HASH2', 'second', 1)
+
+        self.assertEqual([trx['activityId'] for trx in self.fetch(self.second.pk)], ['second'])
+        self.assertEqual([hash_value for hash_value, _, _ in self.api.calls], ['HASH2'])
+
+    def test_a_stale_account_hash_refreshes_the_registry_and_retries_once(self):
+        self.api.add('NEWHASH1', 'relinked', 1)
+        self.api.add('HASH2', 'second', 2)
+        self.api.failures['HASH1'] = (timezone.now() - timedelta(days=1000), http_error(404))
+        self.registry_client.get_json.return_value = [
+            {'accountNumber': '11111111', 'hashValue': 'NEWHASH1'}, {'accountNumber': '22222222', 'hashValue': 'HASH2'},
+        ]
+
+        with self.assertLogs('apps.connection_page.account_registry', 'WARNING'):
+            transactions = self.fetch()
+
+        self.assertEqual([trx['activityId'] for trx in transactions], ['relinked', 'second'])
+        self.registry_client.get_json.assert_called_once_with('/trader/v1/accounts/accountNumbers', 'token')
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.hash_value, 'NEWHASH1')
+
+    def test_a_hash_still_rejected_after_the_refresh_is_not_retried_again(self):
+        self.api.failures['HASH1'] = (timezone.now() - timedelta(days=1000), http_error(401))
+        self.registry_client.get_json.return_value = [{'accountNumber': '11111111', 'hashValue': 'HASH1'}]
+
+        with self.assertLogs('apps.connection_page.account_registry', 'WARNING'):
+            self.assertEqual(self.fetch(), [])
+
+        self.registry_client.get_json.assert_called_once()
+        self.assertEqual([hash_value for hash_value, _, _ in self.api.calls].count('HASH1'), 2)
+        self.assertFalse(SchwabAccount.objects.filter(hash_value='HASH2').exists())
+
+    def test_other_errors_do_not_refresh_the_registry(self):
+        self.api.failures['HASH2'] = (timezone.now() - timedelta(days=1000), http_error(500))
+
+        self.assertEqual(self.fetch(), [])
+        self.registry_client.get_json.assert_not_called()
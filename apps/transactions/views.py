@@ -1,7 +1,10 @@
 # /apps/transactions/views.py
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from .data_services import get_transactions_for_user
+from django.utils import timezone
+from apps.connection_page.models import SchwabAccount
+from .ledger import ensure_synced
+from .models import Transaction
 from datetime import datetime, timedelta
 
 @login_required
@@ -14,11 +17,21 @@ def transactions_list(request):
     start_date_str = request.GET.get('start_date', (today - timedelta(days=90)).strftime('%Y-%m-%d'))
     end_date_str = request.GET.get('end_date', today.strftime('%Y-%m-%d'))
 
-    # Convert string dates from the form into datetime objects for the API call
-    start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-    end_date = datetime.strptime(end_date_str, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+    # Convert string dates from the form into datetime objects for the ledger query
+    start_date = timezone.make_aware(datetime.strptime(start_date_str, '%Y-%m-%d'))
+    end_date = timezone.make_aware(datetime.strptime(end_date_str, '%Y-%m-%d').replace(hour=23, minute=59, second=59))
 
-    all_transactions = get_transactions_for_user(request.user, start_date, end_date)
+    # --- Handle Account Filtering (all linked accounts by default) ---
+    selected_account = request.GET.get('account', '')
+    if not selected_account.isdigit():
+        selected_account = ''
+
+    # Served from the local ledger; the API is only called to keep it in sync (see ledger.py)
+    sync_error = ensure_synced(request.user)
+    ledger = Transaction.objects.filter(user=request.user, transaction_date__range=(start_date, end_date))
+    if selected_account:
+        ledger = ledger.filter(account_id=selected_account)
+    all_transactions = [trx.as_api_dict() for trx in ledger.select_related('account')]
     error_message = None
 
     # --- Categorize and Summarize Transactions ---
@@ -48,7 +61,10 @@ def transactions_list(request):
             categories["other"].append(trx)
             sums["other"] += net_amount
 
-    if not all_transactions:
+    accounts = list(SchwabAccount.objects.filter(user=request.user))
+    if sync_error:
+        error_message = sync_error
+    elif not all_transactions:
         error_message = f"No transactions found for the selected date range ({start_date_str} to {end_date_str})."
 
     context = {
@@ -57,6 +73,9 @@ def transactions_list(request):
         'error_message': error_message,
         'start_date': start_date_str,
         'end_date': end_date_str,
+        'accounts': accounts,
+        'selected_account': selected_account,
+        'show_accounts': len(accounts) > 1 and not selected_account,
         'is_menu': True,
     }
     return render(request, 'transactions/transactions_list.html', context)
@@ -147,6 +147,55 @@
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Set CACHE_URL (redis://host:6379/1 or memcached://host:11211) to share the cache between all
+# gunicorn workers, or pick a backend explicitly via CACHE_BACKEND:
+#   locmem (default without CACHE_URL, per process) | redis | memcached | file | db (run 'python manage.py createcachetable' first)
+# CACHE_LOCATION overrides the directory / Redis URL / Memcached address / table name.
+# The recompute locks (caching.cache_lock) need an atomic cache.add: only locmem (within one process),
+# redis and memcached give a real lock, and only redis and memcached share results and locks between workers.
+
+CACHE_URL = os.environ.get("CACHE_URL", "")
+CACHE_URL_SCHEMES = {"redis": "redis", "rediss": "redis", "memcached": "memcached"}
+CACHE_URL_BACKEND = CACHE_URL_SCHEMES.get(CACHE_URL.split("://", 1)[0].lower()) if CACHE_URL else None
+if CACHE_URL and not CACHE_URL_BACKEND:
+    raise ValueError(f"Unsupported CACHE_URL '{CACHE_URL}', expected a redis:// or memcached:// URL")
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", CACHE_URL_BACKEND or "locmem").lower()
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "intrinsic-value"),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://127.0.0.1:6379/1"),
+    "memcached": ("django.core.cache.backends.memcached.PyMemcacheCache", "127.0.0.1:11211"),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", str(BASE_DIR / ".django_cache")),
+    "db": ("django.core.cache.backends.db.DatabaseCache", "django_cache"),
+}
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ValueError(f"Unknown CACHE_BACKEND '{CACHE_BACKEND}', expected one of {', '.join(CACHE_BACKENDS)}")
+
+if CACHE_BACKEND == CACHE_URL_BACKEND:
+    # Redis takes the URL as is; Memcached wants host:port
+    CACHE_DEFAULT_LOCATION = CACHE_URL if CACHE_BACKEND == "redis" else CACHE_URL.split("://", 1)[1]
+else:
+    CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[CACHE_BACKEND][1]
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND][0],
+        "LOCATION": os.environ.get("CACHE_LOCATION", CACHE_DEFAULT_LOCATION),
+        "TIMEOUT": 3600,
+    }
+}
+
+# Worker processes serving the app (gunicorn reads its default --workers from WEB_CONCURRENCY too);
+# with more than one, a per-process or non-atomic cache is reported at startup (see caching.check_cache_backend)
+SERVER_WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+# Stampede protection for expensive cache entries (seconds)
+CACHE_LOCK_TIMEOUT = 30   # how long one worker may hold a recompute lock
+CACHE_STALE_GRACE = 300   # how long an expired entry is still served while it is recomputed
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -219,12 +268,78 @@
     "income_statement": "income_statement.csv",
     # Add other filenames if they become necessary for calculations
 }
+# Local clone of the DoltHub earnings database that 'python manage.py sync_dolt_csvs' exports from
+DOLT_REPO_PATH = os.environ.get("DOLT_REPO_PATH", os.path.join(DOLT_EARNINGS_DATA_PATH, "earnings"))
+DOLT_EXECUTABLE = os.environ.get("DOLT_EXECUTABLE", "dolt")
+
+# Typed, symbol/date-sorted Parquet copies of the CSVs above (rebuilt when a CSV changes)
+FUNDAMENTALS_STORE_PATH = os.path.join(DOLT_EARNINGS_DATA_PATH, "columnar")
 CURRENT_AAA_BOND_YIELD = 4.5
+# Default Graham formula parameters (see apps/grahams_table/valuation.py); the screener can override them per request
+GRAHAM_VALUATION = {
+    'base_pe': 7.0,              # P/E of a no-growth company
+    'growth_multiplier': 1.0,    # weight of the EPS growth rate
+    'yield_numerator': 4.4,      # AAA yield when Graham published the formula
+    'growth_cap': None,          # cap the growth rate (percent), e.g. 15
+    'eps_source': 'latest',      # 'latest' annual EPS, 'avg5' (5-year average) or 'ttm'
+    'graham_multiplier': 22.5,   # 15 x P/E times 1.5 x P/B
+}
 ANNUAL_REPORT_PERIOD_INDICATOR = 'Year'
 
 # Path to the file containing all tickers (if still used in this manner)
 ALL_TICKERS_FILE_PATH = os.path.join(DOLT_EARNINGS_DATA_PATH, "all_tickers.txt")
 
+# 'python manage.py prefilter_tickers' eligibility rules for the screener universe
+SCREENER_MIN_ANNUAL_PERIODS = 5
+SCREENER_MAX_PRICE_AGE_DAYS = 10  # with --check-prices: the last stored close must be this recent
+# Without a snapshot, the screener page renders at once and its rows stream in: the fundamentals cells
+# first, then the quote / P/E / returns cells, fetched concurrently in batches of SCREENER_STREAM_CHUNK symbols
+SCREENER_ASYNC_ROWS = True
+SCREENER_STREAM_CHUNK = 5
+SCREENER_STREAM_WORKERS = 8
+# 'python manage.py run_precompute_worker': background computation of screener rows and detail payloads
+PRECOMPUTE_SWEEP_INTERVAL = 900  # seconds between re-queuing the whole universe
+PRECOMPUTE_BATCH_SIZE = 200      # jobs claimed per kind per round
+PRECOMPUTE_WORKERS = 4           # threads running a claimed batch
+PRECOMPUTE_SCREENER_CHUNK = 100  # symbols per snapshot update within a batch
+PRECOMPUTE_JOB_TIMEOUT = 600     # a job running longer than this is assumed abandoned and re-queued
+PRECOMPUTE_DETAIL_TTL = 1800     # how long a precomputed detail payload is served
+# Seconds between checks whether the screener search index needs rebuilding
+SEARCH_INDEX_CHECK_INTERVAL = 30
+
+# Market data (prices, company names) for the screener and detail pages.
+# Swap in 'apps.grahams_table.market_data.LocalBackend' to read '<SYMBOL>.csv' files from
+# MARKET_DATA_LOCAL_PATH instead of calling Yahoo Finance (tests / offline work).
+MARKET_DATA_BACKEND = os.environ.get("MARKET_DATA_BACKEND", "apps.grahams_table.market_data.YFinanceBackend")
+MARKET_DATA_LOCAL_PATH = os.path.join(DOLT_EARNINGS_DATA_PATH, "market_data")
+MARKET_DATA_TTL = 900  # seconds a fetched price history is reused before refetching
+# Per-symbol daily close history; only bars newer than the last stored one are downloaded
+PRICE_HISTORY_PATH = os.path.join(DOLT_EARNINGS_DATA_PATH, "price_history")
+# Company names are persisted next to the price history and looked up again after this many seconds
+COMPANY_NAME_TTL = 30 * 86400
+
+# Price history behind the P/E statistics (month-end closes against the EPS in effect at the time)
+PE_HISTORY_PERIOD = '5y'
+
+# Price history behind the screener's returns columns (YTD, CAGR, max drawdown, volatility)
+RETURNS_HISTORY_PERIOD = '10y'
+
+# Memoized calculations / detail page sources (seconds). Keys include the fundamentals data version.
+CACHE_TTL_QUOTES = 300          # anything derived from live prices
+CACHE_TTL_FUNDAMENTALS = 86400  # anything derived only from the DoltHub files
+
+# Rendered screener / detail pages served to anonymous users (seconds, 0 disables). Entries are keyed
+# by the pages' ETags, so a data refresh never serves an old page; this only bounds how long they are kept.
+PAGE_CACHE_TTL = 600
+
+# Stock detail page: its data sources are fetched concurrently, each with its own timeout (seconds)
+DETAIL_FETCH_WORKERS = 8
+DETAIL_SOURCE_TIMEOUTS = {
+    'default': 10,
+    'profile': 8,
+    'prices': 15,
+}
+
 # For yfinance, no specific API keys are usually needed, but good to note
 # YFINANCE_SETTINGS = {}
 
@@ -241,6 +356,32 @@
 # Charles Schwab API Credentials
 SCHWAB_APP_KEY = os.environ.get("SCHWAB_APP_KEY")
 SCHWAB_APP_SECRET = os.environ.get("SCHWAB_APP_SECRET")
+# Shared Schwab API client (apps/connection_page/schwab_client.py). Point SCHWAB_API_BASE_URL at a
+# local fake server (or swap SCHWAB_TRANSPORT) to run without the real API.
+SCHWAB_API_BASE_URL = os.environ.get("SCHWAB_API_BASE_URL", "https://api.schwabapi.com")
+SCHWAB_TRANSPORT = 'apps.connection_page.schwab_client.RequestsTransport'
+SCHWAB_POOL_SIZE = 10           # keep-alive connections per host
+SCHWAB_TIMEOUT = (3.05, 15)     # (connect, read) seconds
+SCHWAB_MAX_RETRIES = 3          # on 429 / 5xx / connection errors
+SCHWAB_RETRY_BACKOFF = 0.5      # seconds, doubled per attempt
+SCHWAB_MAX_RETRY_WAIT = 30      # cap on any single wait, including Retry-After
+SCHWAB_ACCOUNT_WORKERS = 8      # per-account requests (positions, transactions) made at once
+SCHWAB_EMPTY_ACCOUNTS_TTL = 900 # seconds before a connection without accounts is looked up again
+
+# Local transaction ledger (apps/transactions/ledger.py), synced incrementally from the API
+SCHWAB_TRANSACTIONS_MAX_WINDOW_DAYS = 365   # largest date range one transactions request may cover
+TRANSACTIONS_BACKFILL_DAYS = 1825           # history fetched the first time an account is synced
+TRANSACTIONS_SYNC_OVERLAP_DAYS = 3          # re-fetched on every sync, for entries that post late
+TRANSACTIONS_SYNC_INTERVAL = 900            # seconds between syncs started by page views (also after a failure)
+
+# Dashboard market movers: indices shown (symbol -> label), and how long one fetch is shared by all users
+MARKET_MOVERS_INDICES = {
+    '$SPX.X': 'S&P 500',
+    '$DJI': 'Dow Jones',
+    '$COMPX': 'Nasdaq Composite',
+}
+MARKET_MOVERS_TTL = 45          # seconds
+MARKET_MOVERS_WORKERS = 9       # one per (index, sort) request
 LOGIN_URL = '/accounts/auth/login/'
 
 #Sandbox Authentication